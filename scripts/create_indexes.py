@@ -2,6 +2,15 @@ from pymongo import MongoClient, ASCENDING, DESCENDING
 from ugc_api.core.config import settings
 
 
+def enable_pre_images(db, collections):
+    existing = set(db.list_collection_names())
+    for name in collections:
+        if name not in existing:
+            db.create_collection(name)
+        db.command({"collMod": name,
+                    "changeStreamPreAndPostImages": {"enabled": True}})
+
+
 def main():
     db = MongoClient(settings.mongo_dsn)[settings.mongo_db]
 
@@ -15,6 +24,18 @@ def main():
                                name="ratings_user_id")
     db["ratings"].create_index([("film_id", ASCENDING)],
                                name="ratings_film_id")
+    # покрывающий индекс для POST /me/state (без чтения документов)
+    db["ratings"].create_index(
+        [("user_id", ASCENDING), ("film_id", ASCENDING), ("score", ASCENDING)],
+        name="ratings_user_film_score"
+    )
+    # keyset-пагинация «мои оценки»: (updated_at, _id) после user_id
+    db["ratings"].create_index(
+        [("user_id", ASCENDING),
+         ("updated_at", DESCENDING),
+         ("_id", DESCENDING)],
+        name="ratings_user_updated_id"
+    )
 
     # reviews: сортировки по фильму (new/top)
     db["reviews"].create_index(
@@ -35,6 +56,40 @@ def main():
          ("created_at", DESCENDING)],
         name="reviews_film_votes_down_desc"
     )
+    # keyset-пагинация списков (new/top): _id — тай-брейк курсора
+    db["reviews"].create_index(
+        [("film_id", ASCENDING),
+         ("created_at", DESCENDING),
+         ("_id", DESCENDING)],
+        name="reviews_film_created_id"
+    )
+    db["reviews"].create_index(
+        [("film_id", ASCENDING),
+         ("votes.up", DESCENDING),
+         ("created_at", DESCENDING),
+         ("_id", DESCENDING)],
+        name="reviews_film_votes_up_created_id"
+    )
+    # sort=hot / sort=best: предрасчитанный rank (см. rescore_reviews.py)
+    for rank in ("hot", "best"):
+        db["reviews"].create_index(
+            [("film_id", ASCENDING),
+             (f"rank.{rank}", DESCENDING),
+             ("_id", DESCENDING)],
+            name=f"reviews_film_rank_{rank}_id"
+        )
+
+    # надгробия удалённых рецензий — очередь фонового пургера
+    db["reviews"].create_index(
+        [("deleted_at", ASCENDING)],
+        partialFilterExpression={"deleted_at": {"$exists": True}},
+        name="reviews_tombstones"
+    )
+
+    # версии списков рецензий (ETag условного GET)
+    db["reviews_versions"].create_index(
+        [("film_id", ASCENDING)], unique=True, name="reviews_versions_film"
+    )
 
     # review_votes
     db["review_votes"].create_index(
@@ -50,6 +105,11 @@ def main():
         name="likes_user_film"
     )
     db["likes"].create_index([("film_id", ASCENDING)], name="likes_film_id")
+    # покрывающий индекс для POST /me/state
+    db["likes"].create_index(
+        [("user_id", ASCENDING), ("film_id", ASCENDING), ("value", ASCENDING)],
+        name="likes_user_film_value"
+    )
 
     # bookmarks
     db["bookmarks"].create_index(
@@ -60,11 +120,43 @@ def main():
         [("user_id", ASCENDING), ("created_at", DESCENDING)],
         name="bookmarks_user_created_desc"
     )
+    # keyset-пагинация: _id разрешает равные created_at без сортировки
+    db["bookmarks"].create_index(
+        [("user_id", ASCENDING),
+         ("created_at", DESCENDING),
+         ("_id", DESCENDING)],
+        name="bookmarks_user_created_id"
+    )
 
     # film_stats
     db["film_stats"].create_index(
         [("film_id", ASCENDING)], unique=True, name="film_stats_film_id"
     )
+    # топы фильмов: keyset по (поле desc, film_id)
+    for field in ("rating_score", "likes", "reviews_count"):
+        db["film_stats"].create_index(
+            [(field, DESCENDING), ("film_id", ASCENDING)],
+            name=f"film_stats_top_{field}"
+        )
+    # шарды счётчиков «горячих» фильмов
+    db["film_stats_shards"].create_index(
+        [("film_id", ASCENDING), ("shard", ASCENDING)],
+        unique=True, name="film_stats_shards_film_shard"
+    )
+
+    # почасовые/посуточные корзины для трендов
+    db["film_stats_buckets"].create_index(
+        [("film_id", ASCENDING), ("step", ASCENDING), ("ts", ASCENDING)],
+        unique=True, name="film_stats_buckets_film_step_ts"
+    )
+    # часовые корзины удаляются по expire_at, у суточных его нет
+    db["film_stats_buckets"].create_index(
+        [("expire_at", ASCENDING)], expireAfterSeconds=0,
+        name="film_stats_buckets_ttl"
+    )
+
+    # pre/post-images для проектора film_stats на change streams
+    enable_pre_images(db, ("likes", "ratings", "reviews", "review_votes"))
 
     print("Indexes ensured.")
 
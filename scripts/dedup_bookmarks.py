@@ -25,6 +25,9 @@ def main():
             col.delete_many({"_id": {"$in": to_delete}})
             print(f"  kept={keep_id}, deleted={len(to_delete)} for {key}")
 
+    if dups:
+        # счётчики total больше не точны — пересчитаются при чтении
+        db["user_counters"].update_many({}, {"$unset": {"exact": ""}})
     print("Dedup done.")
 
 
@@ -0,0 +1,187 @@
+"""
+Выгрузка ratings в колоночный снапшот для аналитики и рекомендаций.
+
+Коллекция читается один раз, большими батчами и с secondary (если он
+есть), по покрывающему индексу ratings_user_film_score — документы не
+поднимаются, Mongo отдаёт ключи прямо из индекса в порядке user_id.
+user_id / film_id кодируются плотными int32 (порядковый номер в
+словаре), оценки — int8. Результат — набор .npy, которые открываются
+через np.load(mmap_mode="r") без копирования (см. ratings_snapshot.py):
+
+    users.txt     user_id по строкам, номер строки = индекс пользователя
+    films.txt     то же для film_id
+    rows.npy      int32, индекс пользователя (COO row, по возрастанию)
+    cols.npy      int32, индекс фильма (COO col = CSR indices)
+    scores.npy    int8, оценка 1..10 (COO/CSR data)
+    indptr.npy    int64, CSR: оценки пользователя u — [indptr[u], indptr[u+1])
+    meta.json     размеры, dtype, источник, время выгрузки
+
+Снапшот пишется во временный каталог и переименовывается в --out
+только целиком.
+
+    pip install -r scripts/requirements-export.txt
+    python scripts/export_ratings_snapshot.py --out /data/ratings-snapshot
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Dict, List
+
+import numpy as np
+from pymongo import MongoClient, ReadPreference
+
+from ugc_api.core.config import settings
+
+FORMAT_VERSION = 1
+SOURCE_INDEX = "ratings_user_film_score"
+COLUMNS = {"rows": np.int32, "cols": np.int32, "scores": np.int8}
+COPY_CHUNK = 1 << 22
+
+
+def write_ids(path: Path, ids: Dict[str, int]) -> None:
+    """Словарь id -> индекс; dict хранит порядок вставки = индекс."""
+    with path.open("w", encoding="utf-8") as fh:
+        for value in ids:
+            fh.write(f"{value}\n")
+
+
+def raw_to_npy(raw: Path, dtype: type, target: Path) -> int:
+    """Обернуть сырой бинарный столбец в .npy (кусками, без загрузки)."""
+    length = raw.stat().st_size // np.dtype(dtype).itemsize
+    out = np.lib.format.open_memmap(
+        target, mode="w+", dtype=dtype, shape=(length,))
+    if length:
+        src = np.memmap(raw, dtype=dtype, mode="r", shape=(length,))
+        for start in range(0, length, COPY_CHUNK):
+            out[start:start + COPY_CHUNK] = src[start:start + COPY_CHUNK]
+        del src
+    out.flush()
+    del out
+    raw.unlink()
+    return length
+
+
+def build_indptr(rows_path: Path, users: int, target: Path) -> None:
+    """CSR indptr по отсортированному столбцу строк."""
+    rows = np.load(rows_path, mmap_mode="r")
+    counts = np.zeros(users, dtype=np.int64)
+    for start in range(0, len(rows), COPY_CHUNK):
+        chunk = rows[start:start + COPY_CHUNK]
+        counts += np.bincount(chunk, minlength=users)
+    indptr = np.lib.format.open_memmap(
+        target, mode="w+", dtype=np.int64, shape=(users + 1,))
+    indptr[0] = 0
+    np.cumsum(counts, out=indptr[1:])
+    indptr.flush()
+
+
+def flush(files: Dict[str, BinaryIO], rows: List[int], cols: List[int],
+          scores: List[int]) -> int:
+    """Дописать батч в сырые столбцы."""
+    if not rows:
+        return 0
+    for name, values in (("rows", rows), ("cols", cols),
+                         ("scores", scores)):
+        np.asarray(values, dtype=COLUMNS[name]).tofile(files[name])
+    return len(rows)
+
+
+def export(db_name: str, out: Path, batch_size: int) -> dict:
+    client = MongoClient(settings.mongo_dsn, uuidRepresentation="standard")
+    col = client[db_name].get_collection(
+        "ratings", read_preference=ReadPreference.SECONDARY_PREFERRED)
+    tmp = out.with_name(out.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    users: Dict[str, int] = {}
+    films: Dict[str, int] = {}
+    started = time.perf_counter()
+    exported_at = datetime.now(timezone.utc)
+    files: Dict[str, BinaryIO] = {
+        name: (tmp / f"{name}.raw").open("wb") for name in COLUMNS
+    }
+    cursor = col.find(
+        {},
+        {"_id": 0, "user_id": 1, "film_id": 1, "score": 1},
+        batch_size=batch_size,
+        no_cursor_timeout=True,
+    ).sort([("user_id", 1), ("film_id", 1)]).hint(SOURCE_INDEX)
+    total = 0
+    try:
+        rows: List[int] = []
+        cols: List[int] = []
+        scores: List[int] = []
+        for doc in cursor:
+            rows.append(users.setdefault(doc["user_id"], len(users)))
+            cols.append(films.setdefault(doc["film_id"], len(films)))
+            scores.append(doc["score"])
+            if len(rows) >= batch_size:
+                total += flush(files, rows, cols, scores)
+                rows, cols, scores = [], [], []
+                print(f"  rows={total:,} users={len(users):,} "
+                      f"films={len(films):,} "
+                      f"rows/s={total / (time.perf_counter() - started):,.0f}")
+        total += flush(files, rows, cols, scores)
+    finally:
+        cursor.close()
+        for fh in files.values():
+            fh.close()
+        client.close()
+
+    for name, dtype in COLUMNS.items():
+        raw_to_npy(tmp / f"{name}.raw", dtype, tmp / f"{name}.npy")
+    build_indptr(tmp / "rows.npy", len(users), tmp / "indptr.npy")
+    write_ids(tmp / "users.txt", users)
+    write_ids(tmp / "films.txt", films)
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "exported_at": exported_at.isoformat(),
+        "source": {"db": db_name, "collection": "ratings",
+                   "index": SOURCE_INDEX},
+        "ratings": total,
+        "users": len(users),
+        "films": len(films),
+        "dtypes": {**{name: np.dtype(dtype).name
+                      for name, dtype in COLUMNS.items()},
+                   "indptr": "int64"},
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    (tmp / "meta.json").write_text(json.dumps(meta, indent=2))
+    os.replace(tmp, out)
+    return meta
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--out", type=Path, required=True,
+                        help="каталог снапшота (не должен существовать)")
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--force", action="store_true",
+                        help="перезаписать существующий снапшот")
+    args = parser.parse_args()
+
+    out: Path = args.out
+    if out.exists():
+        if not args.force:
+            sys.exit(f"{out} already exists (use --force to replace)")
+        shutil.rmtree(out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+
+    print("Using DSN:", settings.mongo_dsn, "DB:", settings.mongo_db,
+          "->", out)
+    meta = export(settings.mongo_db, out, args.batch_size)
+    print(f"Snapshot done: ratings={meta['ratings']:,} "
+          f"users={meta['users']:,} films={meta['films']:,} "
+          f"elapsed={meta['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
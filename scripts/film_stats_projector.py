@@ -0,0 +1,290 @@
+"""
+Проектор film_stats на change streams.
+
+Читает изменения likes / ratings / reviews / review_votes, сворачивает
+их в дельты счётчиков по film_id и применяет одним bulk_write. Запись
+дельт и resume token делаются в одной транзакции — после рестарта
+проектор продолжает ровно с того места, где остановился (exactly-once).
+
+Дельты раскладываются и по часовым/суточным корзинам film_stats_buckets
+по времени самого события (wallTime), а не времени обработки.
+
+Для дельт по update/delete нужны pre/post-images:
+    python scripts/create_indexes.py   # включает changeStreamPreAndPostImages
+
+Инлайн-обновления в API при этом выключаются:
+    FILM_STATS_INLINE_UPDATES=false
+
+    python scripts/film_stats_projector.py --batch-size 1000 --max-wait-ms 200
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import MongoClient, UpdateOne
+from pymongo.client_session import ClientSession
+from pymongo.database import Database
+from pymongo.errors import OperationFailure
+
+from ugc_api.core.cache import TTLCache
+from ugc_api.core.config import settings
+from ugc_api.services.repositories.film_stats_repo import (
+    bucket_start,
+    bucket_updates,
+    build_counters_update,
+    rating_inc,
+)
+
+logger = logging.getLogger("film_stats_projector")
+
+WATCHED = ("likes", "ratings", "reviews", "review_votes")
+STATE_COLLECTION = "projector_state"
+CHANGE_STREAM_HISTORY_LOST = 286
+
+Deltas = Dict[str, Dict[str, int]]
+
+
+def add(deltas: Deltas, film_id: Optional[str], **inc: int) -> None:
+    """Накопить дельты фильма (нулевые не храним)."""
+    if not film_id:
+        return
+    acc = deltas.setdefault(film_id, {})
+    for key, value in inc.items():
+        if value:
+            acc[key] = acc.get(key, 0) + value
+
+
+def like_inc(value: Optional[int], sign: int) -> Dict[str, int]:
+    if value == 1:
+        return {"likes": sign}
+    if value == -1:
+        return {"dislikes": sign}
+    return {}
+
+
+def vote_inc(value: Optional[str], sign: int) -> Dict[str, int]:
+    if value == "up":
+        return {"votes_up": sign}
+    if value == "down":
+        return {"votes_down": sign}
+    return {}
+
+
+def images(change: dict) -> tuple[dict, dict]:
+    """(before, after) документа; пустой dict, если образа нет."""
+    return (change.get("fullDocumentBeforeChange") or {},
+            change.get("fullDocument") or {})
+
+
+def apply_change(deltas: Deltas, change: dict, film_of_review: dict) -> bool:
+    """
+    Свернуть одно событие в deltas. Возвращает False, если событие
+    пришлось пропустить (нет pre-image / неизвестен фильм голоса).
+    """
+    coll = change["ns"]["coll"]
+    op = change["operationType"]
+    before, after = images(change)
+    if coll == "reviews":
+        # счётчик рецензий меняют только вставка и удаление; надгробие
+        # (deleted_at) — update: голоса уходят своими событиями при
+        # очистке, счётчик — финальным delete
+        if op == "insert":
+            add(deltas, after.get("film_id"), reviews_count=1)
+        elif op == "delete" and before:
+            add(deltas, before.get("film_id"), reviews_count=-1)
+        return op != "delete" or bool(before)
+    if op in ("update", "replace", "delete") and not before:
+        return False
+
+    if coll == "likes":
+        film_id = after.get("film_id") or before.get("film_id")
+        add(deltas, film_id, **like_inc(before.get("value"), -1))
+        add(deltas, film_id, **like_inc(after.get("value"), 1))
+    elif coll == "ratings":
+        film_id = after.get("film_id") or before.get("film_id")
+        add(deltas, film_id,
+            **rating_inc(before.get("score"), after.get("score")))
+    elif coll == "review_votes":
+        # голоса, удаляемые очисткой надгробий, несут film_id сами
+        film_id = (after.get("film_id") or before.get("film_id")
+                   or film_of_review.get((after or before).get("review_id")))
+        if film_id is None:
+            return False
+        add(deltas, film_id, **vote_inc(before.get("value"), -1))
+        add(deltas, film_id, **vote_inc(after.get("value"), 1))
+    return True
+
+
+class Projector:
+    """Tail change streams and keep film_stats in sync in batches."""
+
+    def __init__(
+        self,
+        client: MongoClient,
+        db: Database,
+        name: str = "film_stats",
+        batch_size: int = 1000,
+        max_wait_ms: int = 200,
+    ) -> None:
+        self.client = client
+        self.db = db
+        self.name = name
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+        # review_id -> film_id не меняется: держим LRU
+        self.review_films = TTLCache(maxsize=100_000, ttl=24 * 3600,
+                                     name="projector_review_film")
+
+    def load_token(self) -> Optional[dict]:
+        state = self.db[STATE_COLLECTION].find_one({"_id": self.name})
+        return state.get("resume_token") if state else None
+
+    def resolve_review_films(self, changes: List[dict]) -> dict:
+        """review_id -> film_id для голосов батча (кэш, события, БД)."""
+        mapping: Dict[Any, str] = {}
+        for change in changes:
+            if change["ns"]["coll"] != "reviews":
+                continue
+            # рецензия удаляется только после очистки голосов, поэтому
+            # их события могут прийти, когда рецензии в БД уже нет:
+            # такие голоса очистка помечает film_id (см. ниже)
+            before, after = images(change)
+            doc = after or before
+            if doc.get("film_id"):
+                mapping[doc["_id"]] = doc["film_id"]
+                self.review_films.set(doc["_id"], doc["film_id"])
+
+        wanted = set()
+        for change in changes:
+            if change["ns"]["coll"] != "review_votes":
+                continue
+            before, after = images(change)
+            if after.get("film_id") or before.get("film_id"):
+                continue
+            review_id = (after or before).get("review_id")
+            if review_id is None or review_id in mapping:
+                continue
+            cached = self.review_films.get(review_id)
+            if cached is not None:
+                mapping[review_id] = cached
+            else:
+                wanted.add(review_id)
+
+        if wanted:
+            for doc in self.db["reviews"].find(
+                    {"_id": {"$in": list(wanted)}}, {"film_id": 1}):
+                mapping[doc["_id"]] = doc["film_id"]
+                self.review_films.set(doc["_id"], doc["film_id"])
+        return mapping
+
+    def flush(self, changes: List[dict]) -> int:
+        """Применить батч и сохранить resume token в одной транзакции."""
+        now = datetime.now(timezone.utc)
+        by_hour: Dict[datetime, Deltas] = {}
+        film_of_review = self.resolve_review_films(changes)
+        skipped = 0
+        for change in changes:
+            hour = bucket_start(change.get("wallTime") or now, "hour")
+            if not apply_change(by_hour.setdefault(hour, {}), change,
+                                film_of_review):
+                skipped += 1
+        if skipped:
+            logger.warning("projector_skipped_events",
+                           extra={"count": skipped})
+
+        deltas: Deltas = {}
+        buckets: List[UpdateOne] = []
+        for hour, hour_deltas in by_hour.items():
+            for film_id, inc in hour_deltas.items():
+                if not inc:
+                    continue
+                add(deltas, film_id, **inc)
+                buckets.extend(bucket_updates(film_id, inc, hour))
+        ops = [
+            UpdateOne({"film_id": film_id},
+                      build_counters_update(inc, now), upsert=True)
+            for film_id, inc in deltas.items() if inc
+        ]
+        token = changes[-1]["_id"]
+
+        def txn(session: ClientSession) -> None:
+            if ops:
+                self.db["film_stats"].bulk_write(
+                    ops, ordered=False, session=session)
+            if buckets:
+                self.db["film_stats_buckets"].bulk_write(
+                    buckets, ordered=False, session=session)
+            self.db[STATE_COLLECTION].update_one(
+                {"_id": self.name},
+                {"$set": {"resume_token": token, "updated_at": now}},
+                upsert=True,
+                session=session,
+            )
+
+        with self.client.start_session() as session:
+            session.with_transaction(txn)
+        return len(ops)
+
+    def run(self) -> None:
+        token = self.load_token()
+        pipeline = [{"$match": {"ns.coll": {"$in": list(WATCHED)}}}]
+        print("Projector", self.name,
+              "resuming" if token else "starting from now")
+        with self.db.watch(
+            pipeline,
+            full_document="whenAvailable",
+            full_document_before_change="whenAvailable",
+            resume_after=token,
+            max_await_time_ms=int(self.max_wait * 1000),
+        ) as stream:
+            batch: List[dict] = []
+            deadline = time.monotonic() + self.max_wait
+            while stream.alive:
+                change = stream.try_next()
+                if change is not None:
+                    batch.append(change)
+                if batch and (len(batch) >= self.batch_size
+                              or time.monotonic() >= deadline):
+                    started = time.perf_counter()
+                    films = self.flush(batch)
+                    print(f"  applied events={len(batch)} films={films} "
+                          f"in {(time.perf_counter() - started) * 1000:.0f}ms")
+                    batch = []
+                if not batch:
+                    deadline = time.monotonic() + self.max_wait
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--name", default="film_stats")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--max-wait-ms", type=int, default=200)
+    parser.add_argument("--reset", action="store_true",
+                        help="забыть resume token и начать с текущего момента")
+    args = parser.parse_args()
+
+    client = MongoClient(settings.mongo_dsn, uuidRepresentation="standard",
+                         tz_aware=True)
+    db = client[settings.mongo_db]
+    projector = Projector(client, db, name=args.name,
+                          batch_size=args.batch_size,
+                          max_wait_ms=args.max_wait_ms)
+    if args.reset:
+        db[STATE_COLLECTION].delete_one({"_id": args.name})
+    try:
+        projector.run()
+    except OperationFailure as error:
+        if error.code == CHANGE_STREAM_HISTORY_LOST:
+            print("Resume token is out of oplog: run "
+                  "scripts/reconcile_film_stats.py, then restart with --reset")
+        raise
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Загрузка снапшота ratings, выгруженного export_ratings_snapshot.py.
+
+Все массивы открываются через np.load(mmap_mode="r"): данные не
+копируются в память, страницы подтягиваются ОС по мере чтения, и
+несколько процессов обучения делят один page cache.
+
+    from scripts.ratings_snapshot import load_snapshot
+
+    snap = load_snapshot("/data/ratings-snapshot")
+    indptr, indices, data = snap.csr()
+    films, scores = snap.user_ratings(snap.user_index("..."))
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Tuple, Union
+
+import numpy as np
+
+SUPPORTED_FORMATS = (1,)
+
+
+def _read_ids(path: Path) -> List[str]:
+    return path.read_text(encoding="utf-8").splitlines()
+
+
+@dataclass(frozen=True)
+class RatingsSnapshot:
+    """Read-only memory-mapped ratings matrix (users x films)."""
+
+    path: Path
+    meta: Dict[str, Any]
+    rows: np.ndarray
+    cols: np.ndarray
+    scores: np.ndarray
+    indptr: np.ndarray
+    _index: Dict[str, Dict[str, int]] = field(
+        default_factory=dict, repr=False, compare=False)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.meta["users"], self.meta["films"]
+
+    def coo(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(row, col, data) — users x films in COO layout."""
+        return self.rows, self.cols, self.scores
+
+    def csr(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(indptr, indices, data) — users x films in CSR layout."""
+        return self.indptr, self.cols, self.scores
+
+    def user_ratings(self, user_idx: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Film indexes and scores of one user (views, no copy)."""
+        lo, hi = int(self.indptr[user_idx]), int(self.indptr[user_idx + 1])
+        return self.cols[lo:hi], self.scores[lo:hi]
+
+    def users(self) -> List[str]:
+        """user_id by dense index."""
+        return _read_ids(self.path / "users.txt")
+
+    def films(self) -> List[str]:
+        """film_id by dense index."""
+        return _read_ids(self.path / "films.txt")
+
+    def user_index(self, user_id: str) -> int:
+        return self._lookup("users", user_id)
+
+    def film_index(self, film_id: str) -> int:
+        return self._lookup("films", film_id)
+
+    def to_scipy(self) -> Any:
+        """scipy.sparse.csr_matrix over the mapped arrays (scipy needed)."""
+        from scipy.sparse import csr_matrix
+
+        return csr_matrix((self.scores, self.cols, self.indptr),
+                          shape=self.shape, copy=False)
+
+    def _lookup(self, kind: str, value: str) -> int:
+        if kind not in self._index:
+            ids = self.users() if kind == "users" else self.films()
+            self._index[kind] = {v: i for i, v in enumerate(ids)}
+        return self._index[kind][value]
+
+
+def load_snapshot(path: Union[str, Path]) -> RatingsSnapshot:
+    """Open snapshot directory; arrays are np.memmap (read-only)."""
+    path = Path(path)
+    meta = json.loads((path / "meta.json").read_text())
+    if meta.get("format_version") not in SUPPORTED_FORMATS:
+        raise ValueError(
+            f"unsupported snapshot format: {meta.get('format_version')}")
+    arrays = {
+        name: np.load(path / f"{name}.npy", mmap_mode="r")
+        for name in ("rows", "cols", "scores", "indptr")
+    }
+    if len(arrays["indptr"]) != meta["users"] + 1 or any(
+            len(arrays[name]) != meta["ratings"]
+            for name in ("rows", "cols", "scores")):
+        raise ValueError(f"snapshot {path} does not match meta.json")
+    return RatingsSnapshot(path=path, meta=meta, **arrays)
@@ -0,0 +1,289 @@
+"""
+Пересборка счётчиков film_stats из исходных коллекций.
+
+Счётчики считаются $group-агрегациями по likes / ratings / reviews
+(голоса — из счётчиков votes.up/down самих рецензий, которые меняются
+в одной транзакции с review_votes; удалённые рецензии-надгробия
+учитываются до фоновой очистки — как и в film_stats), сравниваются
+с сохранёнными (с учётом шардов горячих фильмов) и исправляются только
+расхождения — через $inc разницы одним unordered bulk_write на диапазон.
+Сохранённые значения читаются до подсчёта эталона, а исправление
+применяется, только если основной документ с тех пор не менялся
+(тот же updated_at): запись, пришедшая во время сверки, не
+«отменяется» поправкой — такой фильм исправит следующий прогон.
+Остаётся окно между записью в исходную коллекцию и записью её дельты
+в film_stats (для write-behind — до интервала сброса), а у шардов
+горячих фильмов условия нет — сверку лучше гонять при малой нагрузке.
+Заодно пересчитываются производные avg_rating / rating_score / rating_stddev
+(так же заполняются поля, которых нет у старых документов).
+
+Работа делится на диапазоны film_id (по первым hex-символам UUID)
+и выполняется параллельно несколькими потоками.
+
+    python scripts/reconcile_film_stats.py --workers 8 --dry-run
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from pymongo import MongoClient, UpdateOne
+from pymongo.database import Database
+from pymongo.errors import BulkWriteError
+
+from ugc_api.core.config import settings
+from ugc_api.services.repositories.film_stats_repo import (
+    HIST_FIELDS,
+    RATING_SCORES,
+    SHARDED_FIELDS,
+    build_counters_pipeline,
+    build_counters_update,
+    rating_score,
+)
+
+COUNTERS = ("likes", "dislikes", "ratings_count", "ratings_sum",
+            "ratings_sumsq", *HIST_FIELDS,
+            "reviews_count", "votes_up", "votes_down")
+AVG_EPS = 1e-9
+DUPLICATE_KEY = 11000
+
+Range = Tuple[str, Optional[str]]
+
+
+@dataclass
+class RangeReport:
+    films: int = 0
+    source_docs: int = 0
+    fixed: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+
+
+def film_ranges(prefix_len: int = 2) -> List[Range]:
+    """Диапазоны [lo, hi) по hex-префиксу; крайние открыты."""
+    total = 16 ** prefix_len
+    bounds = [format(i, f"0{prefix_len}x") for i in range(1, total)]
+    los: List[str] = [""] + bounds
+    his: List[Optional[str]] = [*bounds, None]
+    return list(zip(los, his))
+
+
+def range_filter(rng: Range) -> Dict[str, Any]:
+    lo, hi = rng
+    cond: Dict[str, Any] = {"$gte": lo}
+    if hi is not None:
+        cond["$lt"] = hi
+    return {"film_id": cond}
+
+
+def aggregate(db: Database, coll: str, match: dict, group: dict) -> list:
+    pipeline = [{"$match": match}, {"$group": {"_id": "$film_id", **group}}]
+    return list(db[coll].aggregate(pipeline, allowDiskUse=True))
+
+
+def flag(field: str, value: int) -> dict:
+    return {"$sum": {"$cond": [{"$eq": [f"${field}", value]}, 1, 0]}}
+
+
+def compute_truth(db: Database, match: dict) -> Tuple[Dict[str, dict], int]:
+    """Эталонные значения счётчиков по фильмам диапазона."""
+    truth: Dict[str, dict] = {}
+    scanned = 0
+
+    def put(film_id: str, **values: int) -> None:
+        doc = truth.setdefault(film_id, dict.fromkeys(COUNTERS, 0))
+        doc.update(values)
+
+    for row in aggregate(db, "likes", match, {
+        "likes": flag("value", 1), "dislikes": flag("value", -1),
+    }):
+        put(row["_id"], likes=row["likes"], dislikes=row["dislikes"])
+        scanned += row["likes"] + row["dislikes"]
+
+    for row in aggregate(db, "ratings", match, {
+        "count": {"$sum": 1}, "sum": {"$sum": "$score"},
+        "sumsq": {"$sum": {"$multiply": ["$score", "$score"]}},
+        **{f"h{score}": flag("score", score) for score in RATING_SCORES},
+    }):
+        put(row["_id"], ratings_count=row["count"], ratings_sum=row["sum"],
+            ratings_sumsq=row["sumsq"],
+            **{f"ratings_hist.{score}": row[f"h{score}"]
+               for score in RATING_SCORES})
+        scanned += row["count"]
+
+    for row in aggregate(db, "reviews", match, {
+        "count": {"$sum": 1},
+        "up": {"$sum": "$votes.up"},
+        "down": {"$sum": "$votes.down"},
+    }):
+        put(row["_id"], reviews_count=row["count"],
+            votes_up=row["up"], votes_down=row["down"])
+        scanned += row["count"]
+
+    return truth, scanned
+
+
+def load_stored(db: Database, match: dict) -> Dict[str, dict]:
+    """Сохранённые значения: основной документ + суммы шардов."""
+    projection = {"_id": 0, "film_id": 1, "avg_rating": 1,
+                  "rating_score": 1, "rating_stddev": 1, "shards": 1,
+                  "ratings_hist": 1, "updated_at": 1,
+                  **dict.fromkeys(set(COUNTERS) - set(HIST_FIELDS), 1)}
+    cursor = db["film_stats"].find(match, projection)
+    stored = {doc["film_id"]: doc for doc in cursor}
+    for doc in stored.values():
+        # гистограмму сравниваем по плоским ключам ratings_hist.N
+        hist = doc.pop("ratings_hist", None) or {}
+        for score in RATING_SCORES:
+            doc[f"ratings_hist.{score}"] = hist.get(str(score), 0)
+    sharded = {fid for fid, d in stored.items() if d.get("shards")}
+    if sharded:
+        group = {f: {"$sum": f"${f}"} for f in SHARDED_FIELDS}
+        for row in aggregate(db, "film_stats_shards",
+                             {"film_id": {"$in": list(sharded)}}, group):
+            doc = stored[row["_id"]]
+            for field in SHARDED_FIELDS:
+                doc[field] = doc.get(field, 0) + row[field]
+    return stored
+
+
+def expected_avg(doc: dict) -> float:
+    count = doc["ratings_count"]
+    return float(doc["ratings_sum"] / count) if count > 0 else 0.0
+
+
+def expected_stddev(doc: dict) -> float:
+    count = doc["ratings_count"]
+    if count <= 0:
+        return 0.0
+    variance = doc["ratings_sumsq"] / count - expected_avg(doc) ** 2
+    return math.sqrt(max(0.0, variance))
+
+
+def derived_ok(want: dict, have: dict) -> bool:
+    """avg_rating, rating_score и rating_stddev соответствуют счётчикам."""
+    expected = {
+        "avg_rating": expected_avg(want),
+        "rating_score": rating_score(want["ratings_count"],
+                                     want["ratings_sum"]),
+        "rating_stddev": expected_stddev(want),
+    }
+    return all(abs(float(have.get(field) or 0.0) - value) < AVG_EPS
+               for field, value in expected.items())
+
+
+def diff_ops(
+        truth: Dict[str, dict],
+        stored: Dict[str, dict]) -> List[UpdateOne]:
+    """UpdateOne только для фильмов с расхождениями."""
+    now = datetime.now(timezone.utc)
+    ops: List[UpdateOne] = []
+    zero = dict.fromkeys(COUNTERS, 0)
+    for film_id in truth.keys() | stored.keys():
+        want = truth.get(film_id, zero)
+        have = stored.get(film_id, {})
+        inc = {
+            field: want[field] - int(have.get(field) or 0)
+            for field in COUNTERS
+            if want[field] != int(have.get(field) or 0)
+        }
+        if not inc and derived_ok(want, have) and film_id in stored:
+            continue
+        if not inc and film_id not in stored:
+            continue  # фильма нет нигде — писать нечего
+        update = (build_counters_update(inc, now) if inc
+                  else build_counters_pipeline({}, now))
+        # только если документ не менялся с чтения; для нового фильма
+        # (updated_at: None) параллельно созданный документ даёт дубль
+        # ключа — поправку пропускаем
+        ops.append(UpdateOne(
+            {"film_id": film_id, "updated_at": have.get("updated_at")},
+            update, upsert=True))
+    return ops
+
+
+def reconcile_range(db: Database, rng: Range, dry_run: bool) -> RangeReport:
+    started = time.perf_counter()
+    match = range_filter(rng)
+    # сначала сохранённые: запись во время сверки попадёт в эталон,
+    # но изменит updated_at, и условная поправка её не тронет
+    stored = load_stored(db, match)
+    truth, scanned = compute_truth(db, match)
+    ops = diff_ops(truth, stored)
+    fixed = len(ops)
+    if ops and not dry_run:
+        try:
+            result = db["film_stats"].bulk_write(ops, ordered=False)
+            fixed = applied(result.bulk_api_result)
+        except BulkWriteError as error:
+            if any(e.get("code") != DUPLICATE_KEY
+                   for e in error.details["writeErrors"]):
+                raise
+            fixed = applied(error.details)
+    return RangeReport(
+        films=len(truth.keys() | stored.keys()),
+        source_docs=scanned,
+        fixed=fixed,
+        skipped=len(ops) - fixed,
+        seconds=time.perf_counter() - started,
+    )
+
+
+def applied(details: Mapping[str, Any]) -> int:
+    """Сколько поправок bulk_write применил (изменено + вставлено)."""
+    return int(details.get("nMatched", 0)) + int(details.get("nUpserted", 0))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--prefix-len", type=int, default=2,
+                        help="hex-символов в префиксе диапазона (16^N)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="только посчитать расхождения, не писать")
+    args = parser.parse_args()
+
+    client: MongoClient[Dict[str, Any]] = MongoClient(
+        settings.mongo_dsn, uuidRepresentation="standard")
+    db = client[settings.mongo_db]
+    ranges = film_ranges(args.prefix_len)
+    print("Using DSN:", settings.mongo_dsn, "DB:", settings.mongo_db,
+          f"ranges={len(ranges)} workers={args.workers}",
+          "(dry-run)" if args.dry_run else "")
+
+    total = RangeReport()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(reconcile_range, db, rng, args.dry_run)
+                   for rng in ranges]
+        for done, future in enumerate(futures, start=1):
+            rep = future.result()
+            total.films += rep.films
+            total.source_docs += rep.source_docs
+            total.fixed += rep.fixed
+            total.skipped += rep.skipped
+            elapsed = time.perf_counter() - started
+            if done % max(1, len(ranges) // 20) == 0 or done == len(ranges):
+                print(f"  [{done}/{len(ranges)}] films={total.films} "
+                      f"fixed={total.fixed} "
+                      f"docs/s={total.source_docs / elapsed:,.0f}")
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Reconcile {'(dry-run) ' if args.dry_run else ''}done: "
+        f"films={total.films} drifted={total.fixed} "
+        f"skipped_busy={total.skipped} "
+        f"source_docs={total.source_docs} elapsed={elapsed:.1f}s "
+        f"films/s={total.films / elapsed:,.0f} "
+        f"docs/s={total.source_docs / elapsed:,.0f}"
+    )
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
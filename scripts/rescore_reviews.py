@@ -0,0 +1,68 @@
+"""
+Пересчёт rank.hot / rank.best рецензий (sort=hot / sort=best).
+
+При голосовании ранг пересчитывается в том же update, что и счётчики
+голосов. Скрипт нужен для заполнения rank у старых рецензий и после
+смены REVIEWS_HOT_DECAY_S: hot-ранг от времени не «протухает» (время
+входит в него слагаемым), но зависит от масштаба затухания.
+
+Рецензии обходятся батчами по _id, каждый батч — один update_many
+с тем же pipeline-выражением, что и в API (на стороне сервера).
+
+    python scripts/rescore_reviews.py --only-missing
+    python scripts/rescore_reviews.py --batch-size 5000
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Any, Dict
+
+from pymongo import MongoClient
+
+from ugc_api.core.config import settings
+from ugc_api.services.repositories.reviews_repo import rank_stage
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--film-id", help="только рецензии одного фильма")
+    parser.add_argument("--only-missing", action="store_true",
+                        help="только рецензии без rank")
+    args = parser.parse_args()
+
+    db = MongoClient(settings.mongo_dsn)[settings.mongo_db]
+    col = db["reviews"]
+    query: Dict[str, Any] = {}
+    if args.film_id:
+        query["film_id"] = args.film_id
+    if args.only_missing:
+        query["rank"] = {"$exists": False}
+    print("Using DSN:", settings.mongo_dsn, "DB:", settings.mongo_db,
+          f"decay_s={settings.reviews_hot_decay_s}")
+
+    pipeline = [rank_stage()]
+    started = time.perf_counter()
+    last_id = None
+    total = 0
+    while True:
+        batch_query = dict(query)
+        if last_id is not None:
+            batch_query["_id"] = {"$gt": last_id}
+        ids = [d["_id"] for d in col.find(batch_query, {"_id": 1})
+               .sort("_id", 1).limit(args.batch_size)]
+        if not ids:
+            break
+        col.update_many({"_id": {"$in": ids}}, pipeline)
+        total += len(ids)
+        last_id = ids[-1]
+        print(f"  rescored={total} "
+              f"docs/s={total / (time.perf_counter() - started):,.0f}")
+
+    print(f"Rescore done: reviews={total} "
+          f"elapsed={time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,3 +17,5 @@ if __name__ == "__main__":
     dump("review_votes")
     dump("likes")
     dump("film_stats")
+    dump("film_stats_shards")
+    dump("film_stats_buckets")
@@ -35,3 +35,45 @@ async def test_bookmark_delete_then_delete_again_deleted_false(client):
     r2 = await client.delete(f"{BASE}/{film}", headers=uid_header(user))
     assert (r1.json() == {"ok": True, "deleted": True}
             and r2.json() == {"ok": True, "deleted": False})
+
+
+async def test_bookmarks_cursor_walks_all_items_once(client):
+    user = new_user()
+    films = [new_film() for _ in range(5)]
+    for fid in films:
+        await client.put(f"{BASE}/{fid}", headers=uid_header(user))
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        body = (await client.get(BASE, params=params,
+                                 headers=uid_header(user))).json()
+        seen += [i["film_id"] for i in body["items"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == films[::-1]
+
+    r = await client.get(BASE, params={"cursor": "broken"},
+                         headers=uid_header(user))
+    assert r.status_code == 400
+
+
+async def test_bookmarks_total_from_counter_and_optional(client):
+    user = new_user()
+    films = [new_film() for _ in range(3)]
+    for fid in films:
+        await client.put(f"{BASE}/{fid}", headers=uid_header(user))
+    await client.delete(f"{BASE}/{films[0]}", headers=uid_header(user))
+
+    for params in ({}, {"exact_total": "true"}, {}):
+        body = (await client.get(BASE, params=params,
+                                 headers=uid_header(user))).json()
+        assert body["total"] == 2
+    await client.put(f"{BASE}/{films[0]}", headers=uid_header(user))
+    body = (await client.get(BASE, headers=uid_header(user))).json()
+    assert body["total"] == 3
+
+    body = (await client.get(BASE, params={"with_total": "false"},
+                             headers=uid_header(user))).json()
+    assert body["total"] is None and len(body["items"]) == 3
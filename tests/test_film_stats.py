@@ -1,5 +1,19 @@
+import base64
+import json
+
 import pytest
+from pymongo.errors import BulkWriteError
 from tests.helpers import new_user, new_film, uid_header, read_stats
+from ugc_api.dependencies import get_db
+from ugc_api.services.film_stats_buckets import FilmStatsBucketBuffer
+from ugc_api.services.film_stats_buffer import FilmStatsWriteBuffer
+from ugc_api.services.film_stats_compactor import FilmStatsCompactor
+from ugc_api.services.film_stats_service import FilmStatsService
+from ugc_api.services.film_stats_sharding import HotFilmDetector
+from ugc_api.services.repositories.film_stats_repo import (
+    FilmStatsRepo,
+    rating_inc,
+)
 
 
 async def test_film_stats_initial_is_zeroed(client):
@@ -18,3 +32,237 @@ async def test_film_stats_change_after_like_and_rating(client):
     assert (s["likes"] == 1
             and s["ratings_count"] == 1
             and float(s["avg_rating"]) == pytest.approx(7.0))
+
+
+async def test_write_behind_buffer_coalesces_deltas_into_one_write(client):
+    film = new_film()
+    db = await get_db()
+    buffer = FilmStatsWriteBuffer(FilmStatsRepo(db))
+    for _ in range(5):
+        await buffer.add(film, {"likes": 1})
+    await buffer.add(film, {"dislikes": 1})
+    assert buffer.pending_keys == 1
+
+    assert await buffer.flush() == 1
+    s = await read_stats(client, film)
+    assert s["likes"] == 5 and s["dislikes"] == 1
+
+
+class PartiallyFailingRepo:
+    """Ordered bulk_write, падающий на втором фильме батча."""
+
+    def __init__(self, code=1):
+        self.applied = {}
+        self.code = code
+
+    async def bulk_apply_inc(self, deltas):
+        films = list(deltas)
+        self.applied[films[0]] = deltas[films[0]]
+        raise BulkWriteError(
+            {"writeErrors": [{"index": 1, "code": self.code}]})
+
+
+async def test_write_behind_dead_letters_failed_op_and_requeues_tail():
+    repo = PartiallyFailingRepo()
+    buffer = FilmStatsWriteBuffer(repo)
+    for film in ("a", "b", "c"):
+        await buffer.add(film, {"likes": 1})
+
+    with pytest.raises(BulkWriteError):
+        await buffer.flush()
+    assert repo.applied == {"a": {"likes": 1}}
+    assert list(buffer.dead_letters) == [("b", {"likes": 1})]
+    assert sorted(buffer._pending) == ["c"]
+
+
+async def test_write_behind_requeues_failed_op_on_duplicate_key():
+    repo = PartiallyFailingRepo(code=11000)
+    buffer = FilmStatsWriteBuffer(repo)
+    for film in ("a", "b", "c"):
+        await buffer.add(film, {"likes": 1})
+
+    with pytest.raises(BulkWriteError):
+        await buffer.flush()
+    assert not buffer.dead_letters
+    assert sorted(buffer._pending) == ["b", "c"]
+
+
+async def test_write_behind_backpressure_does_not_raise_flush_errors():
+    buffer = FilmStatsWriteBuffer(PartiallyFailingRepo(), flush_max_keys=2,
+                                  max_keys=2)
+    for film in ("a", "b", "c"):
+        await buffer.add(film, {"likes": 1})
+    assert "c" in buffer._pending
+
+
+async def test_closed_buffer_writes_rating_deltas_with_recompute(client):
+    film = new_film()
+    buffer = FilmStatsWriteBuffer(FilmStatsRepo(await get_db()))
+    await buffer.close()
+    await buffer.add(film, rating_inc(None, 8))
+
+    s = await read_stats(client, film)
+    assert s["ratings_count"] == 1
+    assert float(s["avg_rating"]) == pytest.approx(8.0)
+    assert s["ratings_hist"]["8"] == 1
+
+
+async def test_bucket_buffer_coalesces_deltas_into_one_upsert_per_step():
+    film = new_film()
+    db = await get_db()
+    buckets = FilmStatsBucketBuffer(FilmStatsRepo(db))
+    for _ in range(5):
+        buckets.add(film, {"likes": 1})
+    assert buckets.pending_keys == 1
+
+    # одна часовая и одна суточная корзина на все пять дельт
+    assert await buckets.flush() == 2
+    docs = await db["film_stats_buckets"].find(
+        {"film_id": film}).to_list(None)
+    assert sorted(doc["likes"] for doc in docs) == [5, 5]
+
+
+async def test_film_stats_cached_read_sees_subsequent_write(client):
+    film, user = new_film(), new_user()
+    assert (await read_stats(client, film))["likes"] == 0
+    await client.put(f"/api/v1/likes/{film}",
+                     json={"value": 1},
+                     headers=uid_header(user))
+    assert (await read_stats(client, film))["likes"] == 1
+
+
+async def test_film_stats_batch_returns_request_order_with_defaults(client):
+    liked, unknown, user = new_film(), new_film(), new_user()
+    await client.put(f"/api/v1/likes/{liked}",
+                     json={"value": 1},
+                     headers=uid_header(user))
+
+    r = await client.post("/api/v1/film-stats:batch",
+                          json={"film_ids": [unknown, liked]})
+    assert r.status_code == 200
+    items = r.json()["items"]
+    assert [i["film_id"] for i in items] == [unknown, liked]
+    assert items[0]["likes"] == 0 and items[1]["likes"] == 1
+
+    r = await client.get("/api/v1/film-stats:batch",
+                         params={"ids": [liked, unknown]})
+    assert [i["film_id"] for i in r.json()["items"]] == [liked, unknown]
+
+
+async def test_film_stats_read_of_unknown_film_does_not_write(client):
+    film = new_film()
+    s = await read_stats(client, film)
+    assert s["film_id"] == film and s["updated_at"] is None
+    db = await get_db()
+    assert await db["film_stats"].count_documents({"film_id": film}) == 0
+
+
+async def test_sharded_counters_are_summed_on_read(client):
+    film = new_film()
+    db = await get_db()
+    svc = FilmStatsService(db, hot_films=HotFilmDetector(shards=4,
+                                                         threshold=0))
+    for _ in range(3):
+        await svc.apply_like_delta(film, like_delta=1)
+    await svc.apply_rating_set(film, old_rating=None, new_rating=8)
+
+    assert await db["film_stats_shards"].count_documents(
+        {"film_id": film}) >= 1
+    s = await svc.get_stats(film)
+    assert s["likes"] == 3 and s["ratings_count"] == 1
+
+
+async def test_compactor_folds_shards_so_hot_film_ranks_in_top(client):
+    hot, cold = new_film(), new_film()
+    db = await get_db()
+    svc = FilmStatsService(db, hot_films=HotFilmDetector(shards=4,
+                                                         threshold=0))
+    for _ in range(3):
+        await svc.apply_like_delta(hot, like_delta=1)
+    await FilmStatsService(db).apply_like_delta(cold, like_delta=1)
+
+    assert await FilmStatsCompactor(db).compact() == 1
+    items, _ = await FilmStatsService(db).top("likes", limit=2)
+    assert [(i["film_id"], i["likes"]) for i in items] == [
+        (hot, 3), (cold, 1)]
+    assert await FilmStatsCompactor(db).compact() == 0
+
+
+async def test_film_stats_top_by_rating_uses_bayesian_score(client):
+    one_ten, three_nines = new_film(), new_film()
+    await client.put(f"/api/v1/ratings/{one_ten}?score=10",
+                     headers=uid_header(new_user()))
+    for _ in range(3):
+        await client.put(f"/api/v1/ratings/{three_nines}?score=9",
+                         headers=uid_header(new_user()))
+
+    r = await client.get("/api/v1/film-stats/top",
+                         params={"by": "avg_rating", "limit": 1})
+    assert r.status_code == 200
+    page = r.json()
+    assert [i["film_id"] for i in page["items"]] == [three_nines]
+
+    r = await client.get("/api/v1/film-stats/top",
+                         params={"by": "avg_rating", "limit": 1,
+                                 "cursor": page["next_cursor"]})
+    page = r.json()
+    assert [i["film_id"] for i in page["items"]] == [one_ten]
+    assert page["next_cursor"] is None
+
+    r = await client.get("/api/v1/film-stats/top",
+                         params={"by": "likes", "cursor": "garbage"})
+    assert r.status_code == 400
+
+
+@pytest.mark.parametrize("values", [
+    [{"$o": "not-an-object-id"}, "x"],
+    [{"$gt": ""}, "x"],
+    [[1], "x"],
+])
+async def test_film_stats_top_rejects_forged_cursor(client, values):
+    payload = json.dumps({"k": "top:likes", "v": values}).encode()
+    r = await client.get("/api/v1/film-stats/top",
+                         params={"by": "likes",
+                                 "cursor": base64.urlsafe_b64encode(
+                                     payload).decode()})
+    assert r.status_code == 400
+
+
+async def test_film_stats_timeseries_has_zero_filled_hour_buckets(client):
+    film, user = new_film(), new_user()
+    await client.put(f"/api/v1/likes/{film}",
+                     json={"value": 1},
+                     headers=uid_header(user))
+
+    r = await client.get(f"/api/v1/film-stats/{film}/timeseries",
+                         params={"step": "hour"})
+    assert r.status_code == 200
+    points = r.json()["points"]
+    assert len(points) == 25
+    assert sum(p["likes"] for p in points) == 1
+
+    r = await client.get(f"/api/v1/film-stats/{film}/timeseries",
+                         params={"step": "hour",
+                                 "from": "2024-01-01T00:00:00Z",
+                                 "to": "2024-02-01T00:00:00Z"})
+    assert r.status_code == 400
+
+
+async def test_film_stats_rating_histogram_and_stddev_follow_changes(client):
+    film, u1, u2 = new_film(), new_user(), new_user()
+    await client.put(f"/api/v1/ratings/{film}?score=2",
+                     headers=uid_header(u1))
+    await client.put(f"/api/v1/ratings/{film}?score=5",
+                     headers=uid_header(u2))
+    await client.put(f"/api/v1/ratings/{film}?score=8",
+                     headers=uid_header(u2))
+
+    s = await read_stats(client, film)
+    assert s["ratings_hist"]["2"] == 1 and s["ratings_hist"]["8"] == 1
+    assert s["ratings_hist"]["5"] == 0
+    assert s["ratings_sumsq"] == 68
+    assert s["rating_stddev"] == pytest.approx(3.0)
+
+    await client.delete(f"/api/v1/ratings/{film}", headers=uid_header(u1))
+    s = await read_stats(client, film)
+    assert s["ratings_hist"]["2"] == 0 and s["rating_stddev"] == 0.0
@@ -0,0 +1,79 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from ugc_api.services.repositories.group_commit import GroupCommitter
+
+
+class FakeCollection:
+    """bulk_write: новые ключи — upsert, уже виденные — дубль ключа."""
+
+    name = "likes"
+    full_name = "test.likes"
+
+    def __init__(self):
+        self.batches = []
+        self.seen = set()
+
+    async def bulk_write(self, ops, ordered):
+        assert ordered is False
+        self.batches.append(ops)
+        upserted, errors = [], []
+        for index, op in enumerate(ops):
+            key = op._filter["k"]
+            if key in self.seen:
+                errors.append({"index": index, "code": 11000})
+            else:
+                self.seen.add(key)
+                upserted.append({"index": index, "_id": key})
+        if errors:
+            raise BulkWriteError({"writeErrors": errors,
+                                  "upserted": upserted})
+        return SimpleNamespace(
+            upserted_ids={u["index"]: u["_id"] for u in upserted})
+
+
+def _op(key):
+    return UpdateOne({"k": key}, {"$set": {"v": 1}}, upsert=True)
+
+
+async def test_group_commit_batches_and_resolves_each_caller():
+    col = FakeCollection()
+    committer = GroupCommitter(col, window_ms=5, max_ops=100)
+
+    results = await asyncio.gather(
+        *(committer.submit(key, _op(key)) for key in ("a", "b", "c")))
+    assert len(col.batches) == 1
+    assert all(r.upserted for r in results)
+
+    # тот же ключ внутри одного окна уходит следующим батчем, по порядку
+    first, second = await asyncio.gather(
+        committer.submit("d", _op("d")), committer.submit("d", _op("d")))
+    assert first.upserted and second.duplicate
+    assert [len(b) for b in col.batches] == [3, 1, 1]
+    await committer.close()
+
+
+class HangingCollection(FakeCollection):
+    """bulk_write, который не завершается (отменяем задачу сброса)."""
+
+    async def bulk_write(self, ops, ordered):
+        self.batches.append(ops)
+        await asyncio.Event().wait()
+
+
+async def test_group_commit_cancelled_flush_releases_waiters_and_keys():
+    col = HangingCollection()
+    committer = GroupCommitter(col, window_ms=1, max_ops=100)
+    pending = asyncio.ensure_future(committer.submit("a", _op("a")))
+    while not col.batches:
+        await asyncio.sleep(0.001)
+
+    for task in list(committer._inflight):
+        task.cancel()
+    with pytest.raises(PyMongoError):
+        await pending
+    assert not committer._keys
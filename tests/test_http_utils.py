@@ -1,7 +1,11 @@
+from datetime import datetime, timezone
 from http import HTTPStatus
 import pytest
-from ugc_api.api.http_utils import handle_runtime_errors, not_found_if_none
+from ugc_api.api.http_utils import (
+    handle_runtime_errors, is_not_modified, make_etag, not_found_if_none,
+)
 from fastapi import HTTPException
+from starlette.requests import Request
 
 
 def test_not_found_if_none_raises_404_with_detail():
@@ -36,3 +40,23 @@ async def test_handle_runtime_errors_happy_path_returns_value():
     async def ok():
         return "ok"
     assert await ok() == "ok"
+
+
+def _request(headers: dict) -> Request:
+    raw = [(k.lower().encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "headers": raw})
+
+
+def test_is_not_modified_prefers_etag_over_if_modified_since():
+    etag = make_etag("film", 1)
+    stamp = datetime(2024, 5, 1, 12, 0, 0, 500, tzinfo=timezone.utc)
+    assert is_not_modified(_request({"If-None-Match": etag}), etag)
+    assert is_not_modified(
+        _request({"If-None-Match": etag.removeprefix("W/")}), etag)
+    assert not is_not_modified(
+        _request({"If-None-Match": make_etag("film", 2),
+                  "If-Modified-Since": "Wed, 01 May 2024 12:00:00 GMT"}),
+        etag, stamp)
+    assert is_not_modified(
+        _request({"If-Modified-Since": "Wed, 01 May 2024 12:00:00 GMT"}),
+        etag, stamp)
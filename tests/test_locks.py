@@ -0,0 +1,23 @@
+import asyncio
+
+from ugc_api.core.locks import StripedLocks
+from ugc_api.core.metrics import metrics
+
+
+async def test_striped_locks_serialize_same_key():
+    locks = StripedLocks(stripes=8, name="test")
+    inside, peak = 0, 0
+
+    async def worker():
+        nonlocal inside, peak
+        async with locks.hold(("review", "r1")):
+            inside += 1
+            peak = max(peak, inside)
+            await asyncio.sleep(0.01)
+            inside -= 1
+
+    await asyncio.gather(*(worker() for _ in range(5)))
+    assert peak == 1
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["test_lock_contended"] >= 4
+    assert snapshot["summaries"]["test_lock_wait_ms"]["count"] >= 5
@@ -0,0 +1,29 @@
+from tests.helpers import new_user, new_film, uid_header
+
+BASE = "/api/v1/me/state"
+
+
+async def test_me_state_returns_like_rating_and_bookmark_per_film(client):
+    user, liked, rated, plain = new_user(), new_film(), new_film(), new_film()
+    await client.put(f"/api/v1/likes/{liked}", json={"value": -1},
+                     headers=uid_header(user))
+    await client.put(f"/api/v1/ratings/{rated}?score=9",
+                     headers=uid_header(user))
+    await client.put(f"/api/v1/bookmarks/{rated}", headers=uid_header(user))
+
+    r = await client.post(BASE, json={"film_ids": [plain, liked, rated]},
+                          headers=uid_header(user))
+    assert r.status_code == 200
+    items = r.json()["items"]
+    assert list(items) == [plain, liked, rated]
+    assert items[plain] == {"like": None, "rating": None, "bookmarked": False}
+    assert items[liked]["like"] == -1
+    assert items[rated] == {"like": None, "rating": 9, "bookmarked": True}
+
+
+async def test_me_state_is_per_user(client):
+    film, owner, other = new_film(), new_user(), new_user()
+    await client.put(f"/api/v1/bookmarks/{film}", headers=uid_header(owner))
+    r = await client.post(BASE, json={"film_ids": [film]},
+                          headers=uid_header(other))
+    assert r.json()["items"][film]["bookmarked"] is False
@@ -2,11 +2,17 @@
 
 from __future__ import annotations
 
+import asyncio
+import json
+
 import pytest
+from pymongo.errors import PyMongoError
 
 from tests.helpers import new_film, new_user, read_stats, uid_header
 from ugc_api.dependencies import get_db
+from ugc_api.models.ratings import RatingBulkLine
 from ugc_api.services.ratings_service import RatingsService
+from ugc_api.services.repositories.ratings_repo import BulkUpsertResult
 
 
 # ---------------------------------------------------------------------------
@@ -201,3 +207,80 @@ async def test_ratings_service_fallback_stats_for_empty_film():
     assert resp.avg_rating is None
     assert isinstance(resp.likes, int)
     assert isinstance(resp.dislikes, int)
+
+
+async def test_rating_concurrent_double_submit_keeps_stats_consistent(client):
+    film, user = new_film(), new_user()
+
+    await asyncio.gather(*(
+        client.put(f"/api/v1/ratings/{film}?score={score}",
+                   headers=uid_header(user))
+        for score in (3, 8, 6)
+    ))
+
+    r = await client.get(f"/api/v1/ratings/{film}", headers=uid_header(user))
+    s = await read_stats(client, film)
+    assert s["ratings_count"] == 1
+    assert s["ratings_sum"] == r.json()["score"]
+
+
+async def test_ratings_bulk_ndjson_applies_lines_and_folds_stats(client):
+    film, other, user = new_film(), new_film(), new_user()
+    body = "\n".join([
+        json.dumps({"film_id": film, "score": 4}),
+        "not json",
+        json.dumps({"film_id": other, "score": 8}),
+        json.dumps({"film_id": film, "score": 6}),
+    ])
+    r = await client.post("/api/v1/ratings:bulk", content=body,
+                          headers=uid_header(user))
+    assert r.status_code == 200
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert [row.get("ok") for row in rows[:4]] == [True, False, True, True]
+    assert rows[3]["previous"] == 4
+    assert rows[-1]["summary"] == {"ok": 3, "errors": 1, "aborted": False}
+
+    s = await read_stats(client, film)
+    assert s["ratings_count"] == 1 and s["ratings_sum"] == 6
+    s = await read_stats(client, other)
+    assert s["ratings_count"] == 1 and s["ratings_sum"] == 8
+
+
+class ConflictingRepo:
+    """Оценку второго фильма успели изменить между чтением и записью."""
+
+    def __init__(self):
+        self.upserts = []
+
+    async def scores_for_films(self, user_id, film_ids):
+        return {film_ids[1]: 3}
+
+    async def bulk_upsert(self, user_id, items):
+        return BulkUpsertResult(failed=set(), conflicts={1}, inserted=set())
+
+    async def upsert(self, user_id, film_id, score):
+        self.upserts.append(film_id)
+        return {"score": 9}
+
+
+class FailingStats:
+    async def apply_bulk_deltas(self, deltas):
+        raise PyMongoError("stats down")
+
+
+async def test_ratings_bulk_retries_conflicts_and_keeps_written_lines():
+    svc = RatingsService({"ratings": None}, FailingStats())
+    svc.repo = ConflictingRepo()
+    film, other = new_film(), new_film()
+    chunk = [(1, RatingBulkLine(film_id=film, score=4)),
+             (2, RatingBulkLine(film_id=other, score=6))]
+
+    rows = []
+    with pytest.raises(RuntimeError, match="ratings_bulk_aborted"):
+        async for row in svc._apply_chunk("u", chunk):
+            rows.append(row)
+
+    assert svc.repo.upserts == [other]
+    assert [row["ok"] for row in rows] == [True, True]
+    # прежняя оценка — из атомарного повтора, а не из чтения до записи
+    assert rows[0]["previous"] is None and rows[1]["previous"] == 9
@@ -1,5 +1,10 @@
+import asyncio
+
+import pytest
 from bson import ObjectId
+from pymongo.errors import PyMongoError
 from tests.helpers import new_user, new_film, uid_header, read_stats
+from ugc_api.services.review_purger import ReviewPurger
 
 BASE = "/api/v1/reviews"
 
@@ -110,3 +115,197 @@ async def test_delete_by_stranger_returns_404(client):
 
     r = await client.delete(f"{BASE}/{rid}", headers=uid_header(stranger))
     assert r.status_code == 404  # review_not_found_or_not_author
+
+
+async def test_reviews_list_revalidates_with_etag_until_changed(client):
+    film, author = new_film(), new_user()
+    await client.post(BASE, json={"film_id": film, "text": "a"},
+                      headers=uid_header(author))
+    r = await client.get(f"{BASE}/films/{film}")
+    etag = r.headers["etag"]
+    assert "stale-while-revalidate" in r.headers["cache-control"]
+
+    r = await client.get(f"{BASE}/films/{film}",
+                         headers={"If-None-Match": etag})
+    assert r.status_code == 304 and r.content == b""
+
+    await client.post(BASE, json={"film_id": film, "text": "b"},
+                      headers=uid_header(author))
+    r = await client.get(f"{BASE}/films/{film}",
+                         headers={"If-None-Match": etag})
+    assert r.status_code == 200 and len(r.json()["items"]) == 2
+
+
+async def test_reviews_list_total_from_counter_or_skipped(client):
+    film, author = new_film(), new_user()
+    for text in ("a", "b"):
+        await client.post(BASE, json={"film_id": film, "text": text},
+                          headers=uid_header(author))
+    url = f"{BASE}/films/{film}"
+    assert (await client.get(url)).json()["total"] == 2
+    exact = await client.get(url, params={"exact_total": "true"})
+    assert exact.json()["total"] == 2
+    skipped = await client.get(url, params={"with_total": "false"})
+    assert skipped.json()["total"] is None
+    assert len(skipped.json()["items"]) == 2
+
+
+async def test_reviews_list_total_changes_only_with_etag(client):
+    film, author = new_film(), new_user()
+    rids = [(await client.post(
+        BASE, json={"film_id": film, "text": text},
+        headers=uid_header(author))).json()["review_id"]
+        for text in ("a", "b")]
+    url = f"{BASE}/films/{film}"
+    r = await client.get(url)
+    assert r.json()["total"] == 2
+    etag = r.headers["etag"]
+
+    # удалённая рецензия сразу пропадает и из total, до фоновой очистки
+    await client.delete(f"{BASE}/{rids[0]}", headers=uid_header(author))
+    r = await client.get(url, headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.json()["total"] == 1 and len(r.json()["items"]) == 1
+
+
+async def test_reviews_cursor_pages_match_full_list_for_both_sorts(client):
+    film, author, voter = new_film(), new_user(), new_user()
+    rids = []
+    for text in "abcde":
+        r = await client.post(BASE, json={"film_id": film, "text": text},
+                              headers=uid_header(author))
+        rids.append(r.json()["review_id"])
+    for rid in rids[1::2]:
+        await client.post(f"{BASE}/{rid}/vote", json={"value": "up"},
+                          headers=uid_header(voter))
+
+    url = f"{BASE}/films/{film}"
+    for sort in ("new", "top"):
+        full = (await client.get(url, params={"sort": sort})).json()
+        seen, cursor = [], None
+        while True:
+            params = {"sort": sort, "limit": 2,
+                      **({"cursor": cursor} if cursor else {})}
+            body = (await client.get(url, params=params)).json()
+            seen += [i["review_id"] for i in body["items"]]
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+        assert seen == [i["review_id"] for i in full["items"]]
+        assert len(seen) == 5
+
+    # курсор одной сортировки не подходит к другой
+    first = (await client.get(url, params={"sort": "new", "limit": 2}))
+    r = await client.get(url, params={
+        "sort": "top", "cursor": first.json()["next_cursor"]})
+    assert r.status_code == 400
+
+
+async def test_reviews_sorted_best_and_hot_use_up_and_down_votes(client):
+    film, author = new_film(), new_user()
+    voters = [new_user() for _ in range(3)]
+    rids = []
+    for text in ("liked", "plain", "disliked"):
+        r = await client.post(BASE, json={"film_id": film, "text": text},
+                              headers=uid_header(author))
+        rids.append(r.json()["review_id"])
+    liked, plain, disliked = rids
+    for voter in voters:
+        await client.post(f"{BASE}/{liked}/vote", json={"value": "up"},
+                          headers=uid_header(voter))
+        await client.post(f"{BASE}/{disliked}/vote", json={"value": "down"},
+                          headers=uid_header(voter))
+
+    url = f"{BASE}/films/{film}"
+    best = (await client.get(url, params={"sort": "best"})).json()
+    assert [i["review_id"] for i in best["items"]][0] == liked
+    hot = (await client.get(url, params={"sort": "hot"})).json()
+    assert [i["review_id"] for i in hot["items"]] == [liked, plain, disliked]
+
+
+async def test_vote_for_missing_review_returns_404_and_leaves_no_vote(client):
+    user, rid = new_user(), str(ObjectId())
+    r = await client.post(f"{BASE}/{rid}/vote", json={"value": "up"},
+                          headers=uid_header(user))
+    assert r.status_code == 404
+    # upsert голоса откатился вместе с транзакцией
+    r = await client.delete(f"{BASE}/{rid}/vote", headers=uid_header(user))
+    assert r.json() == {"ok": True, "applied": False}
+
+
+async def test_delete_tombstones_review_and_purges_votes_in_background(
+        client):
+    film, author, voter = new_film(), new_user(), new_user()
+    rid = (await client.post(
+        BASE, json={"film_id": film, "text": "t"}, headers=uid_header(author)
+    )).json()["review_id"]
+    await client.post(f"{BASE}/{rid}/vote", json={"value": "up"},
+                      headers=uid_header(voter))
+
+    r = await client.delete(f"{BASE}/{rid}", headers=uid_header(author))
+    assert r.status_code == 204
+    # скрыта сразу: ни чтения, ни списка, ни голосов
+    assert (await client.get(f"{BASE}/{rid}")).status_code == 404
+    listed = (await client.get(f"{BASE}/films/{film}")).json()["items"]
+    assert rid not in [i["review_id"] for i in listed]
+    r = await client.post(f"{BASE}/{rid}/vote", json={"value": "down"},
+                          headers=uid_header(new_user()))
+    assert r.status_code == 404
+
+    # film_stats обновляется один раз — когда пургер удалил документ
+    for _ in range(50):
+        stats = await read_stats(client, film)
+        if stats["reviews_count"] == 0:
+            break
+        await asyncio.sleep(0.1)
+    assert stats["reviews_count"] == 0 and stats["votes_up"] == 0
+
+
+class TombstoneRepo:
+    """Надгробие рецензии с одним голосом «за»."""
+
+    def __init__(self):
+        self.doc = {"film_id": "f", "votes": {"up": 1}}
+        self.removed = False
+
+    async def get_tombstone(self, review_id):
+        return None if self.removed else dict(self.doc)
+
+    async def set_purge_votes(self, review_id, votes):
+        self.doc.setdefault("purge_votes", votes)
+
+    async def remove_tombstone(self, review_id):
+        self.removed = True
+        return self.doc
+
+    async def bump_version(self, film_id):
+        pass
+
+
+class FlakyStats:
+    """Статистика, пишущая мимо запроса и падающая на первой дельте."""
+
+    writes_inline = False
+
+    def __init__(self):
+        self.applied = []
+
+    async def apply_review_deleted(self, film_id, votes_up, votes_down):
+        if not self.applied:
+            self.applied.append(None)
+            raise PyMongoError("stats down")
+        self.applied.append((film_id, votes_up, votes_down))
+
+
+async def test_purger_keeps_tombstone_until_stats_delta_is_applied():
+    purger = ReviewPurger.__new__(ReviewPurger)
+    purger.repo, purger.stats = TombstoneRepo(), FlakyStats()
+
+    with pytest.raises(PyMongoError):
+        await purger._remove_after_stats("rid")
+    assert not purger.repo.removed
+    assert purger.repo.doc["purge_votes"] == {"up": 1}
+
+    assert await purger._remove_after_stats("rid") is not None
+    assert purger.repo.removed
+    assert purger.stats.applied[-1] == ("f", 1, 0)
@@ -0,0 +1,73 @@
+from pymongo.errors import OperationFailure
+
+from ugc_api.core.metrics import metrics
+from ugc_api.db.transactions import run_transaction
+
+
+class FakeSession:
+    """Сессия, коммит которой падает с заданными метками ошибок."""
+
+    def __init__(self, commit_labels):
+        self.commit_labels = list(commit_labels)
+        self.in_transaction = False
+        self.commits = 0
+        self.aborts = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def start_transaction(self):
+        self.in_transaction = True
+
+    async def abort_transaction(self):
+        self.in_transaction = False
+        self.aborts += 1
+
+    async def commit_transaction(self):
+        self.commits += 1
+        if self.commit_labels:
+            label = self.commit_labels.pop(0)
+            raise OperationFailure("boom", 112, {"errorLabels": [label]})
+        self.in_transaction = False
+
+
+class FakeClient:
+    def __init__(self, session):
+        self.session = session
+
+    async def start_session(self):
+        return self.session
+
+
+async def test_run_transaction_retries_transient_and_unknown_commit():
+    session = FakeSession(["TransientTransactionError",
+                           "UnknownTransactionCommitResult"])
+    calls = []
+
+    async def body(s):
+        calls.append(s)
+        return "done"
+
+    result = await run_transaction(FakeClient(session), body, name="t1")
+    assert result == "done"
+    # повтор всей транзакции + повтор одного коммита
+    assert len(calls) == 2 and session.commits == 3
+    assert metrics.snapshot()["summaries"]["t1_txn_attempts"]["last"] == 2
+
+
+async def test_run_transaction_aborts_and_propagates_body_error():
+    session = FakeSession([])
+
+    async def body(s):
+        raise RuntimeError("review_not_found")
+
+    try:
+        await run_transaction(FakeClient(session), body, name="t2")
+    except RuntimeError as error:
+        assert str(error) == "review_not_found"
+    else:
+        raise AssertionError("expected RuntimeError")
+    assert session.aborts == 1 and session.commits == 0
@@ -1,6 +1,10 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 from functools import wraps
 from http import HTTPStatus
-from fastapi import HTTPException
+from typing import AsyncIterator, Optional, Tuple
+from fastapi import HTTPException, Request, Response
 
 
 def handle_runtime_errors(mapping: dict[str, HTTPStatus]):
@@ -32,3 +36,91 @@ def not_found_if_none(value, detail: str = "review_not_found"):
     if value is None:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=detail)
     return value
+
+
+def make_etag(*parts: object) -> str:
+    """Слабый ETag из частей «версии» ответа (updated_at, параметры)."""
+    raw = "|".join("" if part is None else str(part) for part in parts)
+    digest = hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def is_not_modified(
+        request: Request,
+        etag: str,
+        last_modified: Optional[datetime] = None) -> bool:
+    """
+    Условный GET по RFC 9110: If-None-Match (слабое сравнение) важнее
+    If-Modified-Since; последний сравниваем с точностью до секунды.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/")
+                for tag in if_none_match.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+
+def conditional_response(
+        request: Request,
+        response: Response,
+        etag: str,
+        last_modified: Optional[datetime],
+        cache_control: str) -> Optional[Response]:
+    """
+    Ставит ETag / Last-Modified / Cache-Control на ответ ручки и, если
+    клиентская копия актуальна, возвращает готовый 304 без тела.
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(
+            last_modified.astimezone(timezone.utc), usegmt=True)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+async def iter_ndjson_lines(
+        stream: AsyncIterator[bytes],
+        max_line_bytes: int) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """
+    Построчно режет поток тела запроса (NDJSON), не держа в памяти больше
+    одной строки. Отдаёт (номер строки, байты); None — строка длиннее
+    max_line_bytes (её остаток пропускается). Пустые строки не отдаются.
+    """
+    buf = bytearray()
+    line_no = 0
+    overflow = False
+    async for chunk in stream:
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            piece = chunk[start:] if end == -1 else chunk[start:end]
+            if not overflow:
+                buf += piece
+                overflow = len(buf) > max_line_bytes
+                if overflow:
+                    buf.clear()
+            if end == -1:
+                break
+            line_no += 1
+            if overflow:
+                yield line_no, None
+            elif buf.strip():
+                yield line_no, bytes(buf)
+            buf.clear()
+            overflow = False
+            start = end + 1
+    if overflow or buf.strip():
+        yield line_no + 1, None if overflow else bytes(buf)
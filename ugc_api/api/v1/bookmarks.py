@@ -1,7 +1,9 @@
+from typing import Optional
 from uuid import UUID
 from http import HTTPStatus
 from fastapi import APIRouter, Depends, Query
 
+from ugc_api.api.http_utils import handle_runtime_errors
 from ugc_api.dependencies import user_id_header, get_bookmarks_service
 from ugc_api.services.bookmarks_service import BookmarksService
 from ugc_api.models.bookmarks import (
@@ -10,6 +12,10 @@ from ugc_api.models.bookmarks import (
 
 router = APIRouter(prefix="/api/v1/bookmarks", tags=["bookmarks"])
 
+ERRMAP = {
+    "invalid_cursor": HTTPStatus.BAD_REQUEST,
+}
+
 
 @router.put(
     "/{film_id}",
@@ -39,11 +45,17 @@ async def remove_bookmark(
     "",
     response_model=BookmarkListResponse,
     status_code=HTTPStatus.OK)
+@handle_runtime_errors(ERRMAP)
 async def list_bookmarks(
     user_id: str = Depends(user_id_header),
     limit: int = Query(20, ge=1, le=100),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="устарело: используйте cursor"),
+    cursor: Optional[str] = Query(None),
+    with_total: bool = Query(True, description="false — не считать total"),
+    exact_total: bool = Query(
+        False, description="точный count_documents вместо счётчика"),
     svc: BookmarksService = Depends(get_bookmarks_service),
 ):
     return await svc.list_bookmarks(
-        user_id=user_id, limit=limit, offset=offset)
+        user_id=user_id, limit=limit, offset=offset, cursor=cursor,
+        with_total=with_total, exact_total=exact_total)
@@ -1,17 +1,130 @@
+from datetime import datetime, timezone
+from typing import List, Optional, Union
 from uuid import UUID
 from http import HTTPStatus
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request, Response
+from ugc_api.api.http_utils import (
+    conditional_response,
+    handle_runtime_errors,
+    make_etag,
+)
+from ugc_api.core.config import settings
 from ugc_api.dependencies import get_film_stats_service
-from ugc_api.models.film_stats import FilmStats
+from ugc_api.models.film_stats import (
+    FILM_STATS_BATCH_MAX,
+    FILM_STATS_TOP_MAX,
+    FilmStats,
+    FilmStatsBatchRequest,
+    FilmStatsBatchResponse,
+    FilmStatsPoint,
+    FilmStatsStep,
+    FilmStatsTimeseriesResponse,
+    FilmStatsTopBy,
+    FilmStatsTopResponse,
+)
 from ugc_api.services.film_stats_service import FilmStatsService
+from ugc_api.services.repositories.film_stats_repo import BUCKET_STEPS
 
 router = APIRouter(prefix="/api/v1/film-stats", tags=["film-stats"])
 
+ERRMAP = {
+    "invalid_cursor": HTTPStatus.BAD_REQUEST,
+    "invalid_range": HTTPStatus.BAD_REQUEST,
+    "timeseries_too_many_points": HTTPStatus.BAD_REQUEST,
+}
+
+# окно по умолчанию — столько последних корзин
+TIMESERIES_DEFAULT_POINTS = 24
+
+
+def _utc(value: datetime) -> datetime:
+    """Время без зоны считаем UTC."""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+async def _batch(
+        svc: FilmStatsService,
+        film_ids: List[UUID]) -> FilmStatsBatchResponse:
+    docs = await svc.get_stats_many([str(film_id) for film_id in film_ids])
+    return FilmStatsBatchResponse(items=[FilmStats(**doc) for doc in docs])
+
+
+@router.get(":batch",
+            response_model=FilmStatsBatchResponse,
+            status_code=HTTPStatus.OK)
+async def get_film_stats_batch(
+    ids: List[UUID] = Query(..., min_length=1,
+                            max_length=FILM_STATS_BATCH_MAX),
+    svc: FilmStatsService = Depends(get_film_stats_service),
+) -> FilmStatsBatchResponse:
+    return await _batch(svc, ids)
+
+
+@router.post(":batch",
+             response_model=FilmStatsBatchResponse,
+             status_code=HTTPStatus.OK)
+async def post_film_stats_batch(
+    body: FilmStatsBatchRequest,
+    svc: FilmStatsService = Depends(get_film_stats_service),
+) -> FilmStatsBatchResponse:
+    return await _batch(svc, body.film_ids)
+
+
+@router.get("/top",
+            response_model=FilmStatsTopResponse,
+            status_code=HTTPStatus.OK)
+@handle_runtime_errors(ERRMAP)
+async def get_film_stats_top(
+    by: FilmStatsTopBy = Query("avg_rating"),
+    limit: int = Query(20, ge=1, le=FILM_STATS_TOP_MAX),
+    cursor: Optional[str] = Query(None),
+    svc: FilmStatsService = Depends(get_film_stats_service),
+) -> FilmStatsTopResponse:
+    docs, next_cursor = await svc.top(by, limit, cursor)
+    return FilmStatsTopResponse(items=[FilmStats(**doc) for doc in docs],
+                                next_cursor=next_cursor)
+
 
 @router.get("/{film_id}", response_model=FilmStats, status_code=HTTPStatus.OK)
 async def get_film_stats(
+    request: Request,
+    response: Response,
     film_id: UUID,
     svc: FilmStatsService = Depends(get_film_stats_service),
-) -> FilmStats:
+) -> Union[FilmStats, Response]:
+    # документ обычно приходит из кэша; на 304 модель не собираем
     doc = await svc.get_stats(str(film_id))
+    updated_at = doc.get("updated_at")
+    not_modified = conditional_response(
+        request, response,
+        etag=make_etag(film_id, updated_at),
+        last_modified=updated_at,
+        cache_control=settings.film_stats_cache_control,
+    )
+    if not_modified is not None:
+        return not_modified
     return FilmStats(**doc)
+
+
+@router.get("/{film_id}/timeseries",
+            response_model=FilmStatsTimeseriesResponse,
+            status_code=HTTPStatus.OK)
+@handle_runtime_errors(ERRMAP)
+async def get_film_stats_timeseries(
+    film_id: UUID,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    step: FilmStatsStep = Query("hour"),
+    svc: FilmStatsService = Depends(get_film_stats_service),
+) -> FilmStatsTimeseriesResponse:
+    end = _utc(end) if end else datetime.now(timezone.utc)
+    if start is None:
+        start = end - TIMESERIES_DEFAULT_POINTS * BUCKET_STEPS[step]
+    points = await svc.timeseries(str(film_id), _utc(start), end, step)
+    return FilmStatsTimeseriesResponse(
+        film_id=str(film_id),
+        step=step,
+        points=[FilmStatsPoint(**point) for point in points],
+    )
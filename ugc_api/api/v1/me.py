@@ -0,0 +1,20 @@
+from http import HTTPStatus
+from fastapi import APIRouter, Depends
+
+from ugc_api.dependencies import get_me_service, user_id_header
+from ugc_api.models.me import MeStateRequest, MeStateResponse
+from ugc_api.services.me_service import MeService
+
+router = APIRouter(prefix="/api/v1/me", tags=["me"])
+
+
+@router.post("/state",
+             response_model=MeStateResponse,
+             status_code=HTTPStatus.OK)
+async def get_my_state(
+    body: MeStateRequest,
+    user_id: str = Depends(user_id_header),
+    svc: MeService = Depends(get_me_service),
+) -> MeStateResponse:
+    return await svc.get_state(
+        user_id, [str(film_id) for film_id in body.film_ids])
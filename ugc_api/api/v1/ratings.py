@@ -1,13 +1,95 @@
+import json
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, Iterator, Optional, Tuple, Union
 from uuid import UUID
 from http import HTTPStatus
-from fastapi import APIRouter, Depends, Query, Response
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 
+from ugc_api.api.http_utils import handle_runtime_errors, iter_ndjson_lines
+from ugc_api.core.config import settings
 from ugc_api.dependencies import get_ratings_service, user_id_header
 from ugc_api.services.ratings_service import RatingsService
-from ugc_api.models.ratings import RatingGetResponse, RatingPutResponse
+from ugc_api.models.ratings import (
+    RATINGS_BULK_MAX_LINE_BYTES,
+    RatingBulkLine,
+    RatingGetResponse,
+    RatingListResponse,
+    RatingPutResponse,
+)
 
 router = APIRouter(prefix="/api/v1/ratings", tags=["ratings"])
 
+ERRMAP = {
+    "invalid_cursor": HTTPStatus.BAD_REQUEST,
+}
+
+
+async def _parse_bulk_lines(
+        request: Request,
+) -> AsyncIterator[Tuple[int, Union[RatingBulkLine, str]]]:
+    async for line_no, raw in iter_ndjson_lines(
+            request.stream(), RATINGS_BULK_MAX_LINE_BYTES):
+        if raw is None:
+            yield line_no, "line_too_long"
+            continue
+        try:
+            yield line_no, RatingBulkLine.model_validate_json(raw)
+        except ValidationError:
+            yield line_no, "invalid_line"
+
+
+def _drain(spool: SpooledTemporaryFile) -> Iterator[bytes]:
+    try:
+        while chunk := spool.read(64 * 1024):
+            yield chunk
+    finally:
+        spool.close()
+
+
+@router.post(":bulk", status_code=HTTPStatus.OK)
+async def bulk_set_ratings(
+    request: Request,
+    user_id: str = Depends(user_id_header),
+    svc: RatingsService = Depends(get_ratings_service),
+) -> StreamingResponse:
+    """
+    Потоковая загрузка оценок пользователя из X-User-Id: тело — NDJSON
+    {"film_id", "score"}. Ответ — NDJSON с результатом по каждой строке и
+    итоговой строкой {"summary": ...}. Тело читается целиком до начала
+    ответа, результаты копятся в SpooledTemporaryFile (память ограничена).
+    """
+    spool = SpooledTemporaryFile(max_size=settings.ratings_bulk_spool_bytes)
+    summary = {"ok": 0, "errors": 0, "aborted": False}
+    try:
+        async for result in svc.bulk_put(user_id, _parse_bulk_lines(request)):
+            summary["ok" if result["ok"] else "errors"] += 1
+            spool.write(json.dumps(result).encode() + b"\n")
+    except RuntimeError:
+        # чанк упал на ошибке Mongo — остаток тела не применяем
+        summary["aborted"] = True
+    spool.write(json.dumps({"summary": summary}).encode() + b"\n")
+    spool.seek(0)
+    return StreamingResponse(_drain(spool),
+                             media_type="application/x-ndjson")
+
+
+@router.get(
+    "",
+    response_model=RatingListResponse,
+    status_code=HTTPStatus.OK)
+@handle_runtime_errors(ERRMAP)
+async def list_ratings(
+    user_id: str = Depends(user_id_header),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, description="устарело: используйте cursor"),
+    cursor: Optional[str] = Query(None),
+    svc: RatingsService = Depends(get_ratings_service),
+) -> RatingListResponse:
+    return await svc.list_ratings(
+        user_id=user_id, limit=limit, offset=offset, cursor=cursor)
+
 
 @router.put(
     "/{film_id}",
@@ -1,6 +1,11 @@
+from typing import Optional
 from uuid import UUID
 from http import HTTPStatus
-from fastapi import APIRouter, Depends, Path, Query, HTTPException
+from fastapi import (
+    APIRouter, Depends, Path, Query, HTTPException, Request, Response,
+)
+
+from ugc_api.core.config import settings
 
 from ugc_api.dependencies import user_id_header, get_reviews_service
 from ugc_api.services.reviews_service import ReviewsService
@@ -10,13 +15,16 @@ from ugc_api.models.reviews import (
     ReviewUpdateRequest, ReviewUpdateResponse,
     ReviewVoteRequest, ReviewVoteResponse,
 )
-from ugc_api.api.http_utils import handle_runtime_errors, not_found_if_none
+from ugc_api.api.http_utils import (
+    conditional_response, handle_runtime_errors, make_etag, not_found_if_none,
+)
 
 router = APIRouter(prefix="/api/v1/reviews", tags=["reviews"])
 
 ERRMAP = {
     "review_not_found": HTTPStatus.NOT_FOUND,
     "review_not_found_or_not_author": HTTPStatus.NOT_FOUND,
+    "invalid_cursor": HTTPStatus.BAD_REQUEST,
 }
 
 
@@ -47,16 +55,37 @@ async def get_review(
             status_code=HTTPStatus.OK)
 @handle_runtime_errors(ERRMAP)
 async def list_reviews_by_film(
+    request: Request,
+    response: Response,
     film_id: UUID,
     limit: int = Query(20, ge=1, le=100),
-    offset: int = Query(0, ge=0),
-    sort: str = Query("new", pattern="^(new|top)$"),
+    offset: int = Query(0, ge=0, description="устарело: используйте cursor"),
+    cursor: Optional[str] = Query(None),
+    sort: str = Query("new", pattern="^(new|top|hot|best)$"),
+    with_total: bool = Query(True, description="false — не считать total"),
+    exact_total: bool = Query(
+        False, description="точный count_documents вместо счётчика"),
     svc: ReviewsService = Depends(get_reviews_service),
 ):
+    # ревалидация — по версии списка, без чтения самих рецензий
+    state = await svc.list_version(str(film_id))
+    not_modified = conditional_response(
+        request, response,
+        etag=make_etag(film_id, state.version, sort, limit, offset, cursor,
+                       with_total, exact_total),
+        last_modified=state.updated_at,
+        cache_control=settings.reviews_cache_control,
+    )
+    if not_modified is not None:
+        return not_modified
     return await svc.list_by_film(film_id=str(film_id),
                                   limit=limit,
                                   offset=offset,
-                                  sort=sort)
+                                  sort=sort,
+                                  with_total=with_total,
+                                  exact_total=exact_total,
+                                  cursor=cursor,
+                                  state=state)
 
 
 @router.patch("/{review_id}",
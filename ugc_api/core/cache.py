@@ -0,0 +1,83 @@
+"""Bounded in-process LRU cache with per-entry TTL."""
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable, Optional, Tuple
+
+from ugc_api.core.metrics import metrics
+
+
+class TTLCache:
+    """LRU cache whose entries also expire after `ttl` seconds.
+
+    Not thread-safe: meant to be used from a single event loop.
+    Hits/misses/evictions are counted locally and in `metrics`
+    under the `<name>_cache_*` keys.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, name: str = "cache") -> None:
+        """Create cache for at most `maxsize` entries."""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return cached value (refreshing LRU position) or `default`."""
+        entry = self._data.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._data.move_to_end(key)
+            self._count("hits")
+            return entry[1]
+        if entry is not None:
+            # протухла — выкидываем сразу, чтобы не занимала место
+            del self._data[key]
+        self._count("misses")
+        return default
+
+    def set(
+            self,
+            key: Hashable,
+            value: Any,
+            ttl: Optional[float] = None) -> None:
+        """Store value; evicts least recently used entries when full."""
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self._count("evictions")
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop a single entry if present."""
+        self._data.pop(key, None)
+
+    def invalidate_many(self, keys: Iterable[Hashable]) -> None:
+        """Drop several entries."""
+        for key in keys:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop everything."""
+        self._data.clear()
+
+    def stats(self) -> dict:
+        """Return counters for diagnostics."""
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _count(self, counter: str) -> None:
+        setattr(self, counter, getattr(self, counter) + 1)
+        metrics.inc(f"{self.name}_cache_{counter}")
@@ -18,6 +18,103 @@ class Settings(BaseSettings):
     sentry_dsn: str = Field(default="", alias="SENTRY_DSN")
     sentry_test_enabled: bool = Field(default=False,
                                       alias="SENTRY_TEST_ENABLED")
+
+    # false — агрегаты film_stats ведёт проектор на change streams
+    film_stats_inline_updates: bool = Field(
+        default=True, alias="FILM_STATS_INLINE_UPDATES")
+    # film_stats write-behind: копим $inc в памяти и пишем одним bulk_write
+    film_stats_write_behind: bool = Field(default=False,
+                                          alias="FILM_STATS_WRITE_BEHIND")
+    film_stats_flush_interval_ms: int = Field(
+        default=200, alias="FILM_STATS_FLUSH_INTERVAL_MS")
+    film_stats_flush_max_keys: int = Field(
+        default=500, alias="FILM_STATS_FLUSH_MAX_KEYS")
+    film_stats_buffer_max_keys: int = Field(
+        default=10_000, alias="FILM_STATS_BUFFER_MAX_KEYS")
+
+    # in-process LRU+TTL кэш film_stats (size=0 — выключен)
+    film_stats_cache_size: int = Field(default=10_000,
+                                       alias="FILM_STATS_CACHE_SIZE")
+    film_stats_cache_ttl_s: float = Field(default=5.0,
+                                          alias="FILM_STATS_CACHE_TTL_S")
+    # негативный кэш: сколько помнить, что статистики по фильму нет
+    film_stats_negative_ttl_s: float = Field(
+        default=2.0, alias="FILM_STATS_NEGATIVE_TTL_S")
+
+    # sharded counters для «горячих» фильмов
+    film_stats_sharding_enabled: bool = Field(
+        default=False, alias="FILM_STATS_SHARDING_ENABLED")
+    film_stats_shards: int = Field(default=8, alias="FILM_STATS_SHARDS")
+    film_stats_hot_writes_per_s: float = Field(
+        default=50.0, alias="FILM_STATS_HOT_WRITES_PER_S")
+    # как часто сворачивать суммы шардов в основной документ (для топа)
+    film_stats_compact_interval_s: float = Field(
+        default=5.0, alias="FILM_STATS_COMPACT_INTERVAL_S")
+
+    # сколько хранить почасовые корзины film_stats_buckets (TTL-индекс)
+    film_stats_hourly_retention_days: int = Field(
+        default=30, alias="FILM_STATS_HOURLY_RETENTION_DAYS")
+
+    # байесовский рейтинг для топа: (C*m + sum) / (C + count)
+    film_rating_prior_mean: float = Field(
+        default=5.5, alias="FILM_RATING_PRIOR_MEAN")
+    film_rating_min_votes: int = Field(default=10,
+                                       alias="FILM_RATING_MIN_VOTES")
+    # кэш страниц топа фильмов (ttl=0 — выключен)
+    film_stats_top_cache_ttl_s: float = Field(
+        default=10.0, alias="FILM_STATS_TOP_CACHE_TTL_S")
+
+    # потоковая загрузка оценок (NDJSON): размер чанка bulk_write и
+    # сколько байт результатов держать в памяти до сброса на диск
+    ratings_bulk_chunk_size: int = Field(default=1000,
+                                         alias="RATINGS_BULK_CHUNK_SIZE")
+    ratings_bulk_spool_bytes: int = Field(
+        default=1024 * 1024, alias="RATINGS_BULK_SPOOL_BYTES")
+
+    # HTTP-кэширование (CDN/клиенты): Cache-Control для условных GET
+    film_stats_cache_control: str = Field(
+        default="public, max-age=5, stale-while-revalidate=30",
+        alias="FILM_STATS_CACHE_CONTROL")
+    reviews_cache_control: str = Field(
+        default="public, max-age=10, stale-while-revalidate=60",
+        alias="REVIEWS_CACHE_CONTROL")
+
+    # group commit: одиночные записи лайков/закладок, пришедшие в одном
+    # окне, уходят одним unordered bulk_write
+    group_commit_enabled: bool = Field(default=False,
+                                       alias="GROUP_COMMIT_ENABLED")
+    group_commit_window_ms: float = Field(default=2.0,
+                                          alias="GROUP_COMMIT_WINDOW_MS")
+    group_commit_max_ops: int = Field(default=256,
+                                      alias="GROUP_COMMIT_MAX_OPS")
+
+    # пер-ключевые asyncio-локи (в пределах воркера) перед транзакциями
+    # голосов/удаления рецензий — меньше WriteConflict на горячих ключах
+    key_locks_enabled: bool = Field(default=False, alias="KEY_LOCKS_ENABLED")
+    key_lock_stripes: int = Field(default=1024, alias="KEY_LOCK_STRIPES")
+    # повтор транзакций при TransientTransactionError: экспоненциальная
+    # пауза с джиттером, пока не истечёт общий бюджет времени
+    txn_retry_max_elapsed_s: float = Field(
+        default=2.0, alias="TXN_RETRY_MAX_ELAPSED_S")
+    txn_retry_base_delay_ms: float = Field(
+        default=5.0, alias="TXN_RETRY_BASE_DELAY_MS")
+    txn_retry_max_delay_ms: float = Field(
+        default=200.0, alias="TXN_RETRY_MAX_DELAY_MS")
+
+    # hot-ранг рецензий: сколько секунд «стоит» десятикратный перевес
+    # голосов (чем меньше, тем быстрее новые рецензии вытесняют старые)
+    reviews_hot_decay_s: float = Field(default=45_000.0,
+                                       alias="REVIEWS_HOT_DECAY_S")
+
+    # фоновая очистка удалённых рецензий: голоса удаляются батчами,
+    # пауза, пока отставание реплик больше порога
+    reviews_purge_batch_size: int = Field(
+        default=1000, alias="REVIEWS_PURGE_BATCH_SIZE")
+    reviews_purge_max_lag_s: float = Field(
+        default=10.0, alias="REVIEWS_PURGE_MAX_LAG_S")
+    reviews_purge_poll_s: float = Field(default=30.0,
+                                        alias="REVIEWS_PURGE_POLL_S")
+
     # Pydantic v2: модель конфигурации
     model_config = SettingsConfigDict(env_file="infra/.env", extra="ignore")
 
@@ -0,0 +1,59 @@
+"""Striped in-process asyncio locks for serializing same-key mutations."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Hashable, List, Optional
+
+from ugc_api.core.config import settings
+from ugc_api.core.metrics import metrics
+
+
+class StripedLocks:
+    """Fixed pool of asyncio locks; a key always maps to the same stripe.
+
+    Serializes writers of one hot key inside this worker before they open
+    a Mongo transaction, so they queue here instead of aborting each
+    other with WriteConflict. Unrelated keys share a stripe only by hash
+    collision. Wait time goes to the `<name>_lock_wait_ms` summary.
+    """
+
+    def __init__(self, stripes: int = 1024, name: str = "key") -> None:
+        """Create `stripes` lazily initialized locks."""
+        self.name = name
+        self._locks: List[Optional[asyncio.Lock]] = [None] * max(1, stripes)
+
+    def _stripe(self, key: Hashable) -> asyncio.Lock:
+        idx = hash(key) % len(self._locks)
+        lock = self._locks[idx]
+        if lock is None:
+            lock = self._locks[idx] = asyncio.Lock()
+        return lock
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable) -> AsyncIterator[None]:
+        """Hold the stripe of `key` for the duration of the block."""
+        lock = self._stripe(key)
+        if lock.locked():
+            metrics.inc(f"{self.name}_lock_contended")
+        started = time.perf_counter()
+        async with lock:
+            metrics.observe(f"{self.name}_lock_wait_ms",
+                            (time.perf_counter() - started) * 1000)
+            yield
+
+
+_locks: StripedLocks | None = None
+
+
+def get_key_locks() -> Optional[StripedLocks]:
+    """Return shared lock registry (None if key locks are disabled)."""
+    global _locks
+    if not settings.key_locks_enabled:
+        return None
+    if _locks is None:
+        _locks = StripedLocks(stripes=settings.key_lock_stripes,
+                              name="write")
+    return _locks
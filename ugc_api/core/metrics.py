@@ -0,0 +1,54 @@
+"""Minimal in-process metrics registry (counters + summaries)."""
+
+from __future__ import annotations
+
+from threading import Lock
+from typing import Dict
+
+
+class Metrics:
+    """Thread-safe registry of counters and value summaries.
+
+    Counters only grow; summaries keep count/sum/max of observed values.
+    Snapshot is exposed as JSON by the `/metrics` endpoint.
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._counters: Dict[str, float] = {}
+        self._summaries: Dict[str, Dict[str, float]] = {}
+
+    def inc(self, name: str, value: float = 1) -> None:
+        """Increment counter `name` by `value`."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float) -> None:
+        """Record a single observation of `name` (e.g. latency, size)."""
+        with self._lock:
+            summary = self._summaries.setdefault(
+                name, {"count": 0, "sum": 0.0, "max": 0.0, "last": 0.0})
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["max"] = max(summary["max"], value)
+            summary["last"] = value
+
+    def snapshot(self) -> dict:
+        """Return a copy of all metrics."""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "summaries": {
+                    name: dict(values)
+                    for name, values in self._summaries.items()
+                },
+            }
+
+    def reset(self) -> None:
+        """Drop all collected values (used by tests)."""
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+
+
+metrics = Metrics()
@@ -0,0 +1,114 @@
+"""Mongo transaction runner with bounded retries of transient errors."""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, TypeVar
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorClientSession
+from pymongo.errors import PyMongoError
+
+from ugc_api.core.config import settings
+from ugc_api.core.metrics import metrics
+
+T = TypeVar("T")
+
+TRANSIENT = "TransientTransactionError"
+UNKNOWN_COMMIT = "UnknownTransactionCommitResult"
+# ошибка "MaxTimeMSExpired" при коммите не ретраится (как в драйвере)
+MAX_TIME_EXPIRED = 50
+
+
+def _has_label(error: Exception, label: str) -> bool:
+    return isinstance(error, PyMongoError) and error.has_error_label(label)
+
+
+def _in_transaction(session: AsyncIOMotorClientSession) -> bool:
+    # in_transaction — property, но в стабах motor описан как метод
+    return bool(getattr(session, "in_transaction", False))
+
+
+async def run_transaction(
+    client: AsyncIOMotorClient,
+    body: Callable[[AsyncIOMotorClientSession], Awaitable[T]],
+    *,
+    name: str = "mongo",
+) -> T:
+    """Run `body(session)` in a transaction, retrying transient failures.
+
+    Like pymongo's `with_transaction`, but bounded by
+    `txn_retry_max_elapsed_s` and with exponential backoff plus full
+    jitter between attempts, so contending writers spread out instead
+    of colliding again. Whole attempts are retried on
+    TransientTransactionError; only the commit is retried on
+    UnknownTransactionCommitResult. Any other error from `body` aborts
+    the transaction and propagates unchanged. Attempts per transaction
+    go to the `<name>_txn_attempts` summary.
+    """
+    deadline = time.monotonic() + settings.txn_retry_max_elapsed_s
+    attempt = 0
+    async with await client.start_session() as session:
+        while True:
+            attempt += 1
+            session.start_transaction()
+            try:
+                result = await body(session)
+            except Exception as error:
+                if _in_transaction(session):
+                    await session.abort_transaction()
+                if _has_label(error, TRANSIENT) and \
+                        await _backoff(attempt, deadline, name):
+                    continue
+                _record(name, attempt,
+                        failed=isinstance(error, PyMongoError))
+                raise
+            if not _in_transaction(session):
+                # body сам завершил транзакцию
+                _record(name, attempt)
+                return result
+            try:
+                await _commit(session, deadline)
+            except PyMongoError as error:
+                if _has_label(error, TRANSIENT) and \
+                        await _backoff(attempt, deadline, name):
+                    continue
+                _record(name, attempt, failed=True)
+                raise
+            _record(name, attempt)
+            return result
+
+
+async def _commit(
+        session: AsyncIOMotorClientSession, deadline: float) -> None:
+    """Commit, repeating while the outcome is unknown and time is left."""
+    while True:
+        try:
+            await session.commit_transaction()
+            return
+        except PyMongoError as error:
+            retry = (_has_label(error, UNKNOWN_COMMIT)
+                     and getattr(error, "code", None) != MAX_TIME_EXPIRED
+                     and time.monotonic() < deadline)
+            if not retry:
+                raise
+            metrics.inc("txn_commit_retries")
+
+
+async def _backoff(attempt: int, deadline: float, name: str) -> bool:
+    """Sleep before the next attempt; False if the time budget is spent."""
+    cap = min(settings.txn_retry_max_delay_ms,
+              settings.txn_retry_base_delay_ms * 2 ** (attempt - 1)) / 1000
+    delay = random.uniform(0, cap)  # noqa: S311
+    if time.monotonic() + delay >= deadline:
+        return False
+    metrics.inc(f"{name}_txn_retries")
+    await asyncio.sleep(delay)
+    return True
+
+
+def _record(name: str, attempts: int, failed: bool = False) -> None:
+    metrics.observe(f"{name}_txn_attempts", attempts)
+    if failed:
+        metrics.inc(f"{name}_txn_failures")
@@ -1,12 +1,23 @@
 from uuid import UUID
 from fastapi import Depends, Header, HTTPException, status
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from ugc_api.core.config import settings
+from ugc_api.core.locks import get_key_locks
 from ugc_api.db.mongo import get_mongo_db
 from ugc_api.services.ratings_service import RatingsService
 from ugc_api.services.bookmarks_service import BookmarksService
 from ugc_api.services.reviews_service import ReviewsService
 from ugc_api.services.likes_service import LikesService
+from ugc_api.services.me_service import MeService
 from ugc_api.services.film_stats_service import FilmStatsService
+from ugc_api.services.film_stats_buckets import get_film_stats_bucket_buffer
+from ugc_api.services.film_stats_buffer import get_film_stats_buffer
+from ugc_api.services.film_stats_cache import (
+    get_film_stats_cache,
+    get_film_stats_top_cache,
+)
+from ugc_api.services.film_stats_sharding import get_hot_film_detector
+from ugc_api.services.review_purger import get_review_purger
 
 
 def user_id_header(x_user_id: str = Header(..., alias="X-User-Id")) -> str:
@@ -24,7 +35,15 @@ async def get_db() -> AsyncIOMotorDatabase:
 
 
 async def get_film_stats_service(db=Depends(get_db)) -> FilmStatsService:
-    return FilmStatsService(db)
+    return FilmStatsService(
+        db,
+        buffer=get_film_stats_buffer(db),
+        cache=get_film_stats_cache(),
+        hot_films=get_hot_film_detector(),
+        inline_updates=settings.film_stats_inline_updates,
+        top_cache=get_film_stats_top_cache(),
+        buckets=get_film_stats_bucket_buffer(db),
+    )
 
 
 async def get_ratings_service(
@@ -42,7 +61,8 @@ async def get_reviews_service(
         db=Depends(get_db),
         stats: FilmStatsService = Depends(get_film_stats_service),
 ) -> ReviewsService:
-    return ReviewsService(db, stats)
+    return ReviewsService(db, stats, locks=get_key_locks(),
+                          purger=get_review_purger())
 
 
 async def get_likes_service(
@@ -51,3 +71,7 @@ async def get_likes_service(
 ) -> LikesService:
     # теперь лайки знают про статы
     return LikesService(db, stats)
+
+
+async def get_me_service(db=Depends(get_db)) -> MeService:
+    return MeService(db)
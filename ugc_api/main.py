@@ -9,12 +9,28 @@ from ugc_api.core.logger import setup_json_logging, shutdown_logging
 from ugc_api.core.sentry import init_sentry
 from ugc_api.core.config import settings
 from ugc_api.core.middleware import RequestContextMiddleware
+from ugc_api.core.metrics import metrics
+from ugc_api.services.film_stats_buckets import (
+    close_film_stats_bucket_buffer,
+)
+from ugc_api.services.film_stats_buffer import close_film_stats_buffer
+from ugc_api.services.film_stats_compactor import (
+    close_film_stats_compactor,
+    start_film_stats_compactor,
+)
+from ugc_api.services.repositories.group_commit import close_group_committers
+from ugc_api.services.review_purger import (
+    close_review_purger,
+    start_review_purger,
+)
+from ugc_api.dependencies import get_film_stats_service
 
 from ugc_api.api.v1.ratings import router as ratings_router
 from ugc_api.api.v1.bookmarks import router as bookmarks_router
 from ugc_api.api.v1.reviews import router as reviews_router
 from ugc_api.api.v1.likes import router as likes_router
 from ugc_api.api.v1.film_stats import router as film_stats_router
+from ugc_api.api.v1.me import router as me_router
 from ugc_api.api.v1.debug import include_debug_routes
 
 
@@ -29,9 +45,24 @@ async def lifespan(app: FastAPI):
     # опционально: ping для ранней проверки доступности
     # await client.admin.command("ping")
 
+    # 3) фоновая очистка удалённых рецензий (продолжает незавершённые)
+    db = client[settings.mongo_db]
+    start_review_purger(db, await get_film_stats_service(db))
+    # свёртка шардов горячих фильмов в основной документ (топ по индексу)
+    start_film_stats_compactor(db)
+
     try:
         yield
     finally:
+        # останавливаем очистку до сброса буфера film_stats
+        await close_review_purger()
+        await close_film_stats_compactor()
+        # дописываем собранные group commit батчи лайков/закладок
+        await close_group_committers()
+        # досылаем накопленные дельты film_stats, пока клиент жив
+        await close_film_stats_buffer()
+        # и дельты почасовых/посуточных корзин
+        await close_film_stats_bucket_buffer()
         # корректно останавливаем лог-листенер
         client.close()
         shutdown_logging()
@@ -49,12 +80,18 @@ include_debug_routes(app)
 
 
 @app.get("/health")
-def health():
+def health() -> dict:
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+def internal_metrics() -> dict:
+    return metrics.snapshot()
+
+
 app.include_router(ratings_router)
 app.include_router(bookmarks_router)
 app.include_router(reviews_router)
 app.include_router(likes_router)
 app.include_router(film_stats_router)
+app.include_router(me_router)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 
 class BookmarkPutResponse(BaseModel):
@@ -18,4 +18,7 @@ class BookmarkItem(BaseModel):
 
 class BookmarkListResponse(BaseModel):
     items: List[BookmarkItem]
-    total: int
+    # None при with_total=false
+    total: Optional[int] = None
+    # курсор следующей страницы (None — страниц больше нет)
+    next_cursor: Optional[str] = None
@@ -1,6 +1,16 @@
 from __future__ import annotations
 from datetime import datetime
-from pydantic import BaseModel
+from typing import Dict, List, Literal, Optional
+from uuid import UUID
+from pydantic import BaseModel, Field, field_validator
+
+FILM_STATS_BATCH_MAX = 100
+FILM_STATS_TOP_MAX = 100
+# не больше стольких корзин (документов) на один запрос timeseries
+FILM_STATS_TIMESERIES_MAX_POINTS = 48
+
+FilmStatsTopBy = Literal["avg_rating", "likes", "reviews_count"]
+FilmStatsStep = Literal["hour", "day"]
 
 
 class FilmStats(BaseModel):
@@ -11,9 +21,60 @@ class FilmStats(BaseModel):
     ratings_count: int = 0
     ratings_sum: int = 0
     avg_rating: float = 0.0
+    # байесовский рейтинг: по нему строится топ by=avg_rating
+    rating_score: float = 0.0
+    # распределение оценок: {"1": n1, ..., "10": n10}
+    ratings_hist: Dict[str, int] = Field(
+        default_factory=dict, validate_default=True)
+    ratings_sumsq: int = 0
+    # стандартное отклонение оценок (по генеральной совокупности)
+    rating_stddev: float = 0.0
 
     reviews_count: int = 0
     votes_up: int = 0
     votes_down: int = 0
 
-    updated_at: datetime
+    # None — по фильму ещё не было ни одной записи
+    updated_at: Optional[datetime] = None
+
+    @field_validator("ratings_hist", mode="before")
+    @classmethod
+    def _all_scores(cls, value: Optional[dict]) -> Dict[str, int]:
+        # в документе могут быть не все слоты — отдаём все десять
+        value = value or {}
+        return {str(score): int(value.get(str(score), 0))
+                for score in range(1, 11)}
+
+
+class FilmStatsBatchRequest(BaseModel):
+    film_ids: List[UUID] = Field(...,
+                                 min_length=1,
+                                 max_length=FILM_STATS_BATCH_MAX)
+
+
+class FilmStatsBatchResponse(BaseModel):
+    items: List[FilmStats]
+
+
+class FilmStatsTopResponse(BaseModel):
+    items: List[FilmStats]
+    # None — это последняя страница
+    next_cursor: Optional[str] = None
+
+
+class FilmStatsPoint(BaseModel):
+    # начало корзины (UTC); значения — дельты за интервал
+    ts: datetime
+    likes: int = 0
+    dislikes: int = 0
+    ratings_count: int = 0
+    ratings_sum: int = 0
+    reviews_count: int = 0
+    votes_up: int = 0
+    votes_down: int = 0
+
+
+class FilmStatsTimeseriesResponse(BaseModel):
+    film_id: str
+    step: FilmStatsStep
+    points: List[FilmStatsPoint]
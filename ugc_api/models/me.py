@@ -0,0 +1,23 @@
+from __future__ import annotations
+from typing import Dict, List, Optional
+from uuid import UUID
+from pydantic import BaseModel, Field
+
+ME_STATE_MAX_FILMS = 100
+
+
+class MeStateRequest(BaseModel):
+    film_ids: List[UUID] = Field(...,
+                                 min_length=1,
+                                 max_length=ME_STATE_MAX_FILMS)
+
+
+class FilmUserState(BaseModel):
+    like: Optional[int] = None  # +1 / -1, None = реакции нет
+    rating: Optional[int] = None  # None = оценки нет
+    bookmarked: bool = False
+
+
+class MeStateResponse(BaseModel):
+    # film_id -> состояние пользователя, в порядке запроса
+    items: Dict[str, FilmUserState]
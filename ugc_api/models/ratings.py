@@ -1,5 +1,10 @@
-from pydantic import BaseModel
-from typing import Optional
+from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from uuid import UUID
+
+# максимальная длина строки NDJSON в POST /ratings:bulk
+RATINGS_BULK_MAX_LINE_BYTES = 1024
 
 
 class RatingPutResponse(BaseModel):
@@ -13,9 +18,26 @@ class RatingGetResponse(BaseModel):
     score: Optional[int]  # None если нет оценки
 
 
+class RatingItem(BaseModel):
+    film_id: str
+    score: int
+    updated_at: datetime
+
+
+class RatingListResponse(BaseModel):
+    items: List[RatingItem]
+    # курсор следующей страницы (None — страниц больше нет)
+    next_cursor: Optional[str] = None
+
+
 class FilmStatsResponse(BaseModel):
     film_id: str
     avg_rating: Optional[float]
     likes: int
     dislikes: int
     count: int
+
+
+class RatingBulkLine(BaseModel):
+    film_id: UUID
+    score: int = Field(..., ge=1, le=10)
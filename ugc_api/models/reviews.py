@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from enum import Enum
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -25,7 +25,10 @@ class ReviewItem(BaseModel):
 
 class ReviewListResponse(BaseModel):
     items: List[ReviewItem]
-    total: int
+    # None при with_total=false
+    total: Optional[int] = None
+    # курсор следующей страницы (None — страниц больше нет)
+    next_cursor: Optional[str] = None
 
 
 class ReviewUpdateRequest(BaseModel):
@@ -1,5 +1,8 @@
 """Service layer for managing user bookmarks."""
 
+import asyncio
+from typing import Optional
+
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from pymongo.errors import PyMongoError
 
@@ -9,7 +12,10 @@ from ugc_api.models.bookmarks import (
     BookmarkListResponse,
     BookmarkPutResponse,
 )
-from .repositories.bookmarks_repo import BookmarksRepo
+from ugc_api.services.cursor import decode_cursor, split_page
+from .repositories.bookmarks_repo import LIST_SORT, BookmarksRepo
+
+CURSOR_KIND = 'bookmarks'
 
 
 class BookmarksService:
@@ -54,18 +60,53 @@ class BookmarksService:
         self,
         user_id: str,
         limit: int,
-        offset: int,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+        with_total: bool = True,
+        exact_total: bool = False,
     ) -> BookmarkListResponse:
-        """List all user bookmarks with pagination."""
+        """List user bookmarks, newest first.
+
+        `cursor` (next_cursor of the previous page) takes precedence over
+        `offset`; raises RuntimeError('invalid_cursor') for a bad token.
+        `total` comes from the per-user counter (`exact_total` recounts
+        concurrently with the page query); `with_total=False` skips it.
+        """
+        after = decode_cursor(cursor, CURSOR_KIND) if cursor else None
         try:
-            docs = await self.repo.list_by_user(
+            page = self.repo.list_by_user(
                 user_id=user_id,
-                limit=limit,
-                offset=offset,
+                limit=limit + 1,
+                offset=0 if after else offset,
+                after=after,
             )
-            total = await self.repo.count_by_user(user_id=user_id)
+            total: Optional[int] = None
+            if with_total:
+                docs, total = await asyncio.gather(
+                    page, self._total(user_id, exact_total))
+            else:
+                docs = await page
+            docs, next_cursor = split_page(
+                docs, limit, CURSOR_KIND, LIST_SORT)
             items = [BookmarkItem(film_id=doc['film_id']) for doc in docs]
-            return BookmarkListResponse(items=items, total=total)
+            return BookmarkListResponse(
+                items=items,
+                total=total,
+                next_cursor=next_cursor,
+            )
         except PyMongoError as error:
             raise RuntimeError(
                 f'mongo_bookmark_list_error: {error}') from error
+
+    async def _total(self, user_id: str, exact: bool) -> int:
+        """Bookmarks count: counter, or exact count that also resets it."""
+        counter = await self.repo.get_counter(user_id)
+        if not exact and counter and counter.get('exact'):
+            return int(counter.get('bookmarks', 0))
+        # первый запрос пользователя (или явный exact_total) сверяет
+        # счётчик с коллекцией: compare-and-set по прочитанному seq,
+        # без создания документа на чтении
+        count = await self.repo.count_by_user(user_id=user_id)
+        if counter is not None:
+            await self.repo.set_count(user_id, counter, count)
+        return count
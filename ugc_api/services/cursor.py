@@ -0,0 +1,105 @@
+"""Opaque keyset-pagination cursors and seek predicates."""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from bson import ObjectId
+from bson.errors import BSONError
+
+# (field, direction): 1 — по возрастанию, -1 — по убыванию
+SortSpec = Sequence[Tuple[str, int]]
+# что может лежать в курсоре напрямую; dict/list попали бы в seek_filter
+# как операторы запроса
+SCALARS = (str, int, float, type(None))
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$d": value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {"$o": str(value)}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, SCALARS):
+        return value
+    if isinstance(value, dict) and len(value) == 1:
+        if "$d" in value:
+            return datetime.fromisoformat(value["$d"])
+        if "$o" in value:
+            return ObjectId(value["$o"])
+    raise ValueError(value)
+
+
+def encode_cursor(kind: str, values: Sequence[Any]) -> str:
+    """Pack sort key of the last item into an opaque url-safe token."""
+    payload = json.dumps(
+        {"k": kind, "v": [_encode_value(v) for v in values]},
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, kind: str) -> List[Any]:
+    """Unpack token produced by `encode_cursor` for the same `kind`.
+
+    Raises RuntimeError('invalid_cursor') for foreign or damaged tokens.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload["k"] != kind:
+            raise ValueError(kind)
+        return [_decode_value(v) for v in payload["v"]]
+    except (ValueError, KeyError, TypeError, binascii.Error,
+            BSONError) as error:
+        raise RuntimeError("invalid_cursor") from error
+
+
+def seek_filter(sort: SortSpec, values: Sequence[Any]) -> Dict[str, Any]:
+    """Build "strictly after `values`" predicate for a compound sort.
+
+    For sort (a desc, b asc) and values (x, y) it yields
+    {$or: [{a: {$lt: x}}, {a: x, b: {$gt: y}}]}, which the matching
+    compound index answers with a single range scan.
+    """
+    if len(values) != len(sort):
+        raise RuntimeError("invalid_cursor")
+    branches = []
+    for idx, (field, direction) in enumerate(sort):
+        branch: Dict[str, Any] = {
+            prev_field: values[prev_idx]
+            for prev_idx, (prev_field, _) in enumerate(sort[:idx])
+        }
+        branch[field] = {"$lt" if direction < 0 else "$gt": values[idx]}
+        branches.append(branch)
+    return {"$or": branches}
+
+
+def sort_key(doc: Dict[str, Any], sort: SortSpec) -> List[Any]:
+    """Extract values of (possibly dotted) sort fields from a document."""
+    values = []
+    for field, _ in sort:
+        value: Any = doc
+        for part in field.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        values.append(value)
+    return values
+
+
+def split_page(
+        docs: List[Dict[str, Any]],
+        limit: int,
+        kind: str,
+        sort: SortSpec) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Cut `limit + 1` fetched docs to a page and build the next cursor."""
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor(kind, sort_key(docs[-1], sort))
@@ -0,0 +1,123 @@
+"""Coalescer for hourly/daily film_stats bucket deltas."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from ugc_api.core.config import settings
+from ugc_api.core.metrics import metrics
+from ugc_api.services.repositories.film_stats_repo import (
+    BUCKET_FIELDS,
+    FilmStatsRepo,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class FilmStatsBucketBuffer:
+    """Accumulate trend-bucket deltas per film_id and write them in bulk.
+
+    Inline counter writes hand their deltas here instead of awaiting a
+    second bucket write, so a hot film costs one bucket upsert per flush
+    interval rather than one per event. Buckets are best-effort: a flush
+    error is logged and the batch is not retried.
+    """
+
+    def __init__(
+        self,
+        repo: FilmStatsRepo,
+        flush_interval_ms: int = 200,
+        flush_max_keys: int = 500,
+    ) -> None:
+        """Configure flush limits; call `start()` to run the flusher."""
+        self._repo = repo
+        self._interval = flush_interval_ms / 1000
+        self._flush_max_keys = flush_max_keys
+        self._pending: Dict[str, Dict[str, int]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending_keys(self) -> int:
+        """Number of films with unflushed bucket deltas."""
+        return len(self._pending)
+
+    def start(self) -> None:
+        """Start periodic background flushing."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def add(self, film_id: str, inc: Dict[str, int]) -> None:
+        """Merge bucket deltas for a film; never blocks the caller."""
+        inc = {key: value for key, value in inc.items()
+               if key in BUCKET_FIELDS}
+        if not inc:
+            return
+        acc = self._pending.setdefault(film_id, {})
+        for key, value in inc.items():
+            acc[key] = acc.get(key, 0) + value
+        if len(self._pending) >= self._flush_max_keys:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Write all pending deltas into the current buckets."""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            sent = await self._repo.bulk_apply_bucket_inc(batch)
+        metrics.inc("film_stats_bucket_flushes")
+        metrics.observe("film_stats_bucket_flush_size", sent)
+        return sent
+
+    async def close(self) -> None:
+        """Stop background task and flush whatever is left."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        """Flush loop: by timer or by `flush_max_keys` wakeup."""
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=self._interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+
+_buckets: FilmStatsBucketBuffer | None = None
+
+
+def get_film_stats_bucket_buffer(
+        db: AsyncIOMotorDatabase) -> FilmStatsBucketBuffer:
+    """Return process-wide bucket coalescer (started on first use)."""
+    global _buckets
+    if _buckets is None:
+        _buckets = FilmStatsBucketBuffer(
+            FilmStatsRepo(db),
+            flush_interval_ms=settings.film_stats_flush_interval_ms,
+            flush_max_keys=settings.film_stats_flush_max_keys,
+        )
+        _buckets.start()
+    return _buckets
+
+
+async def close_film_stats_bucket_buffer() -> None:
+    """Flush and drop the coalescer (called on lifespan shutdown)."""
+    global _buckets
+    if _buckets is not None:
+        await _buckets.close()
+        _buckets = None
@@ -0,0 +1,241 @@
+"""Write-behind buffer that coalesces film_stats counter deltas."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from ugc_api.core.config import settings
+from ugc_api.core.metrics import metrics
+from ugc_api.services.film_stats_cache import get_film_stats_cache
+from ugc_api.services.repositories.film_stats_repo import FilmStatsRepo
+
+logger = logging.getLogger(__name__)
+
+# коды ошибок записи, после которых дельту имеет смысл повторить:
+# дубль ключа (гонка upsert), конфликт записи, смена/останов primary,
+# таймаут; остальные (валидация, переполнение и т.п.) не пройдут и позже
+RETRYABLE_CODES = frozenset({
+    11000, 112, 91, 189, 10107, 11600, 11602, 13435, 50, 262,
+})
+# сколько последних отброшенных дельт держим для диагностики
+DEAD_LETTERS_MAX = 1000
+
+
+class FilmStatsWriteBuffer:
+    """Accumulate `$inc` deltas per film_id and flush them in bulk.
+
+    A background task flushes every `flush_interval_ms` or as soon as
+    `flush_max_keys` films are pending. `max_keys` bounds memory: when the
+    buffer is full, writers wait for a synchronous flush (backpressure).
+    """
+
+    def __init__(
+        self,
+        repo: FilmStatsRepo,
+        flush_interval_ms: int = 200,
+        flush_max_keys: int = 500,
+        max_keys: int = 10_000,
+    ) -> None:
+        """Configure buffer limits; call `start()` to run the flusher."""
+        self._repo = repo
+        self._interval = flush_interval_ms / 1000
+        self._flush_max_keys = flush_max_keys
+        self._max_keys = max(max_keys, flush_max_keys)
+        self._pending: Dict[str, Dict[str, int]] = {}
+        self._oldest: Optional[float] = None
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self._listeners: list[Callable[[Iterable[str]], None]] = []
+        # неповторяемые дельты (film_id, inc); их же пишем в лог
+        self.dead_letters: Deque[Tuple[str, Dict[str, int]]] = deque(
+            maxlen=DEAD_LETTERS_MAX)
+
+    @property
+    def pending_keys(self) -> int:
+        """Number of films with unflushed deltas."""
+        return len(self._pending)
+
+    def add_flush_listener(
+            self, listener: Callable[[Iterable[str]], None]) -> None:
+        """Register callback invoked with film ids after each flush."""
+        self._listeners.append(listener)
+
+    def start(self) -> None:
+        """Start periodic background flushing."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def add(self, film_id: str, inc: Dict[str, int]) -> None:
+        """Merge counter deltas for a film into the pending batch."""
+        if not inc:
+            return
+        if self._closed:
+            # приложение останавливается — пишем напрямую, чтобы не потерять;
+            # тем же апдейтом, что и flush: с пересчётом avg/score/stddev
+            await self._repo.bulk_apply_inc({film_id: inc})
+            return
+        if film_id not in self._pending and \
+                len(self._pending) >= self._max_keys:
+            metrics.inc("film_stats_buffer_backpressure")
+            try:
+                await self.flush()
+            except PyMongoError as error:
+                # батч уже вернули в буфер; ошибка сброса — не ошибка
+                # записи пользователя, её повторит фоновый flush
+                logger.warning(
+                    "film_stats_flush_failed", extra={"err": str(error)})
+
+        acc = self._pending.setdefault(film_id, {})
+        for key, value in inc.items():
+            acc[key] = acc.get(key, 0) + value
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        metrics.inc("film_stats_buffer_deltas")
+
+        if len(self._pending) >= self._flush_max_keys:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Write all pending deltas with one ordered bulk_write.
+
+        On a partial failure only the films from the first failed
+        operation on are put back, so applied deltas are never retried.
+        The failed operation itself is put back only for a transient or
+        duplicate-key error; otherwise it is dead-lettered and logged.
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            oldest, self._oldest = self._oldest, None
+            try:
+                sent = await self._repo.bulk_apply_inc(batch)
+            except BulkWriteError as error:
+                # ordered bulk: всё до первой ошибки уже применено —
+                # возвращаем в буфер только хвост, иначе двойной учёт
+                failure = error.details["writeErrors"][0]
+                failed = failure["index"]
+                films = [film_id for film_id, inc in batch.items() if inc]
+                if failure.get("code") in RETRYABLE_CODES:
+                    tail = films[failed:]
+                else:
+                    self._dead_letter(films[failed], batch[films[failed]],
+                                      failure)
+                    tail = films[failed + 1:]
+                self._requeue(
+                    {film_id: batch[film_id] for film_id in tail}, oldest)
+                metrics.inc("film_stats_flush_errors")
+                raise
+            except PyMongoError:
+                self._requeue(batch, oldest)
+                metrics.inc("film_stats_flush_errors")
+                raise
+
+        lag_ms = (time.monotonic() - oldest) * 1000 if oldest else 0.0
+        metrics.inc("film_stats_flushes")
+        metrics.observe("film_stats_flush_size", sent)
+        metrics.observe("film_stats_flush_lag_ms", lag_ms)
+        for listener in self._listeners:
+            listener(batch.keys())
+        return sent
+
+    async def close(self) -> None:
+        """Stop background task and flush whatever is left."""
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except PyMongoError as error:
+            logger.error(
+                "film_stats_final_flush_failed",
+                extra={"err": str(error), "keys": len(self._pending)},
+            )
+
+    def _requeue(
+            self,
+            batch: Dict[str, Dict[str, int]],
+            oldest: Optional[float]) -> None:
+        """Return a failed batch into the buffer to retry later."""
+        for film_id, inc in batch.items():
+            acc = self._pending.setdefault(film_id, {})
+            for key, value in inc.items():
+                acc[key] = acc.get(key, 0) + value
+        if oldest is not None:
+            self._oldest = min(self._oldest or oldest, oldest)
+
+    def _dead_letter(
+            self,
+            film_id: str,
+            inc: Dict[str, int],
+            failure: dict) -> None:
+        """Drop a delta that cannot succeed on retry, keeping a trace."""
+        self.dead_letters.append((film_id, inc))
+        metrics.inc("film_stats_dead_letters")
+        logger.error(
+            "film_stats_delta_dead_lettered",
+            extra={"film_id": film_id, "inc": inc,
+                   "code": failure.get("code"),
+                   "err": failure.get("errmsg")},
+        )
+
+    async def _run(self) -> None:
+        """Flush loop: by timer or by `flush_max_keys` wakeup."""
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=self._interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except PyMongoError as error:
+                logger.warning(
+                    "film_stats_flush_failed", extra={"err": str(error)})
+
+
+_buffer: FilmStatsWriteBuffer | None = None
+
+
+def get_film_stats_buffer(
+        db: AsyncIOMotorDatabase) -> Optional[FilmStatsWriteBuffer]:
+    """Return process-wide buffer if write-behind mode is enabled."""
+    global _buffer
+    if not settings.film_stats_write_behind:
+        return None
+    if _buffer is None:
+        _buffer = FilmStatsWriteBuffer(
+            FilmStatsRepo(db),
+            flush_interval_ms=settings.film_stats_flush_interval_ms,
+            flush_max_keys=settings.film_stats_flush_max_keys,
+            max_keys=settings.film_stats_buffer_max_keys,
+        )
+        cache = get_film_stats_cache()
+        if cache is not None:
+            # после сброса документы в Mongo новее закэшированных
+            _buffer.add_flush_listener(cache.invalidate_many)
+        _buffer.start()
+    return _buffer
+
+
+async def close_film_stats_buffer() -> None:
+    """Flush and drop the buffer (called on lifespan shutdown)."""
+    global _buffer
+    if _buffer is not None:
+        await _buffer.close()
+        _buffer = None
@@ -0,0 +1,41 @@
+"""Process-wide read-through cache for film_stats documents."""
+
+from __future__ import annotations
+
+from typing import Optional
+
+from ugc_api.core.cache import TTLCache
+from ugc_api.core.config import settings
+
+_cache: TTLCache | None = None
+
+
+def get_film_stats_cache() -> Optional[TTLCache]:
+    """Return shared stats cache (None if disabled by size=0)."""
+    global _cache
+    if settings.film_stats_cache_size <= 0:
+        return None
+    if _cache is None:
+        _cache = TTLCache(
+            maxsize=settings.film_stats_cache_size,
+            ttl=settings.film_stats_cache_ttl_s,
+            name="film_stats",
+        )
+    return _cache
+
+
+_top_cache: TTLCache | None = None
+
+
+def get_film_stats_top_cache() -> Optional[TTLCache]:
+    """Return shared cache of leaderboard pages (None if ttl=0)."""
+    global _top_cache
+    if settings.film_stats_top_cache_ttl_s <= 0:
+        return None
+    if _top_cache is None:
+        _top_cache = TTLCache(
+            maxsize=256,
+            ttl=settings.film_stats_top_cache_ttl_s,
+            name="film_stats_top",
+        )
+    return _top_cache
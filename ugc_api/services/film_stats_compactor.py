@@ -0,0 +1,103 @@
+"""Background folding of sharded film_stats counters into main documents."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorClientSession, AsyncIOMotorDatabase
+from pymongo.errors import PyMongoError
+
+from ugc_api.core.config import settings
+from ugc_api.core.metrics import metrics
+from ugc_api.db.transactions import run_transaction
+from ugc_api.services.repositories.film_stats_repo import FilmStatsRepo
+
+logger = logging.getLogger(__name__)
+
+
+class FilmStatsCompactor:
+    """Move shard sums of hot films into their main film_stats documents.
+
+    The leaderboard sorts on indexed fields of the main document, so
+    counters parked in film_stats_shards would rank hot films by stale
+    values. Every `interval_s` each film with non-zero shards is folded
+    in one transaction (shards zeroed, main document incremented). Readers
+    that add shard sums read the two collections without a snapshot, so
+    totals are eventually consistent: a read racing a fold may be off by
+    the folded delta for that one read.
+    """
+
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        interval_s: float = 5.0,
+    ) -> None:
+        """Configure the folding period; call `start()` to run."""
+        self.repo = FilmStatsRepo(db)
+        self._interval = interval_s
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the background folding loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop the loop; remaining shard deltas are folded next start."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def compact(self) -> int:
+        """Fold shards of every film that has deltas; return how many."""
+        folded = 0
+        for film_id in await self.repo.films_with_shard_deltas():
+            async def body(session: AsyncIOMotorClientSession,
+                           film_id: str = film_id) -> bool:
+                return bool(await self.repo.fold_shards(film_id, session))
+
+            if await run_transaction(
+                    self.repo.client, body, name='film_stats_compact'):
+                folded += 1
+        metrics.inc('film_stats_shards_folded', folded)
+        return folded
+
+    async def _run(self) -> None:
+        """Folding loop: every `interval_s` seconds."""
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await self.compact()
+            except PyMongoError as error:
+                logger.warning(
+                    'film_stats_compact_failed', extra={'err': str(error)})
+
+
+_compactor: FilmStatsCompactor | None = None
+
+
+def start_film_stats_compactor(
+        db: AsyncIOMotorDatabase) -> Optional[FilmStatsCompactor]:
+    """Start the process-wide compactor if sharded counters are on."""
+    global _compactor
+    if not settings.film_stats_sharding_enabled:
+        return None
+    if _compactor is None:
+        _compactor = FilmStatsCompactor(
+            db, interval_s=settings.film_stats_compact_interval_s)
+        _compactor.start()
+    return _compactor
+
+
+async def close_film_stats_compactor() -> None:
+    """Stop the compactor (called on lifespan shutdown)."""
+    global _compactor
+    if _compactor is not None:
+        await _compactor.close()
+        _compactor = None
@@ -2,28 +2,330 @@
 
 from __future__ import annotations
 
-from typing import Optional
+from datetime import datetime
+from typing import List, Optional, Tuple
 
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from motor.motor_asyncio import AsyncIOMotorClientSession, AsyncIOMotorDatabase
 
-from ugc_api.services.repositories.film_stats_repo import FilmStatsRepo
+from ugc_api.core.cache import TTLCache
+from ugc_api.core.config import settings
+from ugc_api.models.film_stats import FILM_STATS_TIMESERIES_MAX_POINTS
+from ugc_api.services.cursor import decode_cursor, split_page
+from ugc_api.services.film_stats_buckets import FilmStatsBucketBuffer
+from ugc_api.services.film_stats_buffer import FilmStatsWriteBuffer
+from ugc_api.services.film_stats_sharding import HotFilmDetector
+from ugc_api.services.repositories.film_stats_repo import (
+    BUCKET_FIELDS,
+    BUCKET_STEPS,
+    RATING_FIELDS,
+    SHARDED_FIELDS,
+    FilmStatsRepo,
+    bucket_start,
+    default_doc,
+    rating_inc,
+)
+
+# маркер негативного кэша: документа film_stats для фильма нет
+NOT_FOUND = object()
+
+# критерий топа -> поле film_stats, по которому есть индекс
+TOP_FIELDS = {
+    'avg_rating': 'rating_score',
+    'likes': 'likes',
+    'reviews_count': 'reviews_count',
+}
 
 
 class FilmStatsService:
-    """Manages film statistics for likes, ratings, and reviews."""
+    """Manages film statistics for likes, ratings, and reviews.
+
+    With a write-behind `buffer`, plain counter deltas are coalesced in
+    memory and flushed in bulk instead of one write per event. With a
+    `cache`, reads are served from memory; writes refresh the cached copy
+    with the document returned by `find_one_and_update`. With `hot_films`,
+    counters of films above the write-rate threshold are spread over K
+    shard documents and summed on read. Every delta is also added to the
+    film's hourly and daily buckets for trend queries; inline writes hand
+    bucket deltas to the `buckets` coalescer instead of awaiting them.
+    With `inline_updates=False` the apply_* methods write nothing:
+    aggregates are maintained by the change-stream projector
+    (scripts/film_stats_projector.py).
+    Leaderboard pages are kept in `top_cache` for a few seconds.
+    """
 
-    def __init__(self, db: AsyncIOMotorDatabase) -> None:
-        """Initialize repository."""
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        buffer: Optional[FilmStatsWriteBuffer] = None,
+        cache: Optional[TTLCache] = None,
+        hot_films: Optional[HotFilmDetector] = None,
+        inline_updates: bool = True,
+        top_cache: Optional[TTLCache] = None,
+        buckets: Optional[FilmStatsBucketBuffer] = None,
+    ) -> None:
+        """Initialize repository, optional buffers, caches and sharding."""
         self.repo = FilmStatsRepo(db)
+        self.buffer = buffer
+        self.cache = cache
+        self.hot_films = hot_films
+        self.inline_updates = inline_updates
+        self.top_cache = top_cache
+        self.buckets = buckets
+
+    def _remember(self, film_id: str, doc: Optional[dict]) -> Optional[dict]:
+        """Put fresh document into cache (or drop stale entry if None)."""
+        if self.cache is not None:
+            if doc is None:
+                self.cache.invalidate(film_id)
+            else:
+                self.cache.set(film_id, doc)
+        return doc
+
+    def _remember_missing(self, film_id: str) -> None:
+        """Cache the fact that film has no stats document yet."""
+        if self.cache is not None:
+            self.cache.set(
+                film_id, NOT_FOUND, ttl=settings.film_stats_negative_ttl_s)
+
+    async def _apply_inc(
+            self,
+            film_id: str,
+            inc: dict[str, int]) -> Optional[dict]:
+        """Apply counter deltas inline or via write-behind buffer.
+
+        Returns the updated document, or None when the delta was buffered
+        (or left to the projector).
+        """
+        if not self.inline_updates:
+            return None
+        if self.buffer is not None:
+            await self.buffer.add(film_id, inc)
+            return self._remember(film_id, None)
+        doc = await self._write_counters(film_id, inc)
+        await self._add_buckets(film_id, inc)
+        return doc
+
+    async def _add_buckets(self, film_id: str, inc: dict[str, int]) -> None:
+        """Hand deltas to the bucket coalescer (or write them directly)."""
+        if self.buckets is not None:
+            self.buckets.add(film_id, inc)
+        else:
+            await self.repo.bulk_apply_bucket_inc({film_id: inc})
+
+    @property
+    def writes_inline(self) -> bool:
+        """Whether deltas are written to Mongo on the request path."""
+        return self.inline_updates and self.buffer is None
+
+    async def apply_inc_in_session(
+            self,
+            film_id: str,
+            inc: dict[str, int],
+            session: AsyncIOMotorClientSession) -> None:
+        """Write counter deltas to the main document in a transaction.
+
+        Only for `writes_inline` services. The body may be retried, so
+        cache and buckets are left to `committed`, called once after the
+        transaction commits.
+        """
+        await self.repo.apply_inc_and_set(film_id, inc=inc, session=session)
+
+    async def committed(self, film_id: str, inc: dict[str, int]) -> None:
+        """Finish a transactional write: drop the cached doc, add buckets."""
+        self._remember(film_id, None)
+        await self._add_buckets(film_id, inc)
+
+    async def _write_counters(
+            self,
+            film_id: str,
+            inc: dict[str, int]) -> Optional[dict]:
+        """Write lifetime counters: main document or a hot-film shard."""
+        is_rating = any(key in inc for key in RATING_FIELDS)
+        if not is_rating and await self._apply_sharded(film_id, inc):
+            # суммы по шардам остаются в кэше до истечения TTL
+            return None
+        if is_rating:
+            doc = await self.repo.apply_rating_delta(film_id, inc)
+        else:
+            doc = await self.repo.apply_inc_and_set(film_id, inc=inc)
+        if doc.get('shards'):
+            # основной документ без сумм по шардам — в кэш его не кладём
+            self._remember(film_id, None)
+            return doc
+        return self._remember(film_id, doc)
+
+    async def _apply_sharded(self, film_id: str, inc: dict[str, int]) -> bool:
+        """Write deltas into a random shard if the film is hot."""
+        hot = self.hot_films
+        if hot is None:
+            return False
+        if hot.is_sharded(film_id):
+            hot.touch(film_id)
+        elif hot.record_write(film_id):
+            await self.repo.mark_sharded(film_id, hot.shards)
+            hot.promote(film_id)
+            self._remember(film_id, None)
+        else:
+            return False
+        await self.repo.apply_shard_inc(film_id, hot.pick_shard(), inc)
+        return True
+
+    async def _merge_shards(self, docs: List[dict]) -> None:
+        """Add shard sums into main documents of sharded films (in place)."""
+        sharded = [doc['film_id'] for doc in docs if doc.get('shards')]
+        if not sharded:
+            return
+        sums = await self.repo.sum_shards(sharded)
+        for doc in docs:
+            part = sums.get(doc['film_id'])
+            if not part:
+                continue
+            for field in SHARDED_FIELDS:
+                doc[field] = doc.get(field, 0) + part.get(field, 0)
+            stamps = [ts for ts in (doc.get('updated_at'),
+                                    part.get('updated_at')) if ts]
+            doc['updated_at'] = max(stamps) if stamps else None
 
     # ----- READ -----
 
     async def get_stats(self, film_id: str) -> dict:
-        """Get or create a statistics document for a film."""
+        """Get statistics for a film without writing anything.
+
+        Unknown films get a synthesized zero document; the miss is kept
+        in a short-lived negative cache so repeated lookups of bogus ids
+        do not reach Mongo. The real document appears on the first write.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(film_id)
+            if cached is NOT_FOUND:
+                return default_doc(film_id)
+            if cached is not None:
+                return dict(cached)
         doc = await self.repo.get_by_film_id(film_id)
         if doc is None:
-            doc = await self.repo.ensure_doc(film_id)
-        return doc
+            self._remember_missing(film_id)
+            return default_doc(film_id)
+        await self._merge_shards([doc])
+        self._remember(film_id, doc)
+        return dict(doc)
+
+    async def get_stats_many(self, film_ids: List[str]) -> List[dict]:
+        """Get stats for many films in request order (read-only).
+
+        Cached films are served from memory, the rest with one `$in`
+        query; films without a document get zero-valued defaults.
+        """
+        found: dict[str, dict] = {}
+        missing: List[str] = []
+        for film_id in dict.fromkeys(film_ids):
+            cached = self.cache.get(film_id) if self.cache else None
+            if cached is NOT_FOUND:
+                continue
+            if cached is not None:
+                found[film_id] = cached
+            else:
+                missing.append(film_id)
+
+        if missing:
+            docs = await self.repo.get_many(missing)
+            await self._merge_shards(list(docs.values()))
+            for film_id in missing:
+                doc = docs.get(film_id)
+                if doc is None:
+                    self._remember_missing(film_id)
+                else:
+                    self._remember(film_id, doc)
+                    found[film_id] = doc
+
+        return [
+            dict(found.get(film_id) or default_doc(film_id))
+            for film_id in dict.fromkeys(film_ids)
+        ]
+
+    async def top(
+        self,
+        by: str,
+        limit: int,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Get a leaderboard page and the cursor of the next one.
+
+        Films are ordered by the indexed field behind `by` (for
+        avg_rating — the Bayesian rating_score), ties by film_id.
+        Counters of sharded hot films are folded into the main document
+        by FilmStatsCompactor, so the order lags shard writes by at most
+        FILM_STATS_COMPACT_INTERVAL_S; the remainder is added to values.
+        Raises RuntimeError('invalid_cursor') for a foreign cursor.
+        """
+        key = (by, limit, cursor)
+        cached = self.top_cache.get(key) if self.top_cache else None
+        if cached is not None:
+            items, next_cursor = cached
+            return [dict(doc) for doc in items], next_cursor
+
+        kind = f'top:{by}'
+        sort = [(TOP_FIELDS[by], -1), ('film_id', 1)]
+        after = decode_cursor(cursor, kind) if cursor else None
+        docs = await self.repo.top(sort, limit + 1, after)
+        # ключ берём до слияния шардов: он должен совпадать с индексом
+        docs, next_cursor = split_page(docs, limit, kind, sort)
+        await self._merge_shards(docs)
+
+        if self.top_cache is not None:
+            self.top_cache.set(key, (docs, next_cursor))
+        return [dict(doc) for doc in docs], next_cursor
+
+    async def timeseries(
+        self,
+        film_id: str,
+        start: datetime,
+        end: datetime,
+        step: str,
+    ) -> List[dict]:
+        """Get per-bucket counter deltas in [start, end), zero-filled.
+
+        `start` is aligned down to the bucket boundary. Raises
+        RuntimeError('invalid_range') for an empty range and
+        RuntimeError('timeseries_too_many_points') when the range
+        spans more than FILM_STATS_TIMESERIES_MAX_POINTS buckets.
+        """
+        width = BUCKET_STEPS[step]
+        start = bucket_start(start, step)
+        if end <= start:
+            raise RuntimeError('invalid_range')
+        points = -(-(end - start) // width)
+        if points > FILM_STATS_TIMESERIES_MAX_POINTS:
+            raise RuntimeError('timeseries_too_many_points')
+
+        if self.buckets is not None and self.buckets.pending_keys:
+            # read-your-writes: дописываем накопленные дельты корзин
+            await self.buckets.flush()
+        docs = await self.repo.get_buckets(film_id, step, start, end)
+        by_ts = {doc['ts']: doc for doc in docs}
+        series = []
+        for idx in range(points):
+            ts = start + idx * width
+            doc = by_ts.get(ts, {})
+            series.append({
+                'ts': ts,
+                **{field: doc.get(field, 0) for field in BUCKET_FIELDS},
+            })
+        return series
+
+    async def apply_bulk_deltas(
+            self,
+            deltas: dict[str, dict[str, int]]) -> None:
+        """Apply per-film deltas of a whole batch with one bulk write."""
+        deltas = {film_id: inc for film_id, inc in deltas.items() if inc}
+        if not self.inline_updates or not deltas:
+            return
+        if self.buffer is not None:
+            for film_id, inc in deltas.items():
+                await self.buffer.add(film_id, inc)
+        else:
+            await self.repo.bulk_apply_inc(deltas)
+        if self.cache is not None:
+            self.cache.invalidate_many(deltas)
 
     # ----- LIKES -----
 
@@ -32,14 +334,14 @@ class FilmStatsService:
         film_id: str,
         like_delta: int = 0,
         dislike_delta: int = 0,
-    ) -> dict:
+    ) -> Optional[dict]:
         """Apply increment to likes/dislikes counters."""
         inc: dict[str, int] = {}
         if like_delta:
             inc['likes'] = like_delta
         if dislike_delta:
             inc['dislikes'] = dislike_delta
-        return await self.repo.apply_inc_and_set(film_id, inc=inc)
+        return await self._apply_inc(film_id, inc)
 
     # ----- RATINGS -----
 
@@ -48,47 +350,45 @@ class FilmStatsService:
         film_id: str,
         old_rating: Optional[int],
         new_rating: Optional[int],
-    ) -> dict:
-        """Apply rating delta and recompute average rating."""
-        inc: dict[str, int] = {}
+    ) -> Optional[dict]:
+        """Apply rating delta; derived fields are recomputed by Mongo itself.
 
-        if old_rating is None and new_rating is not None:
-            inc['ratings_count'] = 1
-            inc['ratings_sum'] = new_rating
-        elif old_rating is not None and new_rating is not None:
-            inc['ratings_sum'] = new_rating - old_rating
-        elif old_rating is not None and new_rating is None:
-            inc['ratings_count'] = -1
-            inc['ratings_sum'] = -old_rating
-        else:
-            return await self.repo.ensure_doc(film_id)
-
-        updated = await self.repo.apply_inc_and_set(film_id, inc=inc)
-        ratings_count = max(updated['ratings_count'], 0)
-        ratings_sum = updated['ratings_sum']
-        avg_rating = float(ratings_sum / ratings_count) \
-            if ratings_count > 0 else 0.0
-
-        return await self.repo.apply_inc_and_set(
-            film_id,
-            set_={'avg_rating': avg_rating},
-        )
+        Count, sum, sum of squares and the score histogram move by one
+        `$inc`; avg_rating, rating_score and rating_stddev are recomputed
+        in the same pipeline update, so concurrent raters never observe
+        (or write) stale values.
+        """
+        inc = rating_inc(old_rating, new_rating)
+        if not inc:
+            return await self.get_stats(film_id)
+        return await self._apply_inc(film_id, inc)
 
     # ----- REVIEWS COUNT -----
 
-    async def apply_review_created(self, film_id: str) -> dict:
+    async def apply_review_created(self, film_id: str) -> Optional[dict]:
         """Increment reviews_count when a review is created."""
-        return await self.repo.apply_inc_and_set(
-            film_id,
-            inc={'reviews_count': 1},
-        )
-
-    async def apply_review_deleted(self, film_id: str) -> dict:
-        """Decrement reviews_count when a review is deleted."""
-        return await self.repo.apply_inc_and_set(
-            film_id,
-            inc={'reviews_count': -1},
-        )
+        return await self._apply_inc(film_id, {'reviews_count': 1})
+
+    async def apply_review_deleted(
+            self,
+            film_id: str,
+            votes_up: int = 0,
+            votes_down: int = 0) -> Optional[dict]:
+        """Decrement reviews_count (and the review's votes) on deletion."""
+        return await self._apply_inc(
+            film_id, self.review_deleted_inc(votes_up, votes_down))
+
+    @staticmethod
+    def review_deleted_inc(
+            votes_up: int = 0,
+            votes_down: int = 0) -> dict[str, int]:
+        """Counter deltas of a review deletion."""
+        inc = {'reviews_count': -1}
+        if votes_up:
+            inc['votes_up'] = -votes_up
+        if votes_down:
+            inc['votes_down'] = -votes_down
+        return inc
 
     # ----- REVIEW VOTES -----
 
@@ -97,7 +397,7 @@ class FilmStatsService:
         film_id: str,
         old_vote: Optional[int],
         new_vote: Optional[int],
-    ) -> dict:
+    ) -> Optional[dict]:
         """Update votes_up and votes_down counters for review vote changes."""
         inc: dict[str, int] = {}
 
@@ -106,7 +406,7 @@ class FilmStatsService:
             d[key] = d.get(key, 0) + value
 
         if old_vote == new_vote:
-            return await self.repo.ensure_doc(film_id)
+            return await self.get_stats(film_id)
 
         if old_vote == 1:
             add(inc, 'votes_up', -1)
@@ -117,4 +417,4 @@ class FilmStatsService:
         if new_vote == -1:
             add(inc, 'votes_down', 1)
 
-        return await self.repo.apply_inc_and_set(film_id, inc=inc)
+        return await self._apply_inc(film_id, inc)
@@ -0,0 +1,78 @@
+"""Hot-film detection for the sharded film_stats counters mode."""
+
+from __future__ import annotations
+
+import random
+import time
+from typing import Dict, Optional
+
+from ugc_api.core.cache import TTLCache
+from ugc_api.core.config import settings
+from ugc_api.core.metrics import metrics
+
+
+class HotFilmDetector:
+    """Decide which films write their counters into K shard documents.
+
+    Writes are counted per film in a fixed one-second window; a film that
+    exceeds `threshold` writes per second is promoted to sharded mode and
+    stays there for `sticky_s` seconds after its last write.
+    """
+
+    def __init__(
+        self,
+        shards: int = 8,
+        threshold: float = 50.0,
+        sticky_s: float = 600.0,
+        max_films: int = 10_000,
+    ) -> None:
+        """Configure shard fan-out and promotion threshold."""
+        self.shards = shards
+        self.threshold = threshold
+        self._window = 0
+        self._counts: Dict[str, int] = {}
+        self._sharded = TTLCache(
+            maxsize=max_films, ttl=sticky_s, name="film_stats_sharded")
+
+    def is_sharded(self, film_id: str) -> bool:
+        """True if this worker already writes the film into shards."""
+        return self._sharded.get(film_id) is not None
+
+    def record_write(self, film_id: str) -> bool:
+        """Count a write; return True once the film just became hot."""
+        now = int(time.monotonic())
+        if now != self._window:
+            self._window = now
+            self._counts.clear()
+        count = self._counts.get(film_id, 0) + 1
+        self._counts[film_id] = count
+        return count == int(self.threshold) + 1
+
+    def promote(self, film_id: str) -> None:
+        """Mark film as sharded (and keep it so while it stays busy)."""
+        self._sharded.set(film_id, self.shards)
+        metrics.inc("film_stats_sharded_promotions")
+
+    def touch(self, film_id: str) -> None:
+        """Extend sharded mode for a film that keeps receiving writes."""
+        self._sharded.set(film_id, self.shards)
+
+    def pick_shard(self) -> int:
+        """Choose a random shard for the next write."""
+        return random.randrange(self.shards)  # noqa: S311
+
+
+_detector: HotFilmDetector | None = None
+
+
+def get_hot_film_detector() -> Optional[HotFilmDetector]:
+    """Return shared detector when sharded counters are enabled."""
+    global _detector
+    if not settings.film_stats_sharding_enabled:
+        return None
+    if _detector is None:
+        _detector = HotFilmDetector(
+            shards=settings.film_stats_shards,
+            threshold=settings.film_stats_hot_writes_per_s,
+        )
+    return _detector
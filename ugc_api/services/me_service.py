@@ -0,0 +1,47 @@
+"""Per-user state of many films in one call (likes, ratings, bookmarks)."""
+
+from __future__ import annotations
+
+import asyncio
+from typing import List
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from ugc_api.models.me import FilmUserState, MeStateResponse
+from ugc_api.services.repositories.bookmarks_repo import BookmarksRepo
+from ugc_api.services.repositories.likes_repo import LikesRepo
+from ugc_api.services.repositories.ratings_repo import RatingsRepo
+
+
+class MeService:
+    """Read-only aggregation of the user's personal badges."""
+
+    def __init__(self, db: AsyncIOMotorDatabase) -> None:
+        """Initialize repositories of the three source collections."""
+        self.likes = LikesRepo(db)
+        self.ratings = RatingsRepo(db)
+        self.bookmarks = BookmarksRepo(db)
+
+    async def get_state(
+            self,
+            user_id: str,
+            film_ids: List[str]) -> MeStateResponse:
+        """Get like, rating and bookmark flag for every requested film.
+
+        Three `$in` queries run concurrently; each is covered by a
+        (user_id, film_id[, value]) index, so no documents are fetched.
+        """
+        film_ids = list(dict.fromkeys(film_ids))
+        likes, ratings, bookmarked = await asyncio.gather(
+            self.likes.values_for_films(user_id, film_ids),
+            self.ratings.scores_for_films(user_id, film_ids),
+            self.bookmarks.bookmarked_films(user_id, film_ids),
+        )
+        return MeStateResponse(items={
+            film_id: FilmUserState(
+                like=likes.get(film_id),
+                rating=ratings.get(film_id),
+                bookmarked=film_id in bookmarked,
+            )
+            for film_id in film_ids
+        })
@@ -1,12 +1,30 @@
 """Service layer for ratings CRUD and film stats integration."""
 
-from typing import Optional
+import logging
+from typing import (
+    AsyncIterable, AsyncIterator, Dict, List, Optional, Tuple, Union,
+)
 
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import PyMongoError
 
-from ugc_api.models.ratings import FilmStatsResponse, RatingPutResponse
+from ugc_api.core.config import settings
+from ugc_api.core.metrics import metrics
+from ugc_api.models.ratings import (
+    FilmStatsResponse,
+    RatingBulkLine,
+    RatingItem,
+    RatingListResponse,
+    RatingPutResponse,
+)
+from ugc_api.services.cursor import decode_cursor, split_page
 from ugc_api.services.film_stats_service import FilmStatsService
-from .repositories.ratings_repo import RatingsRepo
+from .repositories.film_stats_repo import rating_inc
+from .repositories.ratings_repo import LIST_SORT, RatingsRepo
+
+CURSOR_KIND = 'ratings'
+
+logger = logging.getLogger(__name__)
 
 
 class RatingsService:
@@ -21,6 +39,11 @@ class RatingsService:
         self.repo = RatingsRepo(db)
         self.stats = stats  # may be None
 
+    @staticmethod
+    def _score(doc: Optional[dict]) -> Optional[int]:
+        """Extract score from a (projected) rating document."""
+        return int(doc['score']) if doc and 'score' in doc else None
+
     # ---------- CREATE / UPDATE ----------
 
     async def put_rating(
@@ -29,20 +52,17 @@ class RatingsService:
         film_id: str,
         score: int,
     ) -> RatingPutResponse:
-        """Upsert rating and update film stats if configured."""
-        old_doc = await self.repo.find_user_film(
-            user_id=user_id,
-            film_id=film_id,
-        )
-        old_score: Optional[int] = (
-            int(old_doc['score']) if old_doc and 'score' in old_doc else None
-        )
+        """Upsert rating and update film stats if configured.
 
-        doc = await self.repo.upsert(
+        The previous score comes back from the same atomic upsert, so
+        concurrent submits of one user never lose a stats delta.
+        """
+        old_doc = await self.repo.upsert(
             user_id=user_id,
             film_id=film_id,
             score=score,
         )
+        old_score = self._score(old_doc)
 
         if self.stats is not None:
             await self.stats.apply_rating_set(
@@ -53,9 +73,128 @@ class RatingsService:
 
         return RatingPutResponse(
             film_id=film_id,
-            score=int(doc['score']),
+            score=int(score),
         )
 
+    # ---------- BULK ----------
+
+    async def bulk_put(
+        self,
+        user_id: str,
+        lines: AsyncIterable[Tuple[int, Union[RatingBulkLine, str]]],
+    ) -> AsyncIterator[dict]:
+        """Apply a stream of parsed NDJSON lines in chunks.
+
+        `lines` yields (line_no, RatingBulkLine or error code). Ratings are
+        written by one unordered bulk_write per chunk and the chunk's
+        per-film stats deltas by one film_stats bulk update; at most one
+        chunk (at most `ratings_bulk_chunk_size` lines, valid or not) is
+        held in memory and the input is pulled only as fast as chunks are
+        applied. Every line rates as `user_id`. Yields one result dict
+        per line, in order. Raises RuntimeError('ratings_bulk_aborted')
+        after reporting the chunk that failed on a Mongo error.
+        """
+        chunk: List[Tuple[int, Union[RatingBulkLine, str]]] = []
+        films: set = set()
+        async for line_no, item in lines:
+            film = None
+            if isinstance(item, RatingBulkLine):
+                film = str(item.film_id)
+            # повтор фильма в чанке применяем после предыдущего значения;
+            # размер чанка считаем по строкам, включая невалидные
+            full = len(chunk) >= settings.ratings_bulk_chunk_size
+            if film in films or full:
+                async for result in self._apply_chunk(user_id, chunk):
+                    yield result
+                chunk, films = [], set()
+            if film is not None:
+                films.add(film)
+            chunk.append((line_no, item))
+        async for result in self._apply_chunk(user_id, chunk):
+            yield result
+
+    async def _apply_chunk(
+        self,
+        user_id: str,
+        chunk: List[Tuple[int, Union[RatingBulkLine, str]]],
+    ) -> AsyncIterator[dict]:
+        """Write one chunk of ratings and fold its deltas into film_stats.
+
+        Updates are conditioned on the scores read before the bulk write;
+        lines whose score changed in between are retried one by one with
+        the atomic upsert. A film_stats failure does not unmark written
+        lines: they stay ok, the deltas are logged for reconciliation.
+        """
+        items = [
+            (line_no, str(item.film_id), item.score)
+            for line_no, item in chunk if isinstance(item, RatingBulkLine)
+        ]
+        results: Dict[int, dict] = {
+            line_no: {'line': line_no, 'ok': False, 'error': item}
+            for line_no, item in chunk if isinstance(item, str)
+        }
+        aborted = False
+        deltas: Dict[str, Dict[str, int]] = {}
+        try:
+            # фильмы в чанке не повторяются (см. bulk_put)
+            old = await self.repo.scores_for_films(
+                user_id, [film for _, film, _ in items])
+            outcome = await self.repo.bulk_upsert(
+                user_id,
+                [(film, score, old.get(film)) for _, film, score in items])
+        except PyMongoError:
+            aborted = True
+            metrics.inc('ratings_bulk_chunk_errors')
+            items = []
+        for idx, (line_no, film, score) in enumerate(items):
+            if idx in outcome.failed:
+                results[line_no] = {
+                    'line': line_no, 'ok': False, 'error': 'write_failed'}
+                continue
+            prev = old.get(film)
+            if idx in outcome.inserted:
+                # документ удалили после чтения — прежней оценки нет
+                prev = None
+            elif idx in outcome.conflicts:
+                try:
+                    prev = self._score(
+                        await self.repo.upsert(user_id, film, score))
+                except PyMongoError:
+                    aborted = True
+                    metrics.inc('ratings_bulk_chunk_errors')
+                    results[line_no] = {
+                        'line': line_no, 'ok': False, 'error': 'mongo_error'}
+                    continue
+            acc = deltas.setdefault(film, {})
+            for key, value in rating_inc(prev, score).items():
+                acc[key] = acc.get(key, 0) + value
+            results[line_no] = {
+                'line': line_no, 'ok': True, 'film_id': film,
+                'score': score, 'previous': prev}
+        for line_no, _ in chunk:
+            results.setdefault(line_no, {
+                'line': line_no, 'ok': False, 'error': 'mongo_error'})
+        deltas = {
+            film: {key: value for key, value in inc.items() if value}
+            for film, inc in deltas.items()
+        }
+        if self.stats is not None:
+            try:
+                await self.stats.apply_bulk_deltas(deltas)
+            except PyMongoError as error:
+                # оценки уже записаны — строки остаются ok; film_stats
+                # догонит scripts/reconcile_film_stats.py
+                aborted = True
+                metrics.inc('ratings_bulk_stats_errors')
+                logger.error(
+                    'ratings_bulk_stats_failed',
+                    extra={'err': str(error), 'deltas': deltas})
+        metrics.inc('ratings_bulk_lines', len(chunk))
+        for line_no, _ in chunk:
+            yield results[line_no]
+        if aborted:
+            raise RuntimeError('ratings_bulk_aborted')
+
     # ---------- READ ----------
 
     async def get_user_rating(
@@ -68,7 +207,32 @@ class RatingsService:
             user_id=user_id,
             film_id=film_id,
         )
-        return int(doc['score']) if doc and 'score' in doc else None
+        return self._score(doc)
+
+    async def list_ratings(
+        self,
+        user_id: str,
+        limit: int,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+    ) -> RatingListResponse:
+        """List user ratings, most recently changed first.
+
+        `cursor` (next_cursor of the previous page) takes precedence over
+        `offset`; raises RuntimeError('invalid_cursor') for a bad token.
+        """
+        after = decode_cursor(cursor, CURSOR_KIND) if cursor else None
+        docs = await self.repo.list_by_user(
+            user_id=user_id,
+            limit=limit + 1,
+            offset=0 if after else offset,
+            after=after,
+        )
+        docs, next_cursor = split_page(docs, limit, CURSOR_KIND, LIST_SORT)
+        return RatingListResponse(
+            items=[RatingItem(**doc) for doc in docs],
+            next_cursor=next_cursor,
+        )
 
     # ---------- DELETE ----------
 
@@ -78,15 +242,7 @@ class RatingsService:
         film_id: str,
     ) -> None:
         """Delete rating and update film stats if needed."""
-        old_doc = await self.repo.find_user_film(
-            user_id=user_id,
-            film_id=film_id,
-        )
-        old_score: Optional[int] = (
-            int(old_doc['score']) if old_doc and 'score' in old_doc else None
-        )
-
-        await self.repo.delete(
+        old_score = await self.repo.delete(
             user_id=user_id,
             film_id=film_id,
         )
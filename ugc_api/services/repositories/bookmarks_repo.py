@@ -1,12 +1,25 @@
 from __future__ import annotations
-from datetime import datetime, timezone
-from typing import List, Dict, Any
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Set
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from ugc_api.services.cursor import seek_filter
+from ugc_api.services.repositories.group_commit import get_group_committer
+
+# порядок списка закладок; совпадает с индексом bookmarks_user_created_id
+LIST_SORT = [("created_at", -1), ("_id", -1)]
+# сколько запись закладки считается «в полёте»; после этого сверка
+# считает её упавшей и может записать точный счётчик
+WRITE_PENDING_S = 30.0
 
 
 class BookmarksRepo:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.col = db["bookmarks"]
+        # {_id: user_id, bookmarks: N, exact: bool, seq, inflight,
+        # pending_until} — счётчик для total; seq растёт при каждой записи
+        self.counters = db["user_counters"]
 
     async def upsert(self, user_id: str, film_id: str) -> bool:
         """
@@ -14,26 +27,120 @@ class BookmarksRepo:
         если вставили новую запись (upserted_id != None).
         """
         now = datetime.now(timezone.utc)
-        res = await self.col.update_one(
-            {"user_id": user_id, "film_id": film_id},
-            {"$setOnInsert": {"created_at": now}},
-            upsert=True,
-        )
-        return res.upserted_id is not None
+        created = False
+        await self._begin_write(user_id)
+        try:
+            created = await self._upsert(user_id, film_id, now)
+        finally:
+            await self._end_write(user_id, 1 if created else 0)
+        return created
+
+    async def _upsert(
+            self, user_id: str, film_id: str, now: datetime) -> bool:
+        committer = get_group_committer(self.col)
+        if committer is not None:
+            # дубль ключа — параллельная вставка успела раньше
+            result = await committer.submit(
+                (user_id, film_id),
+                UpdateOne({"user_id": user_id, "film_id": film_id},
+                          {"$setOnInsert": {"created_at": now}},
+                          upsert=True),
+            )
+            created = result.upserted
+        else:
+            res = await self.col.update_one(
+                {"user_id": user_id, "film_id": film_id},
+                {"$setOnInsert": {"created_at": now}},
+                upsert=True,
+            )
+            created = res.upserted_id is not None
+        return bool(created)
 
     async def delete(self, user_id: str, film_id: str) -> bool:
-        res = await self.col.delete_one(
-            {"user_id": user_id, "film_id": film_id})
-        return res.deleted_count == 1
+        deleted = False
+        await self._begin_write(user_id)
+        try:
+            res = await self.col.delete_one(
+                {"user_id": user_id, "film_id": film_id})
+            deleted = res.deleted_count == 1
+        finally:
+            await self._end_write(user_id, -1 if deleted else 0)
+        return deleted
 
     async def list_by_user(
             self,
             user_id: str,
             limit: int,
-            offset: int) -> List[Dict[str, Any]]:
-        cur = (self.col.find({"user_id": user_id}, {"_id": 0, "film_id": 1})
-               .sort("created_at", -1).skip(offset).limit(limit))
+            offset: int = 0,
+            after: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Закладки пользователя, новые первыми. С `after` (ключ сортировки
+        последнего элемента) — диапазон по индексу, цена не зависит от
+        глубины; offset оставлен для совместимости.
+        """
+        query: Dict[str, Any] = {"user_id": user_id}
+        if after is not None:
+            query.update(seek_filter(LIST_SORT, after))
+        cur = (self.col.find(query, {"film_id": 1, "created_at": 1})
+               .sort(LIST_SORT).skip(offset).limit(limit))
         return [d async for d in cur]
 
+    async def bookmarked_films(
+            self,
+            user_id: str,
+            film_ids: List[str]) -> Set[str]:
+        """Какие из фильмов в закладках (покрывается bookmarks_user_film)."""
+        cur = self.col.find(
+            {"user_id": user_id, "film_id": {"$in": film_ids}},
+            {"_id": 0, "film_id": 1},
+        )
+        return {d["film_id"] async for d in cur}
+
     async def count_by_user(self, user_id: str) -> int:
         return await self.col.count_documents({"user_id": user_id})
+
+    async def _begin_write(self, user_id: str) -> None:
+        """
+        Отметить запись «в полёте» до изменения коллекции: пока она не
+        завершена, сверка не может записать точный счётчик.
+        """
+        until = datetime.now(timezone.utc) + timedelta(seconds=WRITE_PENDING_S)
+        await self.counters.update_one(
+            {"_id": user_id},
+            {"$inc": {"inflight": 1, "seq": 1},
+             "$max": {"pending_until": until}},
+            upsert=True,
+        )
+
+    async def _end_write(self, user_id: str, delta: int) -> None:
+        await self.counters.update_one(
+            {"_id": user_id},
+            {"$inc": {"bookmarks": delta, "inflight": -1, "seq": 1}},
+        )
+
+    async def get_counter(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Документ счётчика закладок пользователя (None — его нет)."""
+        doc: Optional[Dict[str, Any]] = await self.counters.find_one(
+            {"_id": user_id})
+        return doc
+
+    async def set_count(
+            self,
+            user_id: str,
+            seen: Dict[str, Any],
+            value: int) -> bool:
+        """
+        Compare-and-set точного значения (после count_documents): только
+        если с чтения `seen` не было ни одной записи (тот же seq) и нет
+        записей в полёте (или их срок истёк — писатель упал). Документ
+        не создаётся.
+        """
+        now = datetime.now(timezone.utc)
+        res = await self.counters.update_one(
+            {"_id": user_id,
+             "seq": seen.get("seq"),
+             "$or": [{"inflight": {"$not": {"$gt": 0}}},
+                     {"pending_until": {"$lt": now}}]},
+            {"$set": {"bookmarks": value, "exact": True, "inflight": 0}},
+        )
+        return res.matched_count == 1
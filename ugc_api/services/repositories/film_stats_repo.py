@@ -1,56 +1,237 @@
 from __future__ import annotations
-from datetime import datetime, timezone
-from typing import Optional, Dict, Any
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, Iterable, List, Union
 
-from motor.motor_asyncio import AsyncIOMotorDatabase
-from pymongo import ReturnDocument
+from motor.motor_asyncio import (
+    AsyncIOMotorClient,
+    AsyncIOMotorClientSession,
+    AsyncIOMotorDatabase,
+)
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from ugc_api.core.config import settings
+from ugc_api.core.metrics import metrics
+from ugc_api.services.cursor import SortSpec, seek_filter
+
+logger = logging.getLogger(__name__)
+
+RATING_SCORES = range(1, 11)
 
 DEFAULT_DOC: Dict[str, Any] = {
     "likes": 0, "dislikes": 0,
     "ratings_count": 0, "ratings_sum": 0, "avg_rating": 0.0,
+    "rating_score": 0.0,
+    # распределение оценок 1..10 и сумма квадратов (для разброса)
+    "ratings_hist": {str(score): 0 for score in RATING_SCORES},
+    "ratings_sumsq": 0, "rating_stddev": 0.0,
     "reviews_count": 0, "votes_up": 0, "votes_down": 0,
-    "updated_at": datetime.now(timezone.utc),
+    "updated_at": None,
 }
 
 
+def default_doc(film_id: str) -> Dict[str, Any]:
+    """Нулевая статистика для фильма без документа (ничего не пишем)."""
+    return {"film_id": film_id, **DEFAULT_DOC}
+
+
+RATING_FIELDS = ("ratings_count", "ratings_sum", "ratings_sumsq")
+HIST_FIELDS = tuple(f"ratings_hist.{score}" for score in RATING_SCORES)
+# счётчики, которые у «горячих» фильмов пишутся в шарды
+SHARDED_FIELDS = ("likes", "dislikes", "reviews_count",
+                  "votes_up", "votes_down")
+# счётчики почасовых/посуточных корзин (чистые дельты за интервал)
+BUCKET_FIELDS = ("likes", "dislikes", "ratings_count", "ratings_sum",
+                 "reviews_count", "votes_up", "votes_down")
+BUCKET_STEPS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+
+def bucket_start(ts: datetime, step: str) -> datetime:
+    """Начало корзины (hour/day), в которую попадает момент ts (UTC)."""
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    ts = ts.astimezone(timezone.utc).replace(
+        minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0) if step == "day" else ts
+
+
+def bucket_updates(
+        film_id: str,
+        inc: Dict[str, int],
+        ts: datetime) -> List[UpdateOne]:
+    """
+    $inc дельт в часовую и суточную корзины момента ts. Часовые
+    корзины удаляет TTL-индекс по expire_at, суточные живут всегда.
+    """
+    inc = {key: value for key, value in inc.items() if key in BUCKET_FIELDS}
+    ops: List[UpdateOne] = []
+    if not inc:
+        return ops
+    for step in BUCKET_STEPS:
+        start = bucket_start(ts, step)
+        on_insert: Dict[str, Any] = {}
+        if step == "hour":
+            on_insert["expire_at"] = start + timedelta(
+                days=settings.film_stats_hourly_retention_days)
+        update: Dict[str, Any] = {"$inc": inc, "$set": {"updated_at": ts}}
+        if on_insert:
+            update["$setOnInsert"] = on_insert
+        ops.append(UpdateOne(
+            {"film_id": film_id, "step": step, "ts": start},
+            update,
+            upsert=True,
+        ))
+    return ops
+
+
+def rating_inc(old: Optional[int], new: Optional[int]) -> Dict[str, int]:
+    """
+    Дельты рейтинговых счётчиков (count, sum, sumsq, гистограмма) при
+    смене оценки old -> new (None — оценки нет). Нулевые не включаются.
+    """
+    inc: Dict[str, int] = {}
+    for score, sign in ((old, -1), (new, 1)):
+        if score is None:
+            continue
+        for key, value in (("ratings_count", 1), ("ratings_sum", score),
+                           ("ratings_sumsq", score * score),
+                           (f"ratings_hist.{score}", 1)):
+            inc[key] = inc.get(key, 0) + sign * value
+    return {key: value for key, value in inc.items() if value}
+
+
+def rating_score(count: int, total: int) -> float:
+    """
+    Байесовский рейтинг: среднее, «притянутое» к априорному, пока оценок
+    мало. Без оценок — 0, чтобы неоценённые фильмы не попадали в топ.
+    """
+    if count <= 0:
+        return 0.0
+    votes = settings.film_rating_min_votes
+    return (votes * settings.film_rating_prior_mean + total) / (votes + count)
+
+
+def insert_defaults(
+        touched: Iterable[str], now: datetime) -> Dict[str, Any]:
+    """
+    Нулевые поля для первого upsert'а (кроме тех, что пишет сам апдейт),
+    чтобы документ сразу создавался полным.
+    """
+    roots = {key.split(".")[0] for key in touched}
+    defaults = {
+        key: value for key, value in DEFAULT_DOC.items()
+        if key not in roots and key != "updated_at"
+    }
+    defaults["created_at"] = now
+    return defaults
+
+
+def build_counters_pipeline(
+        inc: Dict[str, int], now: datetime) -> List[Dict[str, Any]]:
+    """
+    Pipeline-update: инкременты счётчиков и пересчёт avg_rating,
+    rating_score и rating_stddev на стороне сервера — одна атомарная
+    команда без гонок.
+    """
+    votes = settings.film_rating_min_votes
+    prior = votes * settings.film_rating_prior_mean
+    has_ratings = {"$gt": [{"$ifNull": ["$ratings_count", 0]}, 0]}
+    added: Dict[str, Any] = {
+        key: {"$ifNull": [f"${key}", value]}
+        for key, value in insert_defaults(inc, now).items()
+    }
+    added.update({
+        key: {"$add": [{"$ifNull": [f"${key}", 0]}, value]}
+        for key, value in inc.items()
+    })
+    added["updated_at"] = now
+    return [
+        {"$set": added},
+        {"$set": {
+            "avg_rating": {"$cond": [
+                has_ratings,
+                {"$divide": ["$ratings_sum", "$ratings_count"]},
+                0.0,
+            ]},
+            "rating_score": {"$cond": [
+                has_ratings,
+                {"$divide": [{"$add": [prior, "$ratings_sum"]},
+                             {"$add": [votes, "$ratings_count"]}]},
+                0.0,
+            ]},
+        }},
+        # σ = sqrt(sumsq/n - avg²); max(0) гасит погрешность float
+        {"$set": {"rating_stddev": {"$cond": [
+            has_ratings,
+            {"$sqrt": {"$max": [0, {"$subtract": [
+                {"$divide": [{"$ifNull": ["$ratings_sumsq", 0]},
+                             "$ratings_count"]},
+                {"$multiply": ["$avg_rating", "$avg_rating"]},
+            ]}]}},
+            0.0,
+        ]}}},
+    ]
+
+
+def build_counters_update(
+        inc: Dict[str, int],
+        now: datetime) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+    """Обычный $inc, либо pipeline, если затронуты поля рейтинга."""
+    if any(key in inc for key in RATING_FIELDS):
+        return build_counters_pipeline(inc, now)
+    return {
+        "$inc": inc,
+        "$set": {"updated_at": now},
+        "$setOnInsert": insert_defaults(inc, now),
+    }
+
+
 class FilmStatsRepo:
     def __init__(self, db: AsyncIOMotorDatabase):
         self._col = db["film_stats"]
+        self._shards = db["film_stats_shards"]
+        self._buckets = db["film_stats_buckets"]
+        self._client = db.client
+
+    @property
+    def client(self) -> AsyncIOMotorClient:
+        """Motor client для транзакций (свёртка шардов)."""
+        return self._client
 
     async def get_by_film_id(self, film_id: str) -> Optional[dict]:
         return await self._col.find_one({"film_id": film_id}, {"_id": 0})
 
-    async def ensure_doc(self, film_id: str) -> dict:
-        set_on_insert = {
-            "film_id": film_id,
-            "likes": 0,
-            "dislikes": 0,
-            "ratings_count": 0,
-            "ratings_sum": 0,
-            "avg_rating": 0.0,
-            "reviews_count": 0,
-            "votes_up": 0,
-            "votes_down": 0,
-            "created_at": datetime.now(timezone.utc),
-            # ВАЖНО: updated_at тут НЕ указываем
-        }
-        return await self._col.find_one_and_update(
-            {"film_id": film_id},
-            {
-                "$setOnInsert": set_on_insert,
-                "$currentDate": {"updated_at": True},
-            },
-            upsert=True,
-            return_document=ReturnDocument.AFTER,
-        )
+    async def get_many(self, film_ids: List[str]) -> Dict[str, dict]:
+        """Один $in-запрос по многим фильмам: {film_id: doc}."""
+        cursor = self._col.find({"film_id": {"$in": film_ids}}, {"_id": 0})
+        return {doc["film_id"]: doc async for doc in cursor}
+
+    async def top(
+            self,
+            sort: SortSpec,
+            limit: int,
+            after: Optional[List[Any]] = None) -> List[dict]:
+        """
+        Страница топа по убыванию поля (keyset: строго после `after`).
+        В топ попадают только фильмы с положительным значением поля.
+        """
+        field = sort[0][0]
+        query: Dict[str, Any] = {field: {"$gt": 0}}
+        if after is not None:
+            query = {"$and": [query, seek_filter(sort, after)]}
+        cursor = self._col.find(query, {"_id": 0}).sort(list(sort))
+        return await cursor.limit(limit).to_list(length=limit)
 
     async def apply_inc_and_set(
             self,
             film_id: str,
             inc: dict | None = None,
-            set_: dict | None = None) -> dict:
+            set_: dict | None = None,
+            session: Optional[AsyncIOMotorClientSession] = None) -> dict:
         """
         Аккуратно объединяем $inc и $set. updated_at всегда обновляется.
+        С `session` — внутри транзакции вызывающего.
         """
         now = datetime.now(timezone.utc)
         update: Dict[str, Any] = {"$set": {"updated_at": now}}
@@ -58,10 +239,187 @@ class FilmStatsRepo:
             update["$inc"] = inc
         if set_:
             update["$set"].update(set_)
+        update["$setOnInsert"] = insert_defaults(
+            [*(inc or {}), *(set_ or {})], now)
         return await self._col.find_one_and_update(
             {"film_id": film_id},
             update,
             upsert=True,
             return_document=ReturnDocument.AFTER,
             projection={"_id": 0},
+            session=session,
         )
+
+    async def apply_rating_delta(
+            self,
+            film_id: str,
+            inc: Dict[str, int]) -> dict:
+        """
+        Инкремент ratings_* и пересчёт avg_rating за один round trip.
+        """
+        return await self._col.find_one_and_update(
+            {"film_id": film_id},
+            build_counters_pipeline(inc, datetime.now(timezone.utc)),
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+            projection={"_id": 0},
+        )
+
+    async def bulk_apply_inc(self, deltas: Dict[str, Dict[str, int]]) -> int:
+        """
+        Применяет накопленные $inc по многим фильмам одним ordered
+        bulk_write (в порядке `deltas`, пустые дельты пропускаются).
+        Возвращает число отправленных операций. При BulkWriteError
+        применён ровно префикс до details["writeErrors"][0]["index"]:
+        корзины пишутся только для него, ошибка пробрасывается дальше.
+        """
+        if not deltas:
+            return 0
+        now = datetime.now(timezone.utc)
+        films = [film_id for film_id, inc in deltas.items() if inc]
+        ops = [
+            UpdateOne(
+                {"film_id": film_id},
+                build_counters_update(deltas[film_id], now),
+                upsert=True,
+            )
+            for film_id in films
+        ]
+        applied = 0
+        try:
+            if ops:
+                await self._col.bulk_write(ops, ordered=True)
+            applied = len(ops)
+        except BulkWriteError as error:
+            applied = error.details["writeErrors"][0]["index"]
+            raise
+        finally:
+            # корзины — по времени сброса (сдвиг не больше интервала flush)
+            await self._write_buckets([
+                op for film_id in films[:applied]
+                for op in bucket_updates(film_id, deltas[film_id], now)
+            ])
+        return len(ops)
+
+    # ----- time buckets (тренды) -----
+
+    async def bulk_apply_bucket_inc(
+            self,
+            deltas: Dict[str, Dict[str, int]]) -> int:
+        """
+        $inc накопленных дельт в текущие часовые и суточные корзины
+        фильмов одним unordered bulk_write. Возвращает число операций.
+        """
+        now = datetime.now(timezone.utc)
+        ops = [op for film_id, inc in deltas.items()
+               for op in bucket_updates(film_id, inc, now)]
+        await self._write_buckets(ops)
+        return len(ops)
+
+    async def _write_buckets(self, ops: List[UpdateOne]) -> None:
+        """
+        Корзины пишутся после основных счётчиков и best-effort: ошибка
+        не должна приводить к повтору (и двойному учёту) film_stats.
+        """
+        if not ops:
+            return
+        try:
+            await self._buckets.bulk_write(ops, ordered=False)
+        except PyMongoError as error:
+            metrics.inc("film_stats_bucket_errors")
+            logger.warning("film_stats_bucket_write_failed",
+                           extra={"err": str(error), "ops": len(ops)})
+
+    async def get_buckets(
+            self,
+            film_id: str,
+            step: str,
+            start: datetime,
+            end: datetime) -> List[dict]:
+        """Корзины фильма с ts в [start, end) по возрастанию ts."""
+        projection = {"_id": 0, "ts": 1, **dict.fromkeys(BUCKET_FIELDS, 1)}
+        cursor = self._buckets.find(
+            {"film_id": film_id, "step": step,
+             "ts": {"$gte": start, "$lt": end}},
+            projection,
+        ).sort("ts", 1)
+        return [doc async for doc in cursor]
+
+    # ----- sharded counters (горячие фильмы) -----
+
+    async def mark_sharded(self, film_id: str, shards: int) -> None:
+        """Помечаем основной документ: читатели должны суммировать шарды."""
+        now = datetime.now(timezone.utc)
+        await self._col.update_one(
+            {"film_id": film_id},
+            {
+                "$max": {"shards": shards},
+                "$set": {"updated_at": now},
+                "$setOnInsert": insert_defaults(["shards"], now),
+            },
+            upsert=True,
+        )
+
+    async def apply_shard_inc(
+            self,
+            film_id: str,
+            shard: int,
+            inc: Dict[str, int]) -> None:
+        """$inc в один из K поддокументов фильма."""
+        await self._shards.update_one(
+            {"film_id": film_id, "shard": shard},
+            {"$inc": inc, "$set": {"updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+
+    async def films_with_shard_deltas(self) -> List[str]:
+        """Фильмы, в шардах которых есть ещё не свёрнутые дельты."""
+        nonzero = [{field: {"$nin": [0, None]}} for field in SHARDED_FIELDS]
+        films: List[str] = await self._shards.distinct(
+            "film_id", {"$or": nonzero})
+        return films
+
+    async def fold_shards(
+            self,
+            film_id: str,
+            session: AsyncIOMotorClientSession) -> Dict[str, int]:
+        """
+        Перенести суммы шардов фильма в основной документ и обнулить
+        шарды. Только внутри транзакции: конкурентный $inc в шард после
+        снимка даёт WriteConflict и повтор, а не потерю дельты.
+        """
+        sums: Dict[str, int] = {}
+        async for doc in self._shards.find(
+                {"film_id": film_id}, session=session):
+            for field in SHARDED_FIELDS:
+                value = int(doc.get(field) or 0)
+                if value:
+                    sums[field] = sums.get(field, 0) + value
+        if not sums:
+            return sums
+        await self._shards.update_many(
+            {"film_id": film_id},
+            {"$set": {field: 0 for field in SHARDED_FIELDS}},
+            session=session,
+        )
+        await self._col.update_one(
+            {"film_id": film_id},
+            {"$inc": sums, "$set": {"updated_at": datetime.now(timezone.utc)}},
+            session=session,
+        )
+        return sums
+
+    async def sum_shards(self, film_ids: List[str]) -> Dict[str, dict]:
+        """Суммы счётчиков по шардам для нескольких фильмов."""
+        group: Dict[str, Any] = {
+            field: {"$sum": f"${field}"} for field in SHARDED_FIELDS
+        }
+        group["updated_at"] = {"$max": "$updated_at"}
+        pipeline = [
+            {"$match": {"film_id": {"$in": film_ids}}},
+            {"$group": {"_id": "$film_id", **group}},
+        ]
+        return {
+            doc.pop("_id"): doc
+            async for doc in self._shards.aggregate(pipeline)
+        }
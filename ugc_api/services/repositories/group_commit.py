@@ -0,0 +1,178 @@
+"""Group commit: merge concurrent single-document writes into bulk_write."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+
+from ugc_api.core.config import settings
+from ugc_api.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+_Entry = Tuple[Hashable, UpdateOne, "asyncio.Future[WriteResult]"]
+
+
+@dataclass(frozen=True)
+class WriteResult:
+    """Outcome of one operation inside a group-committed bulk_write.
+
+    `upserted` — the op inserted a new document; `duplicate` — its upsert
+    hit the unique index, i.e. the filter did not match an existing doc.
+    """
+
+    upserted: bool = False
+    duplicate: bool = False
+
+
+class GroupCommitter:
+    """Batch writes that arrive within `window_ms` (or `max_ops` of them).
+
+    Every batch is one unordered bulk_write; each caller gets a future
+    with its own WriteResult. At most one operation per key is in flight:
+    a second write for the same key waits for the first one to finish,
+    so per-key order is the order of `submit` calls.
+    """
+
+    def __init__(
+        self,
+        col: AsyncIOMotorCollection,
+        window_ms: float = 2.0,
+        max_ops: int = 256,
+    ) -> None:
+        """Bind committer to a collection and configure batch limits."""
+        self._col = col
+        self._name = col.name
+        self._window = window_ms / 1000
+        self._max_ops = max(1, max_ops)
+        self._batch: List[_Entry] = []
+        self._keys: Dict[Hashable, asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight: Set[asyncio.Task] = set()
+
+    async def submit(self, key: Hashable, op: UpdateOne) -> WriteResult:
+        """Queue `op` for the next batch and wait for its result."""
+        while key in self._keys:
+            # предыдущая запись того же ключа ещё не применена
+            await asyncio.wait([self._keys[key]])
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[WriteResult] = loop.create_future()
+        self._batch.append((key, op, future))
+        self._keys[key] = future
+        if len(self._batch) >= self._max_ops:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._window, self._dispatch)
+        return await asyncio.shield(future)
+
+    async def close(self) -> None:
+        """Send the pending batch and wait for all in-flight writes."""
+        self._dispatch()
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    def _dispatch(self) -> None:
+        """Detach the current batch and write it in a background task."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        task = asyncio.create_task(self._write(batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _write(self, batch: List[_Entry]) -> None:
+        """Run one bulk_write and resolve callers' futures.
+
+        Whatever happens (including cancellation mid-batch), every
+        future of the batch is resolved and its key released, so later
+        writers of the same keys never wait forever.
+        """
+        try:
+            await self._bulk_write(batch)
+        finally:
+            cancelled = PyMongoError("group_commit_cancelled")
+            self._finish(batch, lambda _: cancelled)
+
+    async def _bulk_write(self, batch: List[_Entry]) -> None:
+        """Send the batch as one unordered bulk_write."""
+        metrics.inc(f"{self._name}_group_commits")
+        metrics.observe(f"{self._name}_group_commit_size", len(batch))
+        upserted: Set[int] = set()
+        errors: Dict[int, Dict[str, Any]] = {}
+        try:
+            result = await self._col.bulk_write(
+                [op for _, op, _ in batch], ordered=False)
+            upserted = set(result.upserted_ids or {})
+        except BulkWriteError as error:
+            upserted = {u["index"] for u in error.details.get("upserted", [])}
+            errors = {e["index"]: e for e in error.details["writeErrors"]}
+        except PyMongoError as error:
+            batch_error = error
+            metrics.inc(f"{self._name}_group_commit_errors")
+            logger.warning("group_commit_failed", extra={
+                "collection": self._name, "ops": len(batch),
+                "err": str(error)})
+            self._finish(batch, lambda _: batch_error)
+            return
+
+        def outcome(index: int) -> Any:
+            failure = errors.get(index)
+            if failure is None:
+                return WriteResult(upserted=index in upserted)
+            if failure.get("code") == DUPLICATE_KEY:
+                return WriteResult(duplicate=True)
+            return OperationFailure(
+                failure.get("errmsg", ""), failure.get("code"), failure)
+
+        self._finish(batch, outcome)
+
+    def _finish(self, batch: List[_Entry], outcome: Any) -> None:
+        """Release keys and resolve futures that are still pending."""
+        for index, (key, _, future) in enumerate(batch):
+            if self._keys.get(key) is future:
+                del self._keys[key]
+            if future.done():
+                continue
+            value = outcome(index)
+            if isinstance(value, BaseException):
+                future.set_exception(value)
+            else:
+                future.set_result(value)
+
+
+_committers: Dict[str, GroupCommitter] = {}
+
+
+def get_group_committer(
+        col: AsyncIOMotorCollection) -> Optional[GroupCommitter]:
+    """Return process-wide committer for `col` if group commit is on."""
+    if not settings.group_commit_enabled:
+        return None
+    full_name = f"{col.database.name}.{col.name}"
+    committer = _committers.get(full_name)
+    if committer is None:
+        committer = GroupCommitter(
+            col,
+            window_ms=settings.group_commit_window_ms,
+            max_ops=settings.group_commit_max_ops,
+        )
+        _committers[full_name] = committer
+    return committer
+
+
+async def close_group_committers() -> None:
+    """Flush and drop all committers (called on lifespan shutdown)."""
+    while _committers:
+        _, committer = _committers.popitem()
+        await committer.close()
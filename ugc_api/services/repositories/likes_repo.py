@@ -2,12 +2,14 @@
 
 from __future__ import annotations
 
-from typing import Optional
+from typing import Dict, List, Optional
 
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from pymongo import ReturnDocument
+from pymongo import ReturnDocument, UpdateOne
 from pymongo.errors import PyMongoError
 
+from ugc_api.services.repositories.group_commit import get_group_committer
+
 
 class LikesRepo:
     """CRUD helpers for like/dislike state."""
@@ -31,6 +33,18 @@ class LikesRepo:
         )
         return None if doc is None else int(doc['value'])
 
+    async def values_for_films(
+        self,
+        user_id: str,
+        film_ids: List[str],
+    ) -> Dict[str, int]:
+        """User reactions for many films (covered index, no doc fetch)."""
+        cursor = self._col.find(
+            {'user_id': user_id, 'film_id': {'$in': film_ids}},
+            {'_id': 0, 'film_id': 1, 'value': 1},
+        )
+        return {doc['film_id']: int(doc['value']) async for doc in cursor}
+
     async def set(
         self,
         film_id: str,
@@ -38,6 +52,22 @@ class LikesRepo:
         value: int,
     ) -> Optional[int]:
         """Idempotently set reaction; return previous value (or None)."""
+        committer = get_group_committer(self._col)
+        if committer is not None:
+            # value ∈ {+1, -1}: фильтр совпал — прежнее было -value,
+            # upsert — реакции не было, дубль ключа — уже стояло value
+            result = await committer.submit(
+                (film_id, user_id),
+                UpdateOne(
+                    {'film_id': film_id, 'user_id': user_id,
+                     'value': {'$ne': value}},
+                    {'$set': {'value': value}},
+                    upsert=True,
+                ),
+            )
+            if result.upserted:
+                return None
+            return value if result.duplicate else -value
         try:
             prev = await self._col.find_one_and_update(
                 {'film_id': film_id, 'user_id': user_id},
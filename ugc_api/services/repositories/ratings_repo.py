@@ -3,10 +3,26 @@
 from __future__ import annotations
 
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
 
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from pymongo import ReturnDocument
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from ugc_api.services.cursor import seek_filter
+
+# порядок списка оценок; совпадает с индексом ratings_user_updated_id
+LIST_SORT = [('updated_at', -1), ('_id', -1)]
+# дубль ключа ratings_user_film: условие по прочитанной оценке не совпало
+DUPLICATE_KEY = 11000
+
+
+class BulkUpsertResult(NamedTuple):
+    """Исходы bulk_upsert по индексам элементов."""
+
+    failed: Set[int]  # ошибка записи, строка не применена
+    conflicts: Set[int]  # оценку изменили после чтения, не применена
+    inserted: Set[int]  # документ создан (прежней оценки нет)
 
 
 class RatingsRepo:
@@ -20,19 +36,81 @@ class RatingsRepo:
         user_id: str,
         film_id: str,
         score: int,
-    ) -> Dict[str, Any]:
-        """Upsert rating for (user, film) and return updated document."""
+    ) -> Optional[Dict[str, Any]]:
+        """Upsert rating for (user, film) and return the previous one.
+
+        One atomic round trip: the returned projection (score only) is
+        the document before the update, None if the rating is new.
+        """
         now = datetime.now(timezone.utc)
-        doc = await self.col.find_one_and_update(
+        return await self.col.find_one_and_update(
             {'user_id': user_id, 'film_id': film_id},
             {
                 '$set': {'score': score, 'updated_at': now},
                 '$setOnInsert': {'created_at': now},
             },
             upsert=True,
-            return_document=ReturnDocument.AFTER,
+            projection={'_id': 0, 'score': 1},
+            return_document=ReturnDocument.BEFORE,
+        )
+
+    async def scores_for_films(
+        self,
+        user_id: str,
+        film_ids: List[str],
+    ) -> Dict[str, int]:
+        """User scores for many films (covered index, no doc fetch)."""
+        cursor = self.col.find(
+            {'user_id': user_id, 'film_id': {'$in': film_ids}},
+            {'_id': 0, 'film_id': 1, 'score': 1},
         )
-        return doc
+        return {doc['film_id']: int(doc['score']) async for doc in cursor}
+
+    async def bulk_upsert(
+        self,
+        user_id: str,
+        items: List[Tuple[str, int, Optional[int]]],
+    ) -> BulkUpsertResult:
+        """Upsert many (film, score, previous) with one unordered bulk_write.
+
+        Each update is conditioned on the previously read score (or its
+        absence), so a concurrent change makes it hit the unique index
+        instead of overwriting: such items are reported as conflicts and
+        left unapplied, like failed ones; the rest are applied.
+        """
+        if not items:
+            return BulkUpsertResult(set(), set(), set())
+        now = datetime.now(timezone.utc)
+        ops = [
+            UpdateOne(
+                {
+                    'user_id': user_id,
+                    'film_id': film_id,
+                    'score': prev if prev is not None else {'$exists': False},
+                },
+                {
+                    '$set': {'score': score, 'updated_at': now},
+                    '$setOnInsert': {'created_at': now},
+                },
+                upsert=True,
+            )
+            for film_id, score, prev in items
+        ]
+        try:
+            res = await self.col.bulk_write(ops, ordered=False)
+        except BulkWriteError as error:
+            if error.details.get('writeConcernErrors'):
+                raise
+            errors = error.details['writeErrors']
+            return BulkUpsertResult(
+                failed={err['index'] for err in errors
+                        if err['code'] != DUPLICATE_KEY},
+                conflicts={err['index'] for err in errors
+                           if err['code'] == DUPLICATE_KEY},
+                inserted={doc['index']
+                          for doc in error.details.get('upserted', [])},
+            )
+        return BulkUpsertResult(set(), set(), set(res.upserted_ids or {}))
 
     async def find_user_film(
         self,
@@ -45,23 +123,39 @@ class RatingsRepo:
             {'_id': 0, 'score': 1},
         )
 
-    async def delete(self, user_id: str, film_id: str) -> bool:
-        """Delete rating for (user, film)."""
-        result = await self.col.delete_one(
+    async def delete(
+        self,
+        user_id: str,
+        film_id: str,
+    ) -> Optional[int]:
+        """Delete rating for (user, film) and return its score (or None)."""
+        doc = await self.col.find_one_and_delete(
             {'user_id': user_id, 'film_id': film_id},
+            projection={'_id': 0, 'score': 1},
         )
-        return result.deleted_count == 1
+        if doc is None or doc.get('score') is None:
+            return None
+        return int(doc['score'])
 
     async def list_by_user(
         self,
         user_id: str,
         limit: int,
-        offset: int,
+        offset: int = 0,
+        after: Optional[List[Any]] = None,
     ) -> List[Dict[str, Any]]:
-        """List user ratings with pagination (newest first)."""
+        """List user ratings, newest first.
+
+        With `after` (sort key of the previous page's last item) the
+        page is a range scan on the index; offset is kept for
+        compatibility only.
+        """
+        query: Dict[str, Any] = {'user_id': user_id}
+        if after is not None:
+            query.update(seek_filter(LIST_SORT, after))
         cursor = (
-            self.col.find({'user_id': user_id}, {'_id': 0})
-            .sort('updated_at', -1)
+            self.col.find(query, {'user_id': 0, 'created_at': 0})
+            .sort(LIST_SORT)
             .skip(offset)
             .limit(limit)
         )
@@ -2,50 +2,59 @@ from __future__ import annotations
 from typing import Optional
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
 
 
 class ReviewVotesRepo:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.col = db["review_votes"]
 
-    async def get_user_vote(
-            self,
-            review_id: str,
-            user_id: str,
-            session=None) -> Optional[str]:
-        d = await self.col.find_one(
-            {"review_id": ObjectId(review_id), "user_id": user_id},
-            session=session,
-        )
-        return d["value"] if d else None
-
     async def upsert_vote(
             self,
             review_id: str,
             user_id: str,
-            value: str, session=None) -> None:
-        await self.col.update_one(
+            value: str, session=None) -> Optional[str]:
+        """Поставить голос; вернуть прежний (None — голоса не было)."""
+        prev = await self.col.find_one_and_update(
             {"review_id": ObjectId(review_id), "user_id": user_id},
             {"$set": {"value": value}},
             upsert=True,
+            return_document=ReturnDocument.BEFORE,
+            projection={"_id": 0, "value": 1},
             session=session,
         )
+        return prev["value"] if prev else None
 
     async def delete_vote(
             self,
             review_id: str,
             user_id: str,
-            session=None) -> bool:
-        res = await self.col.delete_one(
+            session=None) -> Optional[str]:
+        """Снять голос; вернуть удалённое значение (None — не было)."""
+        prev = await self.col.find_one_and_delete(
             {"review_id": ObjectId(review_id), "user_id": user_id},
+            projection={"_id": 0, "value": 1},
             session=session,
         )
-        return res.deleted_count == 1
+        return prev["value"] if prev else None
 
-    async def delete_many_by_review(
+    async def delete_batch(
             self,
-            review_id: str,
-            session=None) -> None:
-        await self.col.delete_many(
-            {"review_id": ObjectId(review_id)},
-            session=session)
+            review_id: ObjectId,
+            limit: int,
+            film_id: Optional[str] = None) -> int:
+        """
+        Удалить до `limit` голосов рецензии; вернуть сколько удалено.
+        С `film_id` голоса перед удалением помечаются фильмом: pre-image
+        события delete несёт film_id, и проектор не ищет уже удалённую
+        рецензию.
+        """
+        ids = [d["_id"] async for d in self.col.find(
+            {"review_id": review_id}, {"_id": 1}).limit(limit)]
+        if not ids:
+            return 0
+        if film_id is not None:
+            await self.col.update_many(
+                {"_id": {"$in": ids}}, {"$set": {"film_id": film_id}})
+        res = await self.col.delete_many({"_id": {"$in": ids}})
+        return int(res.deleted_count)
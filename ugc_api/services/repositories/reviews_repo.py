@@ -2,11 +2,93 @@
 
 from __future__ import annotations
 
-from datetime import datetime, timezone
+import math
+from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, List, Optional
 
 from bson import ObjectId
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from motor.motor_asyncio import AsyncIOMotorClientSession, AsyncIOMotorDatabase
+
+from ugc_api.core.config import settings
+from ugc_api.services.cursor import SortSpec, seek_filter
+
+# порядок списков; совпадает с индексами reviews_film_*_id
+LIST_SORTS: Dict[str, SortSpec] = {
+    'new': [('created_at', -1), ('_id', -1)],
+    'top': [('votes.up', -1), ('created_at', -1), ('_id', -1)],
+    'hot': [('rank.hot', -1), ('_id', -1)],
+    'best': [('rank.best', -1), ('_id', -1)],
+}
+
+# удалённые рецензии до фоновой очистки голосов остаются «надгробиями»
+ALIVE = {'deleted_at': {'$exists': False}}
+
+# точка отсчёта времени в hot-ранге и z для 95% интервала Уилсона
+HOT_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+WILSON_Z = 1.96
+
+
+def rank_hot(up: int, down: int, created_at: datetime) -> float:
+    """log10 of the net score plus creation time in decay units.
+
+    The time term grows for every new review, so older reviews sink
+    without rewriting their rank: stored values never go stale.
+    """
+    score = up - down
+    sign = (score > 0) - (score < 0)
+    age = (created_at - HOT_EPOCH).total_seconds()
+    return (sign * math.log10(max(abs(score), 1))
+            + age / settings.reviews_hot_decay_s)
+
+
+def rank_best(up: int, down: int) -> float:
+    """Lower bound of Wilson score interval for the share of up-votes."""
+    total = up + down
+    if total == 0:
+        return 0.0
+    z2 = WILSON_Z * WILSON_Z
+    share = up / total
+    spread = WILSON_Z * math.sqrt(
+        (share * (1 - share) + z2 / (4 * total)) / total)
+    return (share + z2 / (2 * total) - spread) / (1 + z2 / total)
+
+
+def rank_stage() -> Dict[str, Any]:
+    """Pipeline-update stage recomputing rank.hot / rank.best from votes.
+
+    Server-side twin of `rank_hot` / `rank_best`, so the rank changes
+    atomically with the vote counters it is derived from.
+    """
+    up, down = '$votes.up', '$votes.down'
+    score = {'$subtract': [up, down]}
+    age_s = {'$divide': [{'$subtract': ['$created_at', HOT_EPOCH]}, 1000]}
+    z2 = WILSON_Z * WILSON_Z
+    share = {'$divide': [up, '$$n']}
+    spread = {'$multiply': [WILSON_Z, {'$sqrt': {'$divide': [
+        {'$add': [{'$multiply': ['$$p', {'$subtract': [1, '$$p']}]},
+                  {'$divide': [z2 / 4, '$$n']}]},
+        '$$n',
+    ]}}]}
+    wilson = {'$divide': [
+        {'$subtract': [{'$add': ['$$p', {'$divide': [z2 / 2, '$$n']}]},
+                       spread]},
+        {'$add': [1, {'$divide': [z2, '$$n']}]},
+    ]}
+    return {'$set': {
+        'rank.hot': {'$add': [
+            {'$multiply': [{'$cmp': [score, 0]},
+                           {'$log10': {'$max': [{'$abs': score}, 1]}}]},
+            {'$divide': [age_s, settings.reviews_hot_decay_s]},
+        ]},
+        'rank.best': {'$let': {
+            'vars': {'n': {'$add': [up, down]}},
+            'in': {'$cond': [
+                {'$eq': ['$$n', 0]},
+                0.0,
+                {'$let': {'vars': {'p': share}, 'in': wilson}},
+            ]},
+        }},
+    }}
 
 
 class ReviewsRepo:
@@ -14,6 +96,8 @@ class ReviewsRepo:
 
     def __init__(self, db: AsyncIOMotorDatabase) -> None:
         self.col = db['reviews']
+        # версия списка рецензий фильма (ETag для условного GET)
+        self.versions = db['reviews_versions']
 
     @property
     def client(self):
@@ -25,21 +109,24 @@ class ReviewsRepo:
         film_id: str,
         user_id: str,
         text: str,
+        session: Optional[AsyncIOMotorClientSession] = None,
     ) -> str:
         """Insert a new review and return its id as string."""
+        now = datetime.now(timezone.utc)
         doc = {
             'film_id': film_id,
             'user_id': user_id,
             'text': text,
-            'created_at': datetime.now(timezone.utc),
+            'created_at': now,
             'votes': {'up': 0, 'down': 0},
+            'rank': {'hot': rank_hot(0, 0, now), 'best': rank_best(0, 0)},
         }
-        result = await self.col.insert_one(doc)
+        result = await self.col.insert_one(doc, session=session)
         return str(result.inserted_id)
 
     async def get_by_id(self, review_id: str) -> Optional[Dict[str, Any]]:
-        """Get single review by its id."""
-        return await self.col.find_one({'_id': ObjectId(review_id)})
+        """Get single review by its id (tombstones are hidden)."""
+        return await self.col.find_one({'_id': ObjectId(review_id), **ALIVE})
 
     async def list_by_film(
         self,
@@ -47,70 +134,69 @@ class ReviewsRepo:
         limit: int,
         offset: int,
         sort: str = 'new',
+        after: Optional[List[Any]] = None,
     ) -> List[Dict[str, Any]]:
-        """List film reviews with sorting and pagination."""
-        query = {'film_id': film_id}
-
-        if sort == 'top':
-            cursor = (
-                self.col.find(query)
-                .sort([('votes.up', -1), ('created_at', -1)])
-                .skip(offset)
-                .limit(limit)
-            )
-        else:
-            cursor = (
-                self.col.find(query)
-                .sort('created_at', -1)
-                .skip(offset)
-                .limit(limit)
-            )
+        """List film reviews with sorting and pagination.
 
+        With `after` (sort key of the last seen review) the page is a
+        range seek on the compound index, so its cost does not depend
+        on depth; `offset` is kept for old clients.
+        """
+        order = LIST_SORTS.get(sort, LIST_SORTS['new'])
+        query: Dict[str, Any] = {'film_id': film_id, **ALIVE}
+        if after is not None:
+            query.update(seek_filter(order, after))
+        cursor = (
+            self.col.find(query)
+            .sort(list(order))
+            .skip(offset)
+            .limit(limit)
+        )
         return [doc async for doc in cursor]
 
     async def count_by_film(self, film_id: str) -> int:
         """Count reviews by film id."""
-        return await self.col.count_documents({'film_id': film_id})
+        return await self.col.count_documents({'film_id': film_id, **ALIVE})
 
     async def update_text(
         self,
         user_id: str,
         review_id: str,
         text: str,
-    ) -> bool:
-        """Update review text if user is the author."""
-        result = await self.col.update_one(
-            {'_id': ObjectId(review_id), 'user_id': user_id},
+    ) -> Optional[str]:
+        """Update review text if user is the author; return film_id.
+
+        None if review is missing, foreign or already has this text.
+        """
+        doc = await self.col.find_one_and_update(
+            {'_id': ObjectId(review_id), 'user_id': user_id,
+             'text': {'$ne': text}, **ALIVE},
             {'$set': {'text': text}},
+            projection={'film_id': 1, '_id': 0},
         )
-        return result.modified_count == 1
+        return doc['film_id'] if doc else None
 
     async def inc_votes(
         self,
         review_id: str,
         inc: Dict[str, int],
         session=None,
-    ) -> bool:
-        """Increment vote counters with $inc."""
-        result = await self.col.update_one(
-            {'_id': ObjectId(review_id)},
-            {'$inc': inc},
-            session=session,
-        )
-        return result.matched_count == 1
+    ) -> Optional[str]:
+        """Increment vote counters and recompute rank in one update.
 
-    async def delete(
-        self,
-        user_id: str,
-        review_id: str,
-        session=None,
-    ) -> bool:
-        """Delete review by id if user is the author."""
-        result = await self.col.delete_one(
-            {'_id': ObjectId(review_id), 'user_id': user_id},
+        Returns film_id of the review (None if it does not exist).
+        """
+        counters = {
+            key: {'$add': [{'$ifNull': [f'${key}', 0]}, value]}
+            for key, value in inc.items()
+        }
+        doc = await self.col.find_one_and_update(
+            {'_id': ObjectId(review_id), **ALIVE},
+            [{'$set': counters}, rank_stage()],
+            projection={'film_id': 1, '_id': 0},
             session=session,
         )
-        return result.deleted_count == 1
+        return doc['film_id'] if doc else None
 
     async def apply_vote_delta(
         self,
@@ -119,8 +205,11 @@ class ReviewsRepo:
         new_vote: Optional[str],
         *,
         session=None,
-    ) -> bool:
-        """Apply delta to votes.up/down according to old/new values."""
+    ) -> Optional[str]:
+        """Apply delta to votes.up/down according to old/new values.
+
+        Returns film_id of the review (None if it does not exist).
+        """
         inc: Dict[str, int] = {}
 
         if old_vote == 'up':
@@ -134,7 +223,7 @@ class ReviewsRepo:
             inc['votes.down'] = inc.get('votes.down', 0) + 1
 
         if not inc:
-            return True
+            return await self.get_film_id(review_id, session=session)
 
         return await self.inc_votes(review_id, inc, session=session)
 
@@ -146,23 +235,137 @@ class ReviewsRepo:
     ) -> Optional[str]:
         """Get film_id by review id (projection only)."""
         doc = await self.col.find_one(
-            {'_id': ObjectId(review_id)},
+            {'_id': ObjectId(review_id), **ALIVE},
             {'film_id': 1, '_id': 0},
             session=session,
         )
         return doc['film_id'] if doc else None
 
-    async def delete_and_return(
+    async def tombstone(
         self,
         user_id: str,
         review_id: str,
-        *,
-        session=None,
+        session: Optional[AsyncIOMotorClientSession] = None,
+    ) -> Optional[str]:
+        """Mark review deleted if user is the author; return film_id.
+
+        The document (and its votes) stays until the background purger
+        removes it; all reads and votes already skip it.
+        """
+        doc = await self.col.find_one_and_update(
+            {'_id': ObjectId(review_id), 'user_id': user_id, **ALIVE},
+            {'$set': {'deleted_at': datetime.now(timezone.utc)}},
+            projection={'film_id': 1, '_id': 0},
+            session=session,
+        )
+        return doc['film_id'] if doc else None
+
+    async def claim_tombstone(
+        self,
+        lease_s: float,
     ) -> Optional[Dict[str, Any]]:
-        """Delete review and return projection with film_id (for stats)."""
-        doc = await self.col.find_one_and_delete(
-            {'_id': ObjectId(review_id), 'user_id': user_id},
+        """Lease one tombstone nobody is purging (several workers run)."""
+        now = datetime.now(timezone.utc)
+        doc: Optional[Dict[str, Any]] = await self.col.find_one_and_update(
+            {'deleted_at': {'$exists': True},
+             '$or': [{'purge_lease': {'$exists': False}},
+                     {'purge_lease': {'$lt': now}}]},
+            {'$set': {'purge_lease': now + timedelta(seconds=lease_s)}},
+            projection={'_id': 1, 'film_id': 1},
+        )
+        return doc
+
+    async def extend_lease(self, review_id: ObjectId, lease_s: float) -> None:
+        """Keep the lease while a long purge is in progress."""
+        await self.col.update_one(
+            {'_id': review_id},
+            {'$set': {'purge_lease': datetime.now(timezone.utc)
+                      + timedelta(seconds=lease_s)}},
+        )
+
+    async def get_tombstone(
+        self,
+        review_id: ObjectId,
+    ) -> Optional[Dict[str, Any]]:
+        """Tombstone's film_id, votes and recorded purge_votes (if any)."""
+        doc: Optional[Dict[str, Any]] = await self.col.find_one(
+            {'_id': review_id, 'deleted_at': {'$exists': True}},
+            projection={'film_id': 1, 'votes': 1, 'purge_votes': 1,
+                        '_id': 0},
+        )
+        return doc
+
+    async def set_purge_votes(
+        self,
+        review_id: ObjectId,
+        votes: Dict[str, int],
+    ) -> None:
+        """Record the vote counters whose stats delta is being applied.
+
+        Written once: a retried purge applies the recorded delta again
+        rather than losing it.
+        """
+        await self.col.update_one(
+            {'_id': review_id, 'deleted_at': {'$exists': True},
+             'purge_votes': {'$exists': False}},
+            {'$set': {'purge_votes': votes}},
+        )
+
+    async def remove_tombstone(
+        self,
+        review_id: ObjectId,
+        session: Optional[AsyncIOMotorClientSession] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Finally delete a tombstone; return its film_id and votes."""
+        doc: Optional[Dict[str, Any]] = await self.col.find_one_and_delete(
+            {'_id': review_id, 'deleted_at': {'$exists': True}},
+            projection={'film_id': 1, 'votes': 1, '_id': 0},
+            session=session,
+        )
+        return doc
+
+    async def bump_version(
+        self,
+        film_id: str,
+        reviews: int = 0,
+        session: Optional[AsyncIOMotorClientSession] = None,
+    ) -> None:
+        """Increment version of film's review list after any change.
+
+        `reviews` moves the list's review counter in the same update, so
+        the total never changes without a new version (ETag). Writes
+        that change the counter run in one transaction with the review
+        write, so a count taken between two versions is exact.
+        """
+        inc = {'version': 1}
+        if reviews:
+            inc['reviews'] = reviews
+        await self.versions.update_one(
+            {'film_id': film_id},
+            {'$inc': inc,
+             '$set': {'updated_at': datetime.now(timezone.utc)}},
+            upsert=True,
             session=session,
-            projection={'film_id': 1, '_id': 1},
+        )
+
+    async def get_version(self, film_id: str) -> Optional[Dict[str, Any]]:
+        """Get {version, updated_at, reviews, exact} of film's list."""
+        doc: Optional[Dict[str, Any]] = await self.versions.find_one(
+            {'film_id': film_id},
+            {'_id': 0, 'version': 1, 'updated_at': 1, 'reviews': 1,
+             'exact': 1},
         )
         return doc
+
+    async def set_count(self, film_id: str, version: int, value: int) -> bool:
+        """Store the exact counter if the list is still at `version`.
+
+        Compare-and-set: any review write since the version was read
+        bumps it, and the counted value is then dropped. Never creates
+        the version document.
+        """
+        result = await self.versions.update_one(
+            {'film_id': film_id, 'version': version},
+            {'$set': {'reviews': value, 'exact': True}},
+        )
+        return result.matched_count == 1
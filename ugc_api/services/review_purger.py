@@ -0,0 +1,244 @@
+"""Background purge of deleted (tombstoned) reviews and their votes."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClientSession, AsyncIOMotorDatabase
+from pymongo.errors import PyMongoError
+
+from ugc_api.core.config import settings
+from ugc_api.core.metrics import metrics
+from ugc_api.db.transactions import run_transaction
+from ugc_api.services.film_stats_service import FilmStatsService
+from ugc_api.services.repositories.review_votes_repo import ReviewVotesRepo
+from ugc_api.services.repositories.reviews_repo import ReviewsRepo
+
+logger = logging.getLogger(__name__)
+
+LEASE_S = 60.0
+THROTTLE_SLEEP_S = 0.5
+
+
+class ReviewPurger:
+    """Delete votes of tombstoned reviews in batches, then the review.
+
+    Tombstones themselves are the queue, so work survives restarts and
+    several workers can run purgers: each review is leased by one of
+    them at a time. Between batches the purger waits while secondaries
+    lag more than `max_lag_s`. film_stats is updated once, when the
+    review document is finally removed: in the same transaction when
+    stats are written inline, otherwise before the removal from vote
+    counters recorded on the tombstone, so a failed stats write is
+    retried with the tombstone. With `tag_votes` (stats kept by
+    the change-stream projector) every vote gets the review's film_id
+    right before deletion, so its delete event can be attributed even
+    after the review itself is gone.
+    """
+
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        stats: Optional[FilmStatsService] = None,
+        batch_size: int = 1000,
+        max_lag_s: float = 10.0,
+        poll_s: float = 30.0,
+        tag_votes: bool = False,
+    ) -> None:
+        """Configure batching and throttling; call `start()` to run."""
+        self.repo = ReviewsRepo(db)
+        self.votes_repo = ReviewVotesRepo(db)
+        self.stats = stats
+        self._admin = db.client.admin
+        self._batch_size = batch_size
+        self._max_lag_s = max_lag_s
+        self._poll_s = poll_s
+        self._tag_votes = tag_votes
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the background purge loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def notify(self) -> None:
+        """Wake the loop right away (a review was just tombstoned)."""
+        self._wakeup.set()
+
+    async def close(self) -> None:
+        """Stop the loop; unfinished tombstones are resumed next start."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def purge_pending(self) -> int:
+        """Purge all tombstones not leased by others; return how many."""
+        purged = 0
+        while True:
+            doc = await self.repo.claim_tombstone(LEASE_S)
+            if doc is None:
+                return purged
+            await self._purge_review(doc['_id'], doc.get('film_id'))
+            purged += 1
+
+    async def _purge_review(
+            self, review_id: Any, film_id: Optional[str]) -> None:
+        """Delete votes batch by batch, then the review and its stats."""
+        votes = 0
+        while True:
+            await self._throttle()
+            deleted = await self.votes_repo.delete_batch(
+                review_id, self._batch_size,
+                film_id=film_id if self._tag_votes else None)
+            if not deleted:
+                break
+            votes += deleted
+            metrics.inc('review_purge_votes', deleted)
+            await self.repo.extend_lease(review_id, LEASE_S)
+
+        if self.stats is not None and self.stats.writes_inline:
+            doc = await self._remove_in_txn(review_id, self.stats)
+        else:
+            doc = await self._remove_after_stats(review_id)
+        if doc is None:
+            return  # другой воркер успел раньше
+        metrics.inc('review_purge_reviews')
+        logger.info('review_purged', extra={
+            'review_id': str(review_id), 'votes': votes})
+
+    async def _remove_in_txn(
+            self,
+            review_id: Any,
+            stats: FilmStatsService) -> Optional[Dict[str, Any]]:
+        """Remove the tombstone and apply its stats delta atomically."""
+        inc: Dict[str, int] = {}
+
+        async def body(
+                session: AsyncIOMotorClientSession,
+        ) -> Optional[Dict[str, Any]]:
+            doc = await self.repo.remove_tombstone(review_id, session=session)
+            if doc is None:
+                return None
+            counters: Dict[str, int] = doc.get('votes') or {}
+            inc.clear()
+            inc.update(stats.review_deleted_inc(
+                votes_up=int(counters.get('up', 0)),
+                votes_down=int(counters.get('down', 0)),
+            ))
+            await stats.apply_inc_in_session(doc['film_id'], inc, session)
+            # ETag списка — вместе с дельтой статистики
+            await self.repo.bump_version(doc['film_id'], session=session)
+            return doc
+
+        doc = await run_transaction(
+            self.repo.client, body, name='review_purge')
+        if doc is not None:
+            await stats.committed(doc['film_id'], inc)
+        return doc
+
+    async def _remove_after_stats(
+            self, review_id: Any) -> Optional[Dict[str, Any]]:
+        """Record the stats delta on the tombstone, apply it, then remove.
+
+        A failure before the removal leaves the tombstone (with its
+        recorded delta) for the next claim, so the delta is applied at
+        least once.
+        """
+        doc = await self.repo.get_tombstone(review_id)
+        if doc is None:
+            return None
+        counters: Optional[Dict[str, int]] = doc.get('purge_votes')
+        if counters is None:
+            counters = doc.get('votes') or {}
+            await self.repo.set_purge_votes(review_id, counters)
+        if self.stats:
+            await self.stats.apply_review_deleted(
+                doc['film_id'],
+                votes_up=int(counters.get('up', 0)),
+                votes_down=int(counters.get('down', 0)),
+            )
+        if await self.repo.remove_tombstone(review_id) is None:
+            return None
+        # ETag списка — после применения дельты статистики
+        await self.repo.bump_version(doc['film_id'])
+        return doc
+
+    async def _replication_lag_s(self) -> float:
+        """Max secondary lag behind primary (0 if it cannot be read)."""
+        try:
+            status = await self._admin.command('replSetGetStatus')
+        except PyMongoError:
+            return 0.0
+        members = status.get('members', [])
+        primary = next(
+            (m for m in members if m.get('stateStr') == 'PRIMARY'), None)
+        secondaries = [m for m in members if m.get('stateStr') == 'SECONDARY']
+        if primary is None or not secondaries:
+            return 0.0
+        return max(
+            float((primary['optimeDate'] - m['optimeDate']).total_seconds())
+            for m in secondaries
+        )
+
+    async def _throttle(self) -> None:
+        """Wait while replication lag is above the threshold."""
+        while await self._replication_lag_s() > self._max_lag_s:
+            metrics.inc('review_purge_throttled')
+            await asyncio.sleep(THROTTLE_SLEEP_S)
+
+    async def _run(self) -> None:
+        """Purge loop: on notify or every `poll_s` seconds."""
+        while True:
+            try:
+                await self.purge_pending()
+            except PyMongoError as error:
+                logger.warning(
+                    'review_purge_failed', extra={'err': str(error)})
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=self._poll_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+_purger: ReviewPurger | None = None
+
+
+def get_review_purger() -> Optional[ReviewPurger]:
+    """Return the running purger (None outside the app lifespan)."""
+    return _purger
+
+
+def start_review_purger(
+        db: AsyncIOMotorDatabase,
+        stats: Optional[FilmStatsService]) -> ReviewPurger:
+    """Create and start the process-wide purger (lifespan startup)."""
+    global _purger
+    if _purger is None:
+        _purger = ReviewPurger(
+            db,
+            stats,
+            batch_size=settings.reviews_purge_batch_size,
+            max_lag_s=settings.reviews_purge_max_lag_s,
+            poll_s=settings.reviews_purge_poll_s,
+            # голоса считает проектор — ему нужен film_id в событиях
+            tag_votes=not settings.film_stats_inline_updates,
+        )
+        _purger.start()
+    return _purger
+
+
+async def close_review_purger() -> None:
+    """Stop the purger (called on lifespan shutdown)."""
+    global _purger
+    if _purger is not None:
+        await _purger.close()
+        _purger = None
@@ -2,11 +2,19 @@
 
 from __future__ import annotations
 
+import asyncio
 from contextlib import asynccontextmanager
-from typing import List, Optional
+from datetime import datetime
+from typing import (
+    AsyncIterator, Awaitable, Callable, List, NamedTuple, Optional, TypeVar,
+)
 
+from motor.motor_asyncio import AsyncIOMotorClientSession
 from pymongo.errors import PyMongoError
 
+from ugc_api.core.locks import StripedLocks
+from ugc_api.db.transactions import run_transaction
+
 from ugc_api.models.reviews import (
     ReviewCreateRequest,
     ReviewCreateResponse,
@@ -15,37 +23,76 @@ from ugc_api.models.reviews import (
     ReviewVoteResponse,
     VoteValue,
 )
+from ugc_api.services.cursor import decode_cursor, split_page
 from ugc_api.services.film_stats_service import FilmStatsService
+from ugc_api.services.review_purger import ReviewPurger
 from ugc_api.services.repositories.review_votes_repo import ReviewVotesRepo
-from ugc_api.services.repositories.reviews_repo import ReviewsRepo
+from ugc_api.services.repositories.reviews_repo import LIST_SORTS, ReviewsRepo
 
 # Reused string literals to satisfy WPS226:
 VOTES_KEY = 'votes'
 UP = 'up'
 DOWN = 'down'
 
+T = TypeVar('T')
+
+
+class ListVersion(NamedTuple):
+    """Film's review-list version (ETag source) and its review counter."""
+
+    version: int
+    updated_at: Optional[datetime]
+    # None, пока счётчик не сверен с коллекцией
+    reviews: Optional[int]
+    exists: bool
+
 
 class ReviewsService:  # noqa: WPS214 (methods count)
     """Business-logic for reviews (CRUD + voting).
 
     Optionally updates film stats if the `stats` dependency is provided.
+    Every change bumps the film's review-list version, which backs the
+    ETag of the list endpoint.
     """
 
-    def __init__(self, db, stats: Optional[FilmStatsService] = None) -> None:
-        """Initialize service with db adapter
-         and optional film stats service."""
+    def __init__(
+            self,
+            db,
+            stats: Optional[FilmStatsService] = None,
+            locks: Optional[StripedLocks] = None,
+            purger: Optional[ReviewPurger] = None) -> None:
+        """Initialize service with db adapter, optional film stats service,
+         per-review lock registry and background purger of deletions."""
         self.repo = ReviewsRepo(db)
         self.votes_repo = ReviewVotesRepo(db)
         self.stats = stats
+        self.locks = locks
+        self.purger = purger
 
     # ---------- helpers ----------
 
     @asynccontextmanager
-    async def _txn(self):
-        """Open mongo session + transaction and yield session."""
-        async with await self.repo.client.start_session() as session:
-            async with session.start_transaction():
-                yield session
+    async def _locked(self, review_id: str) -> AsyncIterator[None]:
+        """Serialize same-review mutations of this worker (if enabled)."""
+        if self.locks is None:
+            yield
+            return
+        async with self.locks.hold(('review', review_id)):
+            yield
+
+    async def _txn(
+            self,
+            review_id: str,
+            body: Callable[..., Awaitable[T]]) -> T:
+        """Run `body(session)` in a transaction with transient retries.
+
+        Transactions on the same review queue on its lock first, so they
+        do not abort each other with WriteConflict. `body` may run more
+        than once and must only touch Mongo through `session`.
+        """
+        async with self._locked(review_id):
+            return await run_transaction(
+                self.repo.client, body, name='reviews')
 
     @staticmethod
     def _vote_delta(
@@ -69,13 +116,25 @@ class ReviewsService:  # noqa: WPS214 (methods count)
             self,
             user_id: str,
             data: ReviewCreateRequest) -> ReviewCreateResponse:
-        """Create new review and update film stats (optional)."""
-        try:
+        """Create new review and update film stats (optional).
+
+        The insert and the list counter/version bump share a
+        transaction, so a concurrent count never sees only one of them.
+        """
+        async def body(session: AsyncIOMotorClientSession) -> str:
             review_id = await self.repo.insert(
                 film_id=data.film_id,
                 user_id=user_id,
                 text=data.text,
+                session=session,
             )
+            await self.repo.bump_version(
+                data.film_id, reviews=1, session=session)
+            return review_id
+
+        try:
+            review_id = await run_transaction(
+                self.repo.client, body, name='reviews')
             if self.stats:
                 await self.stats.apply_review_created(data.film_id)
             return ReviewCreateResponse(review_id=review_id)
@@ -112,15 +171,40 @@ class ReviewsService:  # noqa: WPS214 (methods count)
         limit: int = 20,
         offset: int = 0,
         sort: str = 'new',
+        with_total: bool = True,
+        exact_total: bool = False,
+        cursor: Optional[str] = None,
+        state: Optional[ListVersion] = None,
     ) -> ReviewListResponse:
-        """List reviews for a film with pagination and sorting."""
+        """List reviews for a film with pagination and sorting.
+
+        `cursor` (next_cursor of the previous page with the same `sort`)
+        takes precedence over `offset`; raises
+        RuntimeError('invalid_cursor') for a bad token.
+        `total` comes from the review counter kept on the list version
+        document, so it changes only together with the ETag;
+        `exact_total` recounts documents (concurrently with the page
+        query) and resets the counter; `with_total=False` skips it.
+        `state` is the list version the caller already read for its ETag.
+        """
+        kind = f'reviews_{sort}'
+        after = decode_cursor(cursor, kind) if cursor else None
         try:
-            docs = await self.repo.list_by_film(
+            page = self.repo.list_by_film(
                 film_id,
-                limit,
-                offset,
+                limit + 1,
+                0 if after else offset,
                 sort=sort,
+                after=after,
             )
+            total: Optional[int] = None
+            if with_total:
+                docs, total = await asyncio.gather(
+                    page, self._total(film_id, exact_total, state))
+            else:
+                docs = await page
+            docs, next_cursor = split_page(
+                docs, limit, kind, LIST_SORTS.get(sort, LIST_SORTS['new']))
             items: List[ReviewItem] = [
                 ReviewItem(
                     review_id=str(doc['_id']),
@@ -133,11 +217,47 @@ class ReviewsService:  # noqa: WPS214 (methods count)
                 )
                 for doc in docs
             ]
-            total = await self.repo.count_by_film(film_id)
-            return ReviewListResponse(items=items, total=total)
+            return ReviewListResponse(
+                items=items,
+                total=total,
+                next_cursor=next_cursor,
+            )
         except PyMongoError as error:
             raise RuntimeError(f'mongo_review_list_error: {error}') from error
 
+    async def _total(
+            self,
+            film_id: str,
+            exact: bool,
+            state: Optional[ListVersion]) -> int:
+        """Reviews count: counter, or exact count that also resets it."""
+        if state is None:
+            state = await self.list_version(film_id)
+        if not exact and state.reviews is not None:
+            return state.reviews
+        # первый запрос по фильму (или явный exact_total) сверяет счётчик
+        # с коллекцией; запись сохраняется, только если версия списка не
+        # сдвинулась с момента чтения, и документ версии не создаётся
+        count = await self.repo.count_by_film(film_id)
+        if state.exists:
+            await self.repo.set_count(film_id, state.version, count)
+        return count
+
+    async def list_version(self, film_id: str) -> ListVersion:
+        """Cheap version of film's review list (ETag) and its counter."""
+        try:
+            doc = await self.repo.get_version(film_id)
+        except PyMongoError as error:
+            raise RuntimeError(f'mongo_review_list_error: {error}') from error
+        if not doc:
+            return ListVersion(0, None, None, exists=False)
+        return ListVersion(
+            int(doc.get('version', 0)),
+            doc.get('updated_at'),
+            int(doc.get('reviews', 0)) if doc.get('exact') else None,
+            exists=True,
+        )
+
     # ---------- UPDATE (EDIT) ----------
 
     async def update_text(
@@ -147,7 +267,11 @@ class ReviewsService:  # noqa: WPS214 (methods count)
             text: str) -> bool:
         """Edit review text by author."""
         try:
-            return await self.repo.update_text(user_id, review_id, text)
+            film_id = await self.repo.update_text(user_id, review_id, text)
+            if film_id is None:
+                return False
+            await self.repo.bump_version(film_id)
+            return True
         except PyMongoError as error:
             raise RuntimeError(
                 f'mongo_review_update_error: {error}'
@@ -156,30 +280,33 @@ class ReviewsService:  # noqa: WPS214 (methods count)
     # ---------- DELETE ----------
 
     async def delete_review(self, user_id: str, review_id: str) -> bool:
-        """Delete review with cascade votes removal and stats update."""
+        """Tombstone review; votes and stats are cleaned up in background.
+
+        One small transaction (tombstone + list counter), so latency does
+        not depend on how many votes the review has. The review
+        disappears from reads and stops accepting votes at once; the
+        purger removes its votes in batches and updates film stats when
+        it deletes the document.
+        """
+        async def body(session: AsyncIOMotorClientSession) -> Optional[str]:
+            film_id = await self.repo.tombstone(
+                user_id, review_id, session=session)
+            if film_id is not None:
+                # total списка уменьшается сразу, вместе с версией (ETag)
+                await self.repo.bump_version(
+                    film_id, reviews=-1, session=session)
+            return film_id
+
         try:
-            async with self._txn() as session:
-                # 1) delete all votes of the review
-                await self.votes_repo.delete_many_by_review(
-                    review_id, session=session)
-                # 2) delete review and get its film_id
-                deleted = await self.repo.delete_and_return(
-                    user_id,
-                    review_id,
-                    session=session,
-                )
-                if not deleted:
-                    return False
-
-                film_id = deleted['film_id']
-                # 3) update aggregates
-                if self.stats:
-                    await self.stats.apply_review_deleted(film_id)
-                return True
+            if await self._txn(review_id, body) is None:
+                return False
         except PyMongoError as error:
             raise RuntimeError(
                 f'mongo_review_delete_error: {error}'
             ) from error
+        if self.purger is not None:
+            self.purger.notify()
+        return True
 
     # ---------- VOTE (UP/DOWN) ----------
 
@@ -189,52 +316,45 @@ class ReviewsService:  # noqa: WPS214 (methods count)
             review_id: str,
             value: VoteValue) -> ReviewVoteResponse:
         """Apply vote (up/down) for a review;
-         updates counters and film stats."""
-        try:
-            async with self._txn() as session:
-                old_vote = await self.votes_repo.get_user_vote(
-                    review_id,
-                    user_id,
-                    session=session,
-                )
-                new_vote = value.value  # 'up' | 'down'
-
-                if old_vote == new_vote:
-                    return ReviewVoteResponse(ok=True, applied=False)
-
-                # 1) update counters on review
-                updated = await self.repo.apply_vote_delta(
-                    review_id,
-                    old_vote=old_vote,
-                    new_vote=new_vote,
-                    session=session,
-                )
-                if not updated:
-                    raise RuntimeError('review_not_found')
-
-                # 2) upsert user vote
-                await self.votes_repo.upsert_vote(
-                    review_id,
-                    user_id,
-                    new_vote,
-                    session=session,
-                )
+         updates counters and film stats.
+
+        Two round trips inside the transaction: the vote upsert returns
+        the previous vote, the counters update returns film_id. Stats
+        and list version are written after commit.
+        """
+        new_vote = value.value  # 'up' | 'down'
+
+        async def body(
+                session: AsyncIOMotorClientSession,
+        ) -> tuple[Optional[str], Optional[str]]:
+            # 1) upsert user vote, get the previous one
+            old_vote = await self.votes_repo.upsert_vote(
+                review_id,
+                user_id,
+                new_vote,
+                session=session,
+            )
+            if old_vote == new_vote:
+                return old_vote, None
+            # 2) update counters on review
+            film_id = await self.repo.apply_vote_delta(
+                review_id,
+                old_vote=old_vote,
+                new_vote=new_vote,
+                session=session,
+            )
+            if film_id is None:
+                # голос к несуществующей рецензии откатится с транзакцией
+                raise RuntimeError('review_not_found')
+            return old_vote, film_id
 
-                # 3) update film stats
-                if self.stats:
-                    film_id = await self.repo.get_film_id(
-                        review_id,
-                        session=session,
-                    )
-                    old_delta, new_delta = self._vote_delta(old_vote, new_vote)
-                    if film_id:
-                        await self.stats.apply_review_vote_change(
-                            film_id,
-                            old_delta,
-                            new_delta,
-                        )
-
-                return ReviewVoteResponse(ok=True, applied=True)
+        try:
+            old_vote, film_id = await self._txn(review_id, body)
+            if film_id is None:
+                return ReviewVoteResponse(ok=True, applied=False)
+            # 3) film stats и версия списка — после коммита транзакции
+            await self._after_vote(film_id, old_vote, new_vote)
+            return ReviewVoteResponse(ok=True, applied=True)
         except PyMongoError as error:
             raise RuntimeError(f'mongo_review_vote_error: {error}') from error
 
@@ -244,49 +364,51 @@ class ReviewsService:  # noqa: WPS214 (methods count)
             self, user_id: str, review_id: str) -> ReviewVoteResponse:
         """Remove user's vote from a review;
          updates counters and film stats."""
-        try:
-            async with self._txn() as session:
-                old_vote = await self.votes_repo.get_user_vote(
-                    review_id,
-                    user_id,
-                    session=session,
-                )
-                if not old_vote:
-                    return ReviewVoteResponse(ok=True, applied=False)
-
-                # 1) decrement counters on review
-                updated = await self.repo.apply_vote_delta(
-                    review_id,
-                    old_vote=old_vote,
-                    new_vote=None,
-                    session=session,
-                )
-                if not updated:
-                    raise RuntimeError('review_not_found')
-
-                # 2) delete user vote
-                await self.votes_repo.delete_vote(
-                    review_id,
-                    user_id,
-                    session=session,
-                )
+        async def body(
+                session: AsyncIOMotorClientSession,
+        ) -> tuple[Optional[str], Optional[str]]:
+            # 1) delete user vote, get its value
+            old_vote = await self.votes_repo.delete_vote(
+                review_id,
+                user_id,
+                session=session,
+            )
+            if not old_vote:
+                return None, None
+            # 2) decrement counters on review
+            film_id = await self.repo.apply_vote_delta(
+                review_id,
+                old_vote=old_vote,
+                new_vote=None,
+                session=session,
+            )
+            if film_id is None:
+                raise RuntimeError('review_not_found')
+            return old_vote, film_id
 
-                # 3) update film stats
-                if self.stats:
-                    film_id = await self.repo.get_film_id(
-                        review_id,
-                        session=session,
-                    )
-                    old_delta, _ = self._vote_delta(old_vote, None)
-                    if film_id:
-                        await self.stats.apply_review_vote_change(
-                            film_id,
-                            old_delta,
-                            None,
-                        )
-
-                return ReviewVoteResponse(ok=True, applied=True)
+        try:
+            old_vote, film_id = await self._txn(review_id, body)
+            if film_id is None:
+                return ReviewVoteResponse(ok=True, applied=False)
+            # 3) film stats и версия списка — после коммита транзакции
+            await self._after_vote(film_id, old_vote, None)
+            return ReviewVoteResponse(ok=True, applied=True)
         except PyMongoError as error:
             raise RuntimeError(
                 f'mongo_review_unvote_error: {error}'
             ) from error
+
+    async def _after_vote(
+            self,
+            film_id: str,
+            old_vote: Optional[str],
+            new_vote: Optional[str]) -> None:
+        """Propagate a committed vote change to film stats and ETags."""
+        if self.stats:
+            old_delta, new_delta = self._vote_delta(old_vote, new_vote)
+            await self.stats.apply_review_vote_change(
+                film_id,
+                old_delta,
+                new_delta,
+            )
+        await self.repo.bump_version(film_id)